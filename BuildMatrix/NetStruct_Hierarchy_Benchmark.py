@@ -0,0 +1,420 @@
+__author__ = 'Amir Rubin'
+'''
+This script benchmarks the stages of NetStruct_Hierarchy on synthetic data of a configurable size.
+
+It generates a structured population (individuals split to populations, with allele frequencies drawn around
+shared ancestral frequencies, Balding-Nichols style), times the BuildMatrix functions on it, and optionally the
+java stages (TextConvertor.createInputs and CommBraker.brakeRec, see netStruct_Hierarchy.Benchmark).
+Each measurement runs in its own process, and is appended as a json line to <outputFolder>/results.jsonl, so runs
+of different versions can be compared (see -compare below).
+
+Parameters are:
+outputFolder numOfIndividuals numOfLoci
+parmas:
+    outputFolder - path to folder in which we write the generated data and the results
+    numOfIndividuals - comma separated amounts of individuals, e.g. 100,1000,20000
+    numOfLoci - comma separated amounts of loci, e.g. 10000,100000,1000000
+          All combinations of numOfIndividuals and numOfLoci are benchmarked.
+
+    *** Non mandatory parameters ***
+    alleles - 'binary' (default) for 0,1,2 genotypes, or comma separated symbols (e.g. A,C,G,T), written as pairs.
+    pivoted - if true (default) each line of the generated input is a locus, otherwise each line is an individual.
+          As in NetStruct_Hierarchy_BuildMatrix, use "" for false.
+    missingRate - the fraction of missing genotypes. Default 0.
+    numOfPopulations - default 4.
+    fst - the differentiation between the populations. Default 0.1.
+    seed - default 1.
+    benchmarks - comma separated names of benchmarks to run, or 'all' (default). The python benchmarks are
+          readRandomWindow calcFrequenciesPerLocus calcDistances calcDistancesNumpy writeDistancesToFile
+          writeDistanceMatrixToFile mergeMatrixsRandomly. writeDistancesToFile is the writer of the python engine (nested
+          dicts), writeDistanceMatrixToFile the one of the numpy engine (a full matrix).
+          calcDistances is quadratic in python, skip it for large inputs.
+    javaClasspath - the classpath of NetStruct_Hierarchy (with NECTAR). When given, the java stages are benchmarked
+          on a synthetic matrix of numOfIndividuals individuals.
+    label - the version name recorded with the results. Default - the current git commit, if any.
+
+    *** Comparing versions ***
+    python ./NetStruct_Hierarchy_Benchmark.py -compare old/results.jsonl new/results.jsonl
+          prints the ratio between the throughput of matching measurements.
+
+Sample executions:
+    python ./NetStruct_Hierarchy_Benchmark.py ./bench/ 100,1000 10000,100000
+    python ./NetStruct_Hierarchy_Benchmark.py ./bench/ 1000 100000 A,C,G,T "" 0.01 8 0.05 1 readRandomWindow,calcDistancesNumpy
+    python ./NetStruct_Hierarchy_Benchmark.py ./bench/ 2000 10000 binary True 0 4 0.1 1 all "../NetStruct_Hierarchy_v1.jar"
+'''
+import sys
+import os
+import json
+import time
+import datetime
+import subprocess
+import multiprocessing
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+import NetStruct_Hierarchy_BuildMatrix as buildMatrix
+
+PYTHON_BENCHMARKS = ['readRandomWindow', 'calcFrequenciesPerLocus', 'calcDistances', 'calcDistancesNumpy',
+                     'writeDistancesToFile', 'writeDistanceMatrixToFile', 'mergeMatrixsRandomly']
+JAVA_BENCHMARKS = ['createInputs', 'brakeRec']
+# Amount of genotypes generated together. Bounds the memory used by the generator.
+GENERATOR_BATCH_SIZE = 1 << 22
+# Amount of windows written for mergeMatrixsRandomly.
+NUM_OF_WINDOWS_TO_MERGE = 4
+
+#********************************************************************
+#********************************************************************
+#********************************************************************
+#
+#                       Generators
+#
+#********************************************************************
+#********************************************************************
+#********************************************************************
+
+#********************************************************************
+# The population of each individual - individuals are split to @numOfPopulations consecutive groups.
+#********************************************************************
+def populationOfIndividuals(numOfIndividuals, numOfPopulations):
+    return [i*numOfPopulations//numOfIndividuals for i in range(numOfIndividuals)]
+
+#********************************************************************
+# Writes the files NetStruct_Hierarchy needs to map individuals to sample sites - each population is a site.
+#********************************************************************
+def writeSampleSites(outputFolder, numOfIndividuals, numOfPopulations):
+    with open(outputFolder + "ind2SampleSite.txt", 'w') as f:
+        for population in populationOfIndividuals(numOfIndividuals, numOfPopulations):
+            f.write('POP' + str(population) + '\n')
+    with open(outputFolder + "SampleSites.txt", 'w') as f:
+        f.write(','.join(['POP' + str(p) for p in range(numOfPopulations)]) + '\n')
+
+#********************************************************************
+# Cumulative allele frequencies of every locus in every population, a (loci x populations x alleles) array.
+# The ancestral frequencies of a locus are drawn uniformly, and each population draws its own frequencies around
+# them - the higher @fst is, the further they are.
+#********************************************************************
+def populationFrequencies(numOfLoci, numOfPopulations, numOfAlleles, fst, rng):
+    ancestral = rng.dirichlet(np.ones(numOfAlleles), size=numOfLoci)
+    ancestral = np.clip(ancestral, 0.01, None)
+    ancestral = ancestral / ancestral.sum(axis=1, keepdims=True)
+    scale = (1.0 - fst) / fst
+    frequencies = np.empty((numOfLoci, numOfPopulations, numOfAlleles), dtype=np.float32)
+    for p in range(numOfPopulations):
+        alpha = ancestral * scale
+        draws = rng.gamma(alpha)
+        frequencies[:, p, :] = draws / np.maximum(draws.sum(axis=1, keepdims=True), 1e-300)
+    return np.cumsum(frequencies, axis=2)
+
+#********************************************************************
+# Draws the pair of alleles of the given @individuals at the given @loci.
+# Returns two (loci x individuals) arrays of allele indices, and a mask of the missing genotypes.
+#********************************************************************
+def drawGenotypes(cumulative, loci, individuals, populations, missingRate, rng):
+    cdf = cumulative[loci][:, populations[individuals], :]
+    shape = (len(loci), len(individuals))
+    first = (rng.random(shape)[:, :, None] > cdf[:, :, :-1]).sum(axis=2)
+    second = (rng.random(shape)[:, :, None] > cdf[:, :, :-1]).sum(axis=2)
+    missing = rng.random(shape) < missingRate
+    return first, second, missing
+
+#********************************************************************
+# Generates a structured population of @numOfIndividuals at @numOfLoci, in the input format of BuildMatrix.
+# @alleles is 'binary' or comma separated allele symbols. With @pivoted, each line is a locus.
+# The genotypes are generated and written in batches, so any size can be generated.
+#********************************************************************
+def generateGenotypes(inputFile, numOfIndividuals, numOfLoci, alleles, pivoted, missingRate, numOfPopulations, fst, seed):
+    rng = np.random.default_rng(seed)
+    binaryMode = alleles == 'binary'
+    symbols = ['0', '1'] if binaryMode else alleles.split(',')
+    cumulative = populationFrequencies(numOfLoci, numOfPopulations, len(symbols), fst, rng)
+    populations = np.array(populationOfIndividuals(numOfIndividuals, numOfPopulations))
+    if binaryMode:
+        # genotype = amount of copies of the second allele, 3 is missing
+        tokens = np.array(['0', '1', '2', '-'])
+    else:
+        tokens = np.array([a + ',' + b for a in symbols for b in symbols] + ['N,N'])
+    if pivoted:
+        rowsPerBatch = max(1, GENERATOR_BATCH_SIZE // numOfIndividuals)
+        numOfRows = numOfLoci
+    else:
+        rowsPerBatch = max(1, GENERATOR_BATCH_SIZE // numOfLoci)
+        numOfRows = numOfIndividuals
+    allLoci = np.arange(numOfLoci)
+    allIndividuals = np.arange(numOfIndividuals)
+    buildMatrix.makeDirs(inputFile)
+    with open(inputFile, 'w') as f:
+        for start in range(0, numOfRows, rowsPerBatch):
+            end = min(start + rowsPerBatch, numOfRows)
+            if pivoted:
+                first, second, missing = drawGenotypes(cumulative, allLoci[start:end], allIndividuals, populations, missingRate, rng)
+            else:
+                first, second, missing = drawGenotypes(cumulative, allLoci, allIndividuals[start:end], populations, missingRate, rng)
+                first, second, missing = first.T, second.T, missing.T
+            if binaryMode:
+                codes = first + second
+            else:
+                codes = first * len(symbols) + second
+            codes[missing] = len(tokens) - 1
+            for row in tokens[codes]:
+                f.write('\t'.join(row.tolist()) + '\n')
+    return binaryMode
+
+#********************************************************************
+# Generates a matrix of distances between @numOfIndividuals individuals of @numOfPopulations populations, without
+# generating genotypes, so the java stages can be benchmarked on large inputs.
+# Individuals of the same population are closer than individuals of different populations.
+#********************************************************************
+def generateMatrix(matrixPath, numOfIndividuals, numOfPopulations, seed):
+    rng = np.random.default_rng(seed)
+    populations = np.array(populationOfIndividuals(numOfIndividuals, numOfPopulations))
+    buildMatrix.makeDirs(matrixPath)
+    with open(matrixPath, 'w') as f:
+        for i in range(numOfIndividuals - 1):
+            samePopulation = populations[i+1:] == populations[i]
+            row = np.where(samePopulation, 0.3, 0.1) + rng.normal(0, 0.02, size=len(samePopulation))
+            f.write(','.join([str(w) for w in np.clip(row, 0.001, None).tolist()]) + ',\n')
+
+#********************************************************************
+#********************************************************************
+#********************************************************************
+#
+#                       Measurements
+#
+#********************************************************************
+#********************************************************************
+#********************************************************************
+
+class ResultHolder(object):
+    def __init__(self, results):
+        self.results = results
+
+    def put(self, result):
+        self.results.append(result)
+
+#********************************************************************
+# Runs @setup (not measured) and then @run on its result, in the current process.
+# @run returns the amount of items it handled, used for the throughput.
+#********************************************************************
+def measureInProcess(setup, run, queue):
+    try:
+        args = setup()
+        rssBefore = buildMatrix.peakRssBytes()
+        cpuStart = time.process_time()
+        start = time.perf_counter()
+        items = run(*args)
+        seconds = time.perf_counter() - start
+        cpuSeconds = time.process_time() - cpuStart
+        queue.put({'seconds': seconds, 'cpuSeconds': cpuSeconds, 'items': items,
+                   'peakRssBytes': buildMatrix.peakRssBytes(), 'rssBeforeBytes': rssBefore})
+    except Exception as e:
+        queue.put({'error': repr(e)})
+
+#********************************************************************
+# Measures @run in a process of its own, so the peak memory is that of a single benchmark.
+# Where processes can not be forked, it is measured in the current process.
+#********************************************************************
+def measure(setup, run):
+    if 'fork' not in multiprocessing.get_all_start_methods():
+        results = []
+        measureInProcess(setup, run, ResultHolder(results))
+        return results[0]
+    context = multiprocessing.get_context('fork')
+    queue = context.Queue()
+    process = context.Process(target=measureInProcess, args=(setup, run, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+def currentLabel():
+    try:
+        folder = os.path.dirname(os.path.abspath(__file__))
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=folder, stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+def appendResult(resultsPath, record):
+    with open(resultsPath, 'a') as f:
+        f.write(json.dumps(record, sort_keys=True) + '\n')
+
+#********************************************************************
+#********************************************************************
+#********************************************************************
+#
+#                       Benchmarks
+#
+#********************************************************************
+#********************************************************************
+#********************************************************************
+
+#********************************************************************
+# The setup and the measured run of each python benchmark, and the unit of the items it handles.
+#********************************************************************
+def pythonBenchmark(name, data):
+    n = data['numOfIndividuals']
+    L = data['numOfLoci']
+    logFile = data['folder'] + "Log/benchmark.log"
+    buildMatrix.makeDirs(logFile)
+
+    def readWindow():
+        return buildMatrix.readRandomWindow(data['inputFile'], L, 0, "", L, n, data['allelesString'], data['alleleMissingValueChar'],
+                                            data['binaryMode'], data['pivoted'])
+    def readWindowAndFrequencies():
+        window = readWindow()
+        return window, buildMatrix.calcFrequenciesPerLocus(window, logFile, data['allelesString'])
+    def numpyDistances():
+        window, frequenciesPerLocus = readWindowAndFrequencies()
+        distances, counts = buildMatrix.calcDistancesNumpy(window, frequenciesPerLocus, logFile, data['allelesString'])
+        return (distances, counts)
+
+    if name == 'readRandomWindow':
+        return (lambda: (), lambda: (readWindow(), n*L)[1], 'genotypes')
+    if name == 'calcFrequenciesPerLocus':
+        return (lambda: (readWindow(),),
+                lambda window: (buildMatrix.calcFrequenciesPerLocus(window, logFile, data['allelesString']), n*L)[1], 'genotypes')
+    if name == 'calcDistances':
+        return (readWindowAndFrequencies,
+                lambda window, frequenciesPerLocus: (buildMatrix.calcDistances(window, frequenciesPerLocus, logFile), n*(n-1)//2*L)[1], 'pairLoci')
+    if name == 'calcDistancesNumpy':
+        return (readWindowAndFrequencies,
+                lambda window, frequenciesPerLocus: (buildMatrix.calcDistancesNumpy(window, frequenciesPerLocus, logFile, data['allelesString']), n*(n-1)//2*L)[1], 'pairLoci')
+    if name == 'writeDistancesToFile':
+        outputPath = data['folder'] + "Distances/Benchmark.csv"
+        def pythonDistances():
+            # the distances as calcDistances returns them, converted from the (faster) numpy engine
+            distances, counts = numpyDistances()
+            return (dict((i, dict((j, float(distances[i, j])) for j in range(i+1, n))) for i in range(n)),)
+        return (pythonDistances,
+                lambda distances: (buildMatrix.writeDistancesToFile(distances, L, outputPath), n*(n-1)//2)[1], 'pairs')
+    if name == 'writeDistanceMatrixToFile':
+        outputPath = data['folder'] + "Distances/Benchmark.csv"
+        return (numpyDistances,
+                lambda distances, counts: (buildMatrix.writeDistanceMatrixToFile(distances, L, outputPath), n*(n-1)//2)[1], 'pairs')
+    if name == 'mergeMatrixsRandomly':
+        distancesFolder = data['folder'] + "Windows/"
+        def writeWindows():
+            distances, counts = numpyDistances()
+            for iw in range(NUM_OF_WINDOWS_TO_MERGE):
+                buildMatrix.writeDistanceMatrixToFile(distances, L, distancesFolder + "Matrix" + str(L) + "_" + str(iw) + ".csv")
+                buildMatrix.writeCountsMatrixToFile(L, counts, distancesFolder + "Counts" + str(L) + "_" + str(iw) + ".csv")
+            return ()
+        return (writeWindows,
+                lambda: (buildMatrix.mergeMatrixsRandomly(data['folder'] + "Distances/Merged.csv", distancesFolder, L, NUM_OF_WINDOWS_TO_MERGE,
+                                                          0, NUM_OF_WINDOWS_TO_MERGE, n), NUM_OF_WINDOWS_TO_MERGE*n*(n-1)//2)[1], 'pairs')
+    raise ValueError('Unknown benchmark ' + name + ', expected one of ' + ','.join(PYTHON_BENCHMARKS + JAVA_BENCHMARKS))
+
+#********************************************************************
+# Runs the java benchmarks (netStruct_Hierarchy.Benchmark) on a synthetic matrix, which appends its own results.
+#********************************************************************
+def runJavaBenchmarks(javaClasspath, folder, numOfIndividuals, numOfPopulations, seed, benchmarks, resultsPath, label):
+    matrixPath = folder + "Matrix.csv"
+    if not os.path.isfile(matrixPath):
+        generateMatrix(matrixPath, numOfIndividuals, numOfPopulations, seed)
+    writeSampleSites(folder, numOfIndividuals, numOfPopulations)
+    command = ['java', '-cp', javaClasspath, 'netStruct_Hierarchy.Benchmark', matrixPath, folder + "ind2SampleSite.txt",
+               folder + "SampleSites.txt", folder + "Java_" + datetime.datetime.now().strftime('%Y%m%d%H%M%S') + "/",
+               resultsPath, label, ','.join(benchmarks)]
+    print('Running ' + ' '.join(command))
+    subprocess.check_call(command)
+
+def runBenchmarks(outputFolder, numOfIndividuals, numOfLoci, alleles, pivoted, missingRate, numOfPopulations, fst, seed, benchmarks, label):
+    resultsPath = outputFolder + "results.jsonl"
+    buildMatrix.makeDirs(resultsPath)
+    folder = outputFolder + "n" + str(numOfIndividuals) + "_L" + str(numOfLoci) + "_" + alleles.replace(',', '') + \
+             ("_pivoted" if pivoted else "") + "_m" + str(missingRate) + "/"
+    inputFile = folder + "Input.txt"
+    description = {'label': label, 'numOfIndividuals': numOfIndividuals, 'numOfLoci': numOfLoci, 'alleles': alleles,
+                   'pivoted': pivoted, 'missingRate': missingRate, 'numOfPopulations': numOfPopulations, 'fst': fst, 'seed': seed,
+                   'python': sys.version.split()[0], 'date': str(datetime.datetime.now())}
+
+    pythonBenchmarks = [b for b in benchmarks if b in PYTHON_BENCHMARKS]
+    if len(pythonBenchmarks) > 0 and not os.path.isfile(inputFile):
+        print('Generating ' + inputFile)
+        generateGenotypes(inputFile, numOfIndividuals, numOfLoci, alleles, pivoted, missingRate, numOfPopulations, fst, seed)
+    binaryMode = alleles == 'binary'
+    data = {'folder': folder, 'inputFile': inputFile, 'numOfIndividuals': numOfIndividuals, 'numOfLoci': numOfLoci,
+            'binaryMode': binaryMode, 'pivoted': pivoted,
+            'allelesString': '0,1,2' if binaryMode else alleles, 'alleleMissingValueChar': '-' if binaryMode else 'N'}
+    for name in pythonBenchmarks:
+        setup, run, unit = pythonBenchmark(name, data)
+        result = measure(setup, run)
+        record = dict(description)
+        record.update(result)
+        record['benchmark'] = name
+        record['language'] = 'python'
+        record['unit'] = unit
+        if 'seconds' in result:
+            record['throughput'] = result['items'] / max(result['seconds'], 1e-9)
+            print(name + ': ' + str(result['seconds']) + ' seconds, ' + str(record['throughput']) + ' ' + unit + '/s')
+        else:
+            print(name + ' failed: ' + result['error'])
+        appendResult(resultsPath, record)
+
+#********************************************************************
+# Prints the ratio between the throughput of the matching measurements of two results files (new/old).
+#********************************************************************
+def compareResults(oldResultsPath, newResultsPath):
+    key = lambda r: (r.get('benchmark'), r.get('language'), r.get('numOfIndividuals'), r.get('numOfLoci'), r.get('alleles'),
+                     r.get('pivoted'), r.get('missingRate'))
+    def load(path):
+        results = dict()
+        with open(path) as f:
+            for line in f:
+                if line.strip() != "":
+                    record = json.loads(line)
+                    if 'throughput' in record:
+                        # the last measurement wins
+                        results[key(record)] = record
+        return results
+    old = load(oldResultsPath)
+    new = load(newResultsPath)
+    for k in sorted(set(old) & set(new), key=str):
+        speedup = new[k]['throughput'] / max(old[k]['throughput'], 1e-300)
+        memory = ""
+        # peak rss of the python benchmarks, peak heap of the java ones
+        oldPeak = old[k].get('peakRssBytes') or old[k].get('peakHeapBytes')
+        newPeak = new[k].get('peakRssBytes') or new[k].get('peakHeapBytes')
+        if oldPeak and newPeak:
+            memory = ', peak memory x' + '%.2f' % (float(newPeak) / oldPeak)
+        print('%s %s n=%s L=%s: throughput x%.2f%s' % (k[1], k[0], k[2], k[3], speedup, memory))
+
+def main(inputVector):
+    if len(inputVector) > 1 and inputVector[1] == '-compare':
+        return compareResults(inputVector[2], inputVector[3])
+    if len(inputVector) < 4:
+        print("Required parameters: outputFolder numOfIndividuals numOfLoci.")
+        print("Non mandatory parameters: alleles pivoted missingRate numOfPopulations fst seed benchmarks javaClasspath label.")
+        print("Use '-compare oldResults newResults' to compare two results files.")
+        return
+    if np is None:
+        print("The benchmark requires numpy.")
+        return
+    outputFolder = inputVector[1]
+    individuals = [int(x) for x in inputVector[2].split(',')]
+    loci = [int(x) for x in inputVector[3].split(',')]
+    alleles = inputVector[4] if len(inputVector) > 4 else 'binary'
+    pivoted = bool(inputVector[5]) if len(inputVector) > 5 else True
+    missingRate = float(inputVector[6]) if len(inputVector) > 6 else 0.0
+    numOfPopulations = int(inputVector[7]) if len(inputVector) > 7 else 4
+    fst = float(inputVector[8]) if len(inputVector) > 8 else 0.1
+    seed = int(inputVector[9]) if len(inputVector) > 9 else 1
+    benchmarks = PYTHON_BENCHMARKS + JAVA_BENCHMARKS
+    if len(inputVector) > 10 and inputVector[10] != 'all':
+        benchmarks = inputVector[10].split(',')
+    javaClasspath = inputVector[11] if len(inputVector) > 11 else ""
+    label = inputVector[12] if len(inputVector) > 12 and inputVector[12] != "" else currentLabel()
+
+    javaBenchmarks = [b for b in benchmarks if b in JAVA_BENCHMARKS]
+    for numOfIndividuals in individuals:
+        for numOfLoci in loci:
+            runBenchmarks(outputFolder, numOfIndividuals, numOfLoci, alleles, pivoted, missingRate, numOfPopulations, fst, seed,
+                          benchmarks, label)
+        if javaClasspath != "" and len(javaBenchmarks) > 0:
+            runJavaBenchmarks(javaClasspath, outputFolder + "n" + str(numOfIndividuals) + "_java/", numOfIndividuals, numOfPopulations,
+                              seed, javaBenchmarks, outputFolder + "results.jsonl", label)
+
+if __name__ == "__main__":
+    main(sys.argv)
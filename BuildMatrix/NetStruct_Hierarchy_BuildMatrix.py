@@ -16,6 +16,18 @@ parmas:
     allelesString - comma seperated symbols. Each symbol in the string is a symbol of an allele in the input data
     alleleMissingValueChar - the character representing a missing value
 
+    *** Input formats ***
+    Besides the text format above, inputFile can be a PLINK binary fileset or a VCF, chosen by its extension:
+    .bed - a SNP major PLINK .bed file, with its .fam (and .bim) next to it. Requires binaryMode True, the genotype
+          is the amount of copies of the A1 allele. The window's variants are read through a memory map.
+    .vcf, .vcf.gz - a VCF, plain or bgzipped. Variants are numbered by their order in the file, and the file is
+          streamed up to the last variant of the window. The GT field is used, phased or not, with '.' as missing.
+          In binaryMode the genotype is the amount of alternate alleles (all alternate alleles are counted as one),
+          otherwise allelesString lists the allele indices in use (e.g. 0,1,2,3) and alleleMissingValueChar is ignored.
+    pivoted is ignored for both. The ids of the individuals (FID IID from the .fam, or the VCF sample names) are
+    written to outputFolder/Individuals.txt, in the order of the rows of the matrix, to build the -pmn file.
+        python ./NetStruct_Hierarchy_BuildMatrix.py ./cohort.vcf.gz ./cohort/ 250000 1200 True notUsed NotUsed True 10000 0 ./cohort/Shuffled_250000.csv numpy
+
     *** Non mandatory parameters *** 
     pivoted - if true each line represents a loci. Alleles in this loci of all individuals are listed in each line.
           If false, each line represents an individual.
@@ -25,6 +37,75 @@ parmas:
     windowIndex - index of the window to be processes - will be read from the shuffeledFile.
     shuffeledFile - a path to a file generated by buildShuffledArray(n) where n is the number of snps in the inputFile.
 
+    *** Parallel driver ***
+    Running with '-parallel numOfWorkers' before the parameters above processes all the windows of size windowSize
+    on a local pool of numOfWorkers processes, and merges them to Distances/Matrix<windowSize>_merged.csv (or .bin).
+    The input is parsed once and shared by the workers. windowIndex is ignored, and when shuffeledFile is not
+    supplied (or does not exist) it is generated by buildShuffledArray.
+        python ./NetStruct_Hierarchy_BuildMatrix.py -parallel 64 ./Sample_Arabidopsis_20_ind_10k_snps.tsv ./Sample_Arabidopsis/ 10000 20 True notUsed NotUsed True 1000 0 "" numpy
+
+    *** Tiled driver ***
+    Running with '-tiled tileSize numOfWorkers' before the parameters above processes the window windowSize,
+    windowIndex (all the snps by default) in tiles of tileSize x tileSize pairs of individuals, on a local pool of
+    numOfWorkers processes. Tiles are written straight into a preallocated, memory mapped binary matrix under
+    Tiles/, so the matrix is never held in memory, and each completed tile is recorded in Tiles/.../Manifest.txt.
+    Running the same command again after an interruption resumes from the missing tiles (a run on an input or a
+    shuffeledFile whose content changed since is refused, see the manifest). When all tiles are done
+    the matrix is moved to Distances/Matrix<windowSize>_<windowIndex>.bin ('text' outputFormat is written as
+    'binary'), with its Counts file, so tiled windows can be merged like any other window.
+        python ./NetStruct_Hierarchy_BuildMatrix.py -tiled 4096 64 ./cohort.bed ./cohort/ 500000 50000 True notUsed NotUsed True 500000 0 "" numpy
+
+    *** Incremental ***
+    Running with '-incremental newInputFile numOfNewIndividuals' before the parameters of a window which was already
+    processed adds the individuals of newInputFile (the same loci, in the same format) to its outputs, after the
+    existing ones. Only the pairs of a new individual are calculated from scratch. The distances of the existing pairs
+    depend on the new individuals only through the allele frequencies, so they are corrected in one pass, at the loci
+    whose frequencies changed, by the change of the weight of each allele.
+    Note the cost does NOT depend only on the new individuals: the correction visits every existing pair at every
+    changed locus, O(existing^2 * changedLoci), and adding individuals usually changes the frequencies at nearly all
+    the loci. It saves parsing the existing individuals and calculating their frequencies, and is cheaper than a full
+    run mainly with the numpy engine or when few loci change.
+    The per-locus statistics (the genotypes of the window and their allele counts per locus) are kept in
+    Incremental/<windowSize>_<windowIndex>.gtc for the next batch. No separate per-pair state is kept - the
+    Distances and Counts files of the window hold the raw sums the correction starts from.
+    The result is the same as processing the window on all the individuals (up to floating point rounding).
+        python ./NetStruct_Hierarchy_BuildMatrix.py -incremental ./batch2.vcf.gz 150 ./cohort.vcf.gz ./cohort/ 250000 1200 True notUsed NotUsed True 250000 0 "" numpy
+
+    *** Replicates ***
+    generateReplicates, in the "Matrix joiner" section, builds bootstrap or jackknife replicates of the merged
+    matrix from the windows in Distances/, reading each window once. Each replicate is written in the -pm format.
+        python -c "import NetStruct_Hierarchy_BuildMatrix as b; b.generateReplicates('./Sample_Arabidopsis/', './Sample_Arabidopsis/Distances/', 1000, 0, 10, 20, 100, 'bootstrap', seed=1)"
+
+    *** Normalization ***
+    normalization - 'total' (default) divides each distance by the amount of snps in the window.
+          'valid' divides the distance of each pair by the amount of snps which are valid (not missing) in both individuals.
+          The normalization used is recorded in the Counts file, and merging windows sums the distances and the
+          amounts of snps used to divide them separately.
+
+    *** Genotype cache ***
+    cacheFolder - a folder of parsed inputs (default "" - no cache). The first run on an input parses it and writes
+          the genotypes and the allele counts per locus to the folder. Later runs on the same input, with any window
+          size, window index or shuffle, memory map them instead of parsing the input. Entries are keyed by the content
+          of the input and the parsing parameters, so a changed input is parsed again (and its old entry removed).
+    cacheMaxGB - the size the cacheFolder is kept under, by removing the least recently used entries. Default 16.
+
+    *** Output format ***
+    outputFormat - 'text' (default) writes Distances/Matrix*.csv as comma separated text.
+          'binary' (or 'binary32' for 4 byte floats) writes Distances/Matrix*.bin, a condensed upper triangle of
+          little endian floats after a 32 byte header (see writeBinaryDistancesFile). NetStruct_Hierarchy accepts
+          both as its -pm input. Counts*.csv are written as text in both cases.
+
+    *** Metrics ***
+    The wall time, cpu time, peak memory and rate of each phase (parse, frequencies, distances, write) are written as
+    json lines to Log/<windowSize>_<windowIndex>_metrics.jsonl (Log/<windowSize>_parallel_metrics.jsonl for the
+    parallel driver, with the phases of every window in Log/<windowSize>_<windowIndex>_metrics.jsonl), and summed
+    per phase in the log at the end of the run.
+
+    *** Performance ***
+    engine - 'python' (default) or 'numpy'. The numpy engine encodes the window as dense arrays and computes all
+          the distances with matrix products. It requires numpy and gives the same numbers as the python engine
+          (up to floating point rounding).
+
 Sample executions:
 Run on small dummy (ACTG) input
     python ./NetStruct_Hierarchy_BuildMatrix.py ./SampleInputGenes.txt ./sample/ 3 4 False A,B,C,D,T,G,XYZ N
@@ -43,10 +124,48 @@ Take a look at the output files
 '''
 import sys
 import os
+import struct
 import csv
+import hashlib
+import mmap
+import gzip
+import json
+import time
+import atexit
 import datetime
 from random import shuffle
 import random
+import multiprocessing
+from array import array
+from contextlib import contextmanager
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# Amount of loci handled together by the numpy engine. Bounds the memory used by a single batch.
+LOCI_BATCH_SIZE = 4096
+# Binary distances file - magic, version, and the codes of the dtype and normalization in the header.
+BINARY_MATRIX_MAGIC = b'NSTM'
+BINARY_MATRIX_VERSION = 1
+BINARY_MATRIX_HEADER = struct.Struct('<4sHBBQQ8x')
+BINARY_MATRIX_DTYPES = {'float32': 1, 'float64': 2}
+BINARY_MATRIX_NORMALIZATIONS = {'total': 0, 'valid': 1}
+# Amount of bytes of the input file read together when extracting a window.
+READ_CHUNK_SIZE = 1 << 24
+# Genotype cache file - magic, version and header, and the default bound on the size of a cache folder.
+GENOTYPE_CACHE_MAGIC = b'NSGC'
+GENOTYPE_CACHE_VERSION = 1
+GENOTYPE_CACHE_HEADER = struct.Struct('<4sHBxIQQ4x')
+GENOTYPE_CACHE_MAX_BYTES = 16 << 30
+# Amount of pairs added together when accumulating replicates. Bounds the temporary memory of a single addition.
+PAIRS_BLOCK_SIZE = 1 << 22
 
 
 #********************************************************************
@@ -71,12 +190,61 @@ def buildShuffledArray(n, output):
 
 #********************************************************************
 # Generates all missing dirs in the path.
-# BEWARE of race conditions!!
+# Safe to call from several processes at once.
 #********************************************************************
 def makeDirs(pathToFile):
     pathToDir = os.path.dirname(pathToFile)
-    if not os.path.exists(pathToDir):
+    if pathToDir == "":
+        return
+    try:
         os.makedirs(pathToDir)
+    except OSError:
+        # another process may have created it in the meantime
+        if not os.path.isdir(pathToDir):
+            raise
+
+#********************************************************************
+# Opens @path for writing through a temporary file, which is renamed to @path once writing is done.
+# Other processes (e.g. jobs checking if a window was already processed) never see a partial file.
+#********************************************************************
+@contextmanager
+def openAtomically(path, mode="w"):
+    makeDirs(path)
+    tmpPath = path + '.' + str(os.getpid()) + '.tmp'
+    try:
+        with open(tmpPath, mode) as f:
+            yield f
+        os.replace(tmpPath, path)
+    finally:
+        if os.path.exists(tmpPath):
+            os.remove(tmpPath)
+
+# Log and metrics files, kept open (and buffered) by the process which opened them, until flushLogs.
+_openLogs = dict()
+# Files opened by the parent of a forked process. They are kept, so their buffers are never flushed twice.
+_inheritedLogs = []
+
+#********************************************************************
+# Appends @text to the file in @path, through a buffer kept open until flushLogs (or the exit of the process).
+#********************************************************************
+def appendToFile(path, text):
+    entry = _openLogs.get(path)
+    if entry is None or entry[0] != os.getpid():
+        if entry is not None:
+            _inheritedLogs.append(entry)
+        entry = (os.getpid(), open(path, "a"))
+        _openLogs[path] = entry
+    entry[1].write(text)
+
+#********************************************************************
+# Flushes the logs opened by this process. Call before forking, and before a worker returns its results.
+#********************************************************************
+def flushLogs():
+    for pid, f in list(_openLogs.values()):
+        if pid == os.getpid():
+            f.flush()
+
+atexit.register(flushLogs)
 
 #********************************************************************
 # Writing msg to logPath
@@ -84,10 +252,456 @@ def makeDirs(pathToFile):
 def writeToLog(msg, logPath):
     logMsg = 'log ' + str(datetime.datetime.now()) +': ' + msg
     print(logMsg)
+    appendToFile(logPath, logMsg + '\n')
+
+#********************************************************************
+# The peak resident memory of this process, in bytes (None where it is not available).
+#********************************************************************
+def peakRssBytes():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on linux, bytes on mac
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+# Phases measured by measurePhase in this process.
+_phaseMetrics = []
 
-    with open(logPath, "a") as f:
-        f.write(logMsg)
-        f.write('\n')
+def metricsPathOfLog(logFile):
+    return os.path.splitext(logFile)[0] + "_metrics.jsonl"
+
+#********************************************************************
+# Measures the wall time, cpu time and peak memory of the phase run in the with block, and appends it as a json
+# line to @metricsPath. The yielded record can be updated in the block, e.g. with the amount of 'items' handled.
+#   with measurePhase('parse', metricsPath, numOfGenotypes, 'genotypes') as record:
+#       ...
+#********************************************************************
+@contextmanager
+def measurePhase(phase, metricsPath, items=0, unit=''):
+    record = {'phase': phase, 'items': items, 'unit': unit}
+    cpuStart = time.process_time()
+    start = time.perf_counter()
+    yield record
+    seconds = time.perf_counter() - start
+    record['seconds'] = seconds
+    record['cpuSeconds'] = time.process_time() - cpuStart
+    record['peakRssBytes'] = peakRssBytes()
+    record['rate'] = record['items'] / max(seconds, 1e-9)
+    _phaseMetrics.append(record)
+    appendToFile(metricsPath, json.dumps(record, sort_keys=True) + '\n')
+
+#********************************************************************
+# Logs the totals of each phase in @records - runs, wall and cpu time, items and rate - and appends them as a
+# summary json line to @metricsPath.
+#********************************************************************
+def writeMetricsSummary(records, metricsPath, logFile):
+    totals = dict()
+    order = []
+    for record in records:
+        total = totals.get(record['phase'])
+        if total is None:
+            total = {'runs': 0, 'seconds': 0.0, 'cpuSeconds': 0.0, 'items': 0, 'unit': record['unit']}
+            totals[record['phase']] = total
+            order.append(record['phase'])
+        total['runs'] = total['runs'] + 1
+        total['seconds'] = total['seconds'] + record['seconds']
+        total['cpuSeconds'] = total['cpuSeconds'] + record['cpuSeconds']
+        total['items'] = total['items'] + record['items']
+    writeToLog('Metrics summary (phase: runs, seconds, cpu seconds, items, rate):', logFile)
+    for phase in order:
+        total = totals[phase]
+        total['rate'] = total['items'] / max(total['seconds'], 1e-9)
+        writeToLog('    ' + phase + ': ' + str(total['runs']) + ', ' + str(total['seconds']) + ', ' + str(total['cpuSeconds']) + ', '
+                   + str(total['items']) + ' ' + total['unit'] + ', ' + str(total['rate']) + ' ' + total['unit'] + '/s', logFile)
+    summary = {'phase': 'summary', 'peakRssBytes': peakRssBytes(), 'phases': totals}
+    appendToFile(metricsPath, json.dumps(summary, sort_keys=True) + '\n')
+
+#********************************************************************
+#********************************************************************
+#********************************************************************
+#
+#                       Genotype store
+#
+#********************************************************************
+#********************************************************************
+#********************************************************************
+
+#********************************************************************
+# A compact, array backed container of the genotypes of @numOfIndividuals individuals at @numOfLoci loci.
+# Each individual has a row of bytes.
+# In binary mode a genotype (0, 1 or 2) takes 2 bits, four genotypes in a byte.
+# Otherwise each allele takes a byte holding its index in allelesString, so up to 256 symbols are supported.
+# Missing genotypes are marked in a separate bitmask, one bit per genotype.
+# Genotypes are read and written as a pair of alleles (val1, val2), where (-1, -1) is a missing value.
+#********************************************************************
+class GenotypeStore(object):
+    # binary genotype code -> pair of alleles, as in ExtractWindow
+    BINARY_ALLELES = ((0, 0), (1, 0), (1, 1))
+
+    def __init__(self, numOfIndividuals, numOfLoci, binaryMode):
+        self.numOfIndividuals = numOfIndividuals
+        self.numOfLoci = numOfLoci
+        self.binaryMode = binaryMode
+        if binaryMode:
+            self.bytesPerRow = (numOfLoci + 3) // 4
+        else:
+            self.bytesPerRow = 2 * numOfLoci
+        self.maskBytesPerRow = (numOfLoci + 7) // 8
+        self.genotypes = bytearray(numOfIndividuals * self.bytesPerRow)
+        self.missing = bytearray(numOfIndividuals * self.maskBytesPerRow)
+
+    def set(self, indi, locus, val1, val2):
+        maskIndex = indi * self.maskBytesPerRow + (locus >> 3)
+        maskBit = 1 << (locus & 7)
+        if val1 == -1 or val2 == -1:
+            self.missing[maskIndex] |= maskBit
+            val1 = val2 = 0
+        else:
+            self.missing[maskIndex] &= ~maskBit
+        if self.binaryMode:
+            index = indi * self.bytesPerRow + (locus >> 2)
+            shift = (locus & 3) << 1
+            self.genotypes[index] = (self.genotypes[index] & ~(3 << shift)) | ((val1 + val2) << shift)
+        else:
+            if val1 > 255 or val2 > 255:
+                raise ValueError('GenotypeStore supports up to 256 allele symbols')
+            index = indi * self.bytesPerRow + 2 * locus
+            self.genotypes[index] = val1
+            self.genotypes[index + 1] = val2
+
+    def get(self, indi, locus):
+        if self.missing[indi * self.maskBytesPerRow + (locus >> 3)] & (1 << (locus & 7)):
+            return (-1, -1)
+        if self.binaryMode:
+            code = (self.genotypes[indi * self.bytesPerRow + (locus >> 2)] >> ((locus & 3) << 1)) & 3
+            return self.BINARY_ALLELES[code]
+        index = indi * self.bytesPerRow + 2 * locus
+        return (self.genotypes[index], self.genotypes[index + 1])
+
+    # All the genotypes of @indi, as a list of pairs of alleles.
+    def individual(self, indi):
+        return [self.get(indi, locus) for locus in range(self.numOfLoci)]
+
+    #****************************************************************
+    # The amount of loci valid (not missing) in both individuals, for every pair with missing values.
+    # Computed from the missing bitmasks with a popcount over each pair of rows.
+    # Returns a dict of dicts, as returned by calcDistances: counts[i][j] for i<j.
+    #****************************************************************
+    def validCounts(self):
+        n = self.numOfIndividuals
+        masks = []
+        for indi in range(n):
+            row = self.missing[indi * self.maskBytesPerRow:(indi + 1) * self.maskBytesPerRow]
+            masks.append(int.from_bytes(bytes(row), 'little'))
+        counts = dict()
+        for i in range(n):
+            for j in range(i+1, n):
+                missing = masks[i] | masks[j]
+                if missing:
+                    if counts.get(i) is None:
+                        counts[i] = dict()
+                    counts[i][j] = self.numOfLoci - bin(missing).count('1')
+        return counts
+
+    #****************************************************************
+    # A read only GenotypeStore over existing buffers (e.g. slices of a memory mapped cache file),
+    # laid out as in a GenotypeStore of the same dimensions.
+    #****************************************************************
+    @classmethod
+    def fromBuffers(cls, numOfIndividuals, numOfLoci, binaryMode, genotypes, missing):
+        store = cls(0, numOfLoci, binaryMode)
+        store.numOfIndividuals = numOfIndividuals
+        store.genotypes = genotypes
+        store.missing = missing
+        return store
+
+    #****************************************************************
+    # A read only GenotypeStore of individuals [@first, @last), sharing the buffers of this store.
+    #****************************************************************
+    def takeIndividuals(self, first, last):
+        genotypes = memoryview(self.genotypes)[first * self.bytesPerRow:last * self.bytesPerRow]
+        missing = memoryview(self.missing)[first * self.maskBytesPerRow:last * self.maskBytesPerRow]
+        return GenotypeStore.fromBuffers(last - first, self.numOfLoci, self.binaryMode, genotypes, missing)
+
+    #****************************************************************
+    # A new GenotypeStore holding the individuals of this store followed by the ones of @other, of the same loci.
+    #****************************************************************
+    def concatIndividuals(self, other):
+        if other.numOfLoci != self.numOfLoci or other.binaryMode != self.binaryMode:
+            raise ValueError('Only individuals of the same loci can be added to a GenotypeStore')
+        store = GenotypeStore(0, self.numOfLoci, self.binaryMode)
+        store.numOfIndividuals = self.numOfIndividuals + other.numOfIndividuals
+        store.genotypes = bytearray(self.genotypes) + bytearray(other.genotypes)
+        store.missing = bytearray(self.missing) + bytearray(other.missing)
+        return store
+
+    def totalBytes(self):
+        return len(self.genotypes) + len(self.missing)
+
+    def bytesPerGenotype(self):
+        return float(self.totalBytes()) / max(1, self.numOfIndividuals * self.numOfLoci)
+
+    #****************************************************************
+    # A new GenotypeStore holding only the given @loci, in the given order.
+    #****************************************************************
+    def takeLoci(self, loci):
+        window = GenotypeStore(self.numOfIndividuals, len(loci), self.binaryMode)
+        if np is None:
+            for indi in range(self.numOfIndividuals):
+                for position, l in enumerate(loci):
+                    val1, val2 = self.get(indi, l)
+                    window.set(indi, position, val1, val2)
+            return window
+        n = self.numOfIndividuals
+        loci = np.asarray(loci, dtype=np.int64)
+        missingBits = np.frombuffer(self.missing, dtype=np.uint8).reshape(n, self.maskBytesPerRow)
+        missing = ((missingBits[:, loci >> 3] >> (loci & 7)) & 1).astype(np.uint8)
+        rows = np.frombuffer(self.genotypes, dtype=np.uint8).reshape(n, self.bytesPerRow)
+        if self.binaryMode:
+            window.setBinaryCodes((rows[:, loci >> 2] >> ((loci & 3) << 1)) & 3, missing)
+        else:
+            window.missing[:] = np.packbits(missing, axis=1, bitorder='little').tobytes()
+            columns = np.stack([2 * loci, 2 * loci + 1], axis=1).ravel()
+            window.genotypes[:] = rows[:, columns].tobytes()
+        return window
+
+    #****************************************************************
+    # Sets all the genotypes of a binary store from (numpy) arrays of (individuals x loci):
+    # @codes holds the genotypes (0, 1 or 2) and @missing is non zero for missing genotypes.
+    #****************************************************************
+    def setBinaryCodes(self, codes, missing):
+        n = self.numOfIndividuals
+        missing = np.asarray(missing, dtype=np.uint8)
+        self.missing[:] = np.packbits(missing, axis=1, bitorder='little').tobytes()
+        padded = np.zeros((n, self.bytesPerRow * 4), dtype=np.uint8)
+        padded[:, :self.numOfLoci] = np.where(missing != 0, 0, codes)
+        padded = padded.reshape(n, self.bytesPerRow, 4)
+        packed = padded[:, :, 0] | (padded[:, :, 1] << 2) | (padded[:, :, 2] << 4) | (padded[:, :, 3] << 6)
+        self.genotypes[:] = packed.astype(np.uint8).tobytes()
+
+    #****************************************************************
+    # Dense (numpy) view of loci [@start, @end).
+    # alleleCounts[k][i][l] is the amount of copies of allele k individual i has at locus l (0 if the snp is missing).
+    # valid[i][l] is 1 if the snp of individual i at locus l is not missing.
+    #****************************************************************
+    def alleleCountsBatch(self, start, end, numOfAlleles):
+        n = self.numOfIndividuals
+        missingBits = np.frombuffer(self.missing, dtype=np.uint8).reshape(n, self.maskBytesPerRow)
+        missingBits = missingBits[:, start >> 3:(end + 7) >> 3]
+        offset = start & 7
+        valid = 1 - np.unpackbits(missingBits, axis=1, bitorder='little')[:, offset:offset + end - start]
+        alleleCounts = np.zeros((numOfAlleles, n, end - start), dtype=np.uint8)
+        rows = np.frombuffer(self.genotypes, dtype=np.uint8).reshape(n, self.bytesPerRow)
+        if self.binaryMode:
+            packed = rows[:, start >> 2:(end + 3) >> 2]
+            offset = start & 3
+            codes = (packed[:, :, None] >> np.array([0, 2, 4, 6], dtype=np.uint8)) & 3
+            codes = codes.reshape(n, -1)[:, offset:offset + end - start]
+            alleleCounts[0] = (2 - codes) * valid
+            alleleCounts[1] = codes * valid
+        else:
+            pairs = rows.reshape(n, self.numOfLoci, 2)[:, start:end, :]
+            for k in range(numOfAlleles):
+                alleleCounts[k] = ((pairs[:, :, 0] == k).astype(np.uint8) + (pairs[:, :, 1] == k)) * valid
+        return alleleCounts, valid
+
+#********************************************************************
+#********************************************************************
+#********************************************************************
+#
+#                       Genotype cache
+#
+#********************************************************************
+#********************************************************************
+#********************************************************************
+
+#********************************************************************
+# A folder of parsed inputs, so runs on the same input (with any window size, window index or shuffle) do not
+# parse it again. Each entry is a single file, <key>.gtc:
+#   a 32 bytes header (little endian) - 'NSGC', version (uint16), binaryMode (uint8), a pad byte,
+#   amount of alleles including the missing value (uint32), amount of individuals (uint64), amount of loci (uint64),
+#   4 reserved bytes.
+#   The genotypes and the missing bitmask of a GenotypeStore holding all the loci, each padded to 8 bytes.
+#   The allele counts of every locus (uint32), as calcFrequenciesPerLocus counts them.
+# The key is a hash of the content of the input and of the parameters used to parse it, so a changed input
+# gets a new entry. The hash of an input is kept in Sources/, next to the size and modification time of the
+# input it was computed for, and is only recomputed when they change.
+# Entries are memory mapped, so processes working on the same input share a single copy.
+#********************************************************************
+
+def _padTo8(n):
+    return (n + 7) & ~7
+
+#********************************************************************
+# The sha1 of the content of the file in @path.
+#********************************************************************
+def fileContentHash(path):
+    contentHash = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(READ_CHUNK_SIZE), b''):
+            contentHash.update(chunk)
+    return contentHash.hexdigest()
+
+#********************************************************************
+# Hash of the content of @inputFile. The hash is kept in @cacheFolder/Sources, and is reused as long as the
+# size and modification time of @inputFile do not change.
+# Returns the hash, and the hash the previous version of the input had (None if there was none).
+#********************************************************************
+def inputContentHash(inputFile, cacheFolder):
+    stat = os.stat(inputFile)
+    signature = str(stat.st_size) + ',' + str(stat.st_mtime_ns)
+    sourcePath = cacheFolder + "Sources/" + hashlib.sha1(os.path.abspath(inputFile).encode('utf-8')).hexdigest() + ".csv"
+    previousHash = None
+    if os.path.isfile(sourcePath):
+        with open(sourcePath) as f:
+            previousSignature, _, previousHash = f.readline().strip().rpartition(',')
+        if previousSignature == signature:
+            return previousHash, previousHash
+    contentHash = fileContentHash(inputFile)
+    makeDirs(sourcePath)
+    with openAtomically(sourcePath) as f:
+        f.write(signature + ',' + contentHash + '\n')
+    return contentHash, previousHash
+
+#********************************************************************
+# The key of the cache entry of an input with the given @contentHash, parsed with the given parameters.
+#********************************************************************
+def genotypeCacheKey(contentHash, params):
+    parsing = [contentHash, params['binaryMode'], params['allelesString'], params['alleleMissingValueChar'],
+               params['pivoted'], params['totalSnps'], params['totalIndividuals']]
+    return hashlib.sha1(repr(parsing).encode('utf-8')).hexdigest()
+
+#********************************************************************
+# The allele counts of every locus of @store, as calcFrequenciesPerLocus counts them:
+# counts[l][k] is the amount of copies of allele k at locus l, and counts[l][-1] is twice the amount of missing snps.
+# Returns a (loci x alleles) numpy array, or a list of lists when numpy is not available.
+#********************************************************************
+def calcAlleleCountsPerLocus(store, allelesString, logFile):
+    numOfAlleles = len(allelesString.split(','))+1
+    if np is None:
+        frequenciesPerLocus = calcFrequenciesPerLocus(store, logFile, allelesString)
+        return [frequenciesPerLocus[l] for l in range(store.numOfLoci)]
+    counts = np.zeros((store.numOfLoci, numOfAlleles), dtype=np.uint32)
+    for start in range(0, store.numOfLoci, LOCI_BATCH_SIZE):
+        end = min(start + LOCI_BATCH_SIZE, store.numOfLoci)
+        alleleCounts, valid = store.alleleCountsBatch(start, end, numOfAlleles - 1)
+        counts[start:end, :numOfAlleles - 1] = alleleCounts.sum(axis=1, dtype=np.uint32).T
+        counts[start:end, numOfAlleles - 1] = 2 * (store.numOfIndividuals - valid.sum(axis=0, dtype=np.uint32))
+    return counts
+
+def writeGenotypeCacheFile(store, alleleCounts, numOfAlleles, cachePath):
+    header = GENOTYPE_CACHE_HEADER.pack(GENOTYPE_CACHE_MAGIC, GENOTYPE_CACHE_VERSION, 1 if store.binaryMode else 0,
+                                        numOfAlleles, store.numOfIndividuals, store.numOfLoci)
+    if np is not None:
+        counts = np.asarray(alleleCounts, dtype='<u4').tobytes()
+    else:
+        counts = array('I', [c for locusCounts in alleleCounts for c in locusCounts])
+        if sys.byteorder == 'big':
+            counts.byteswap()
+        counts = counts.tobytes()
+    with openAtomically(cachePath, "wb") as f:
+        f.write(header)
+        for part in (store.genotypes, store.missing):
+            f.write(part)
+            f.write(b'\0' * (_padTo8(len(part)) - len(part)))
+        f.write(counts)
+
+#********************************************************************
+# Memory maps the cache entry in @cachePath.
+# Returns a read only GenotypeStore of all the loci, and the allele counts per locus (see calcAlleleCountsPerLocus).
+#********************************************************************
+def readGenotypeCacheFile(cachePath):
+    with open(cachePath, 'rb') as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    magic, version, binaryMode, numOfAlleles, numOfIndividuals, numOfLoci = GENOTYPE_CACHE_HEADER.unpack(buffer[:GENOTYPE_CACHE_HEADER.size])
+    if magic != GENOTYPE_CACHE_MAGIC or version != GENOTYPE_CACHE_VERSION:
+        raise ValueError('Not a genotype cache file of version ' + str(GENOTYPE_CACHE_VERSION) + ': ' + cachePath)
+    layout = GenotypeStore(0, numOfLoci, binaryMode == 1)
+    view = memoryview(buffer)
+    offset = GENOTYPE_CACHE_HEADER.size
+    genotypes = view[offset:offset + numOfIndividuals * layout.bytesPerRow]
+    offset = offset + _padTo8(len(genotypes))
+    missing = view[offset:offset + numOfIndividuals * layout.maskBytesPerRow]
+    offset = offset + _padTo8(len(missing))
+    if len(buffer) != offset + 4 * numOfLoci * numOfAlleles:
+        raise ValueError('Genotype cache file is truncated: ' + cachePath)
+    if np is not None:
+        alleleCounts = np.frombuffer(buffer, dtype='<u4', count=numOfLoci * numOfAlleles, offset=offset).reshape(numOfLoci, numOfAlleles)
+    else:
+        counts = array('I')
+        counts.frombytes(view[offset:])
+        if sys.byteorder == 'big':
+            counts.byteswap()
+        alleleCounts = [counts[l * numOfAlleles:(l + 1) * numOfAlleles].tolist() for l in range(numOfLoci)]
+    store = GenotypeStore.fromBuffers(numOfIndividuals, numOfLoci, binaryMode == 1, genotypes, missing)
+    return store, alleleCounts
+
+#********************************************************************
+# Removes the least recently used entries of @cacheFolder until it holds at most @maxBytes.
+# The entry in @keepPath is never removed.
+#********************************************************************
+def evictGenotypeCache(cacheFolder, maxBytes, keepPath, logFile):
+    entries = []
+    for name in os.listdir(cacheFolder):
+        if name.endswith(".gtc"):
+            path = cacheFolder + name
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+    totalBytes = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if totalBytes <= maxBytes:
+            break
+        if os.path.abspath(path) == os.path.abspath(keepPath):
+            continue
+        try:
+            os.remove(path)
+            writeToLog('Evicted genotype cache entry ' + path, logFile)
+        except OSError:
+            pass
+        totalBytes = totalBytes - size
+
+#********************************************************************
+# Returns the parsed input (a read only GenotypeStore of all the loci, and the allele counts per locus) from the
+# cache in @cacheFolder. The input is parsed, and added to the cache, only when the cache has no entry for it.
+# The entry of the previous version of a changed input is removed.
+#********************************************************************
+def loadGenotypeCache(params, cacheFolder, logFile, maxBytes=GENOTYPE_CACHE_MAX_BYTES):
+    if not cacheFolder.endswith('/'):
+        cacheFolder = cacheFolder + '/'
+    makeDirs(cacheFolder)
+    contentHash, previousHash = inputContentHash(params['inputFile'], cacheFolder)
+    cachePath = cacheFolder + genotypeCacheKey(contentHash, params) + ".gtc"
+    if previousHash is not None and previousHash != contentHash:
+        stalePath = cacheFolder + genotypeCacheKey(previousHash, params) + ".gtc"
+        if os.path.isfile(stalePath):
+            writeToLog('Input changed, removing genotype cache entry ' + stalePath, logFile)
+            os.remove(stalePath)
+    if os.path.isfile(cachePath):
+        writeToLog('Reading genotype cache ' + cachePath, logFile)
+        # The modification time marks the last use, for the eviction
+        os.utime(cachePath, None)
+    else:
+        writeToLog('Genotype cache has no entry for ' + params['inputFile'] + ', parsing it', logFile)
+        store = readRandomWindow(params['inputFile'], params['totalSnps'], 0, "", params['totalSnps'], params['totalIndividuals'],
+                                 params['allelesString'], params['alleleMissingValueChar'], params['binaryMode'], params['pivoted'])
+        alleleCounts = calcAlleleCountsPerLocus(store, params['allelesString'], logFile)
+        writeGenotypeCacheFile(store, alleleCounts, len(params['allelesString'].split(','))+1, cachePath)
+        writeToLog('Genotype cache entry written to ' + cachePath, logFile)
+        evictGenotypeCache(cacheFolder, maxBytes, cachePath, logFile)
+    return readGenotypeCacheFile(cachePath)
+
+#********************************************************************
+# The frequencies of the (sorted) @loci of a window, as calcFrequenciesPerLocus returns them for the window.
+#********************************************************************
+def windowFrequenciesFromCounts(alleleCounts, loci):
+    if np is not None and isinstance(alleleCounts, np.ndarray):
+        rows = alleleCounts[np.asarray(loci, dtype=np.int64)].tolist()
+    else:
+        rows = [list(alleleCounts[l]) for l in loci]
+    return dict(enumerate(rows))
 
 #********************************************************************
 #********************************************************************
@@ -99,19 +713,57 @@ def writeToLog(msg, logPath):
 #********************************************************************
 #********************************************************************
 
-def writeDistancesToFile(distances, totalCount, output):
+#********************************************************************
+# Writes the upper triangle of @distances, each divided by @totalCount.
+# When @counts (the valid snps of pairs with missing values, as returned by calcDistances) is given,
+# the distance of such a pair is divided by its own amount of valid snps.
+#********************************************************************
+def writeDistancesToFile(distances, totalCount, output, counts=None):
     numOfIndividuals = len(distances.keys())
-    makeDirs(output)
-    with open(output, "w") as f:
+    with openAtomically(output) as f:
         for i in range(0, numOfIndividuals-1):
+            pairCounts = dict() if counts is None else counts.get(i, dict())
             for j in range(i+1, numOfIndividuals):
-                f.write(str(float(distances.get(i).get(j))/totalCount)+',')
+                f.write(str(float(distances.get(i).get(j))/max(1, pairCounts.get(j, totalCount)))+',')
             f.write('\n')
 
-def writeCountsToFile(defaultAmount,counts,countsPath):
-    makeDirs(countsPath)
-    with open(countsPath, "w") as f:
-        f.write('DefaultAmountOfSnps ' + str(defaultAmount) + '\n')
+#********************************************************************
+# Same as writeDistancesToFile, for a full (numpy) matrix. Only the upper triangle is written.
+# When the full matrix of valid snps @counts is given, each distance is divided by its pair's count.
+#********************************************************************
+def writeDistanceMatrixToFile(distances, totalCount, output, counts=None):
+    numOfIndividuals = distances.shape[0]
+    with openAtomically(output) as f:
+        for i in range(0, numOfIndividuals-1):
+            if counts is None:
+                row = (distances[i, i+1:] / float(totalCount)).tolist()
+            else:
+                row = (distances[i, i+1:] / np.maximum(1, counts[i, i+1:])).tolist()
+            f.write(','.join([str(d) for d in row])+',')
+            f.write('\n')
+
+#********************************************************************
+# Same as writeCountsToFile, for a full (numpy) matrix of valid snps per pair.
+#********************************************************************
+def writeCountsMatrixToFile(defaultAmount, counts, countsPath, normalization='total'):
+    numOfIndividuals = counts.shape[0]
+    with openAtomically(countsPath) as f:
+        f.write(countsHeader(defaultAmount, normalization))
+        f.write('If there are missing values, they will be listed below in the following format: \n')
+        f.write('<index of first individual>,<index of second individual>,<# of valid snps>\n')
+        for i in range(0, numOfIndividuals-1):
+            for j in np.nonzero(counts[i, i+1:] < defaultAmount)[0].tolist():
+                f.write(str(i)+','+str(i+1+j)+','+str(int(counts[i, i+1+j]))+'\n')
+
+#********************************************************************
+# First line of a Counts file. The normalization follows the default amount, so readers of the amount are not affected.
+#********************************************************************
+def countsHeader(defaultAmount, normalization):
+    return 'DefaultAmountOfSnps ' + str(defaultAmount) + ' Normalization ' + normalization + '\n'
+
+def writeCountsToFile(defaultAmount,counts,countsPath, normalization='total'):
+    with openAtomically(countsPath) as f:
+        f.write(countsHeader(defaultAmount, normalization))
         f.write('If there are missing values, they will be listed below in the following format: \n')
         f.write('<index of first individual>,<index of second individual>,<# of valid snps>\n')
         for i in counts.keys():
@@ -120,8 +772,7 @@ def writeCountsToFile(defaultAmount,counts,countsPath):
 
 def writeFrequenciesPerLocusToFile(frequenciesPerLocus, frequenciesPerLocusPath):
     numOfLoci = len(frequenciesPerLocus.items())
-    makeDirs(frequenciesPerLocusPath)
-    with open(frequenciesPerLocusPath, "w") as f:
+    with openAtomically(frequenciesPerLocusPath) as f:
         wrCsv = csv.writer(f, lineterminator='\n')
         for l in range(0, numOfLoci):
             #except list.
@@ -138,6 +789,185 @@ def readFrequenciesPerLocusFile(frequenciesPerLocusPath):
             frequenciesPerLocus[i] = y
     return frequenciesPerLocus
 
+#********************************************************************
+# Same as writeDistancesToFile, for a condensed upper triangle (a list or numpy array, row by row, i<j).
+# When the condensed valid snps @counts are given, each distance is divided by its pair's count.
+#********************************************************************
+def writeCondensedDistancesToFile(distances, numOfIndividuals, totalCount, output, counts=None):
+    with openAtomically(output) as f:
+        start = 0
+        for i in range(0, numOfIndividuals-1):
+            end = start + numOfIndividuals-1-i
+            row = distances[start:end]
+            if np is not None and isinstance(row, np.ndarray):
+                row = row.tolist()
+            if counts is None:
+                f.write(','.join([str(float(d)/totalCount) for d in row])+',')
+            else:
+                f.write(','.join([str(float(d)/max(1, c)) for d, c in zip(row, counts[start:end])])+',')
+            f.write('\n')
+            start = end
+
+#********************************************************************
+# Same as writeCountsToFile, for a condensed upper triangle of valid snps per pair.
+# When @counts is None only the header is written - as if no snp was missing.
+#********************************************************************
+def writeCondensedCountsToFile(defaultAmount, counts, numOfIndividuals, countsPath, normalization='total'):
+    with openAtomically(countsPath) as f:
+        f.write(countsHeader(defaultAmount, normalization))
+        f.write('If there are missing values, they will be listed below in the following format: \n')
+        f.write('<index of first individual>,<index of second individual>,<# of valid snps>\n')
+        if counts is None:
+            return
+        index = 0
+        for i in range(0, numOfIndividuals-1):
+            if np is not None and isinstance(counts, np.ndarray):
+                row = counts[index:index + numOfIndividuals-1-i]
+                for j in np.nonzero(row < defaultAmount)[0].tolist():
+                    f.write(str(i)+','+str(i+1+j)+','+str(int(row[j]))+'\n')
+                index = index + numOfIndividuals-1-i
+                continue
+            for j in range(i+1, numOfIndividuals):
+                if counts[index] < defaultAmount:
+                    f.write(str(i)+','+str(j)+','+str(int(counts[index]))+'\n')
+                index = index + 1
+
+#********************************************************************
+# Converts the distances and the valid counts returned by the engines to condensed upper triangles (row by row, i<j).
+#********************************************************************
+def toCondensed(distances, counts, numOfIndividuals, numOfSnpsInWindow):
+    if np is not None and isinstance(distances, np.ndarray):
+        upper = np.triu_indices(numOfIndividuals, 1)
+        return distances[upper], counts[upper]
+    condensedDistances = []
+    condensedCounts = []
+    for i in range(numOfIndividuals-1):
+        for j in range(i+1, numOfIndividuals):
+            condensedDistances.append(distances[i][j])
+            condensedCounts.append(counts.get(i, {}).get(j, numOfSnpsInWindow))
+    return condensedDistances, condensedCounts
+
+#********************************************************************
+# Sums the condensed @part into @accumulated (None for the first part).
+#********************************************************************
+def addCondensed(accumulated, part):
+    if np is not None:
+        part = np.asarray(part, dtype=np.float64)
+        return part.copy() if accumulated is None else accumulated + part
+    if accumulated is None:
+        return list(part)
+    return [a + b for a, b in zip(accumulated, part)]
+
+#********************************************************************
+# Writes a binary distances file: a 32 byte header followed by the condensed upper triangle (row by row, i<j) as
+# little endian floats of the given @dtype ('float64' or 'float32').
+# Header (little endian): 'NSTM', version (uint16), dtype code (uint8, 1=float32, 2=float64),
+# normalization code (uint8, 0=total, 1=valid), amount of individuals (uint64), amount of snps (uint64), 8 reserved bytes.
+# @distances are the condensed sums of distances, divided here by @totalCount or, when given, by the condensed @counts.
+#********************************************************************
+def writeBinaryDistancesFile(distances, numOfIndividuals, totalCount, output, counts=None, normalization='total', dtype='float64'):
+    header = BINARY_MATRIX_HEADER.pack(BINARY_MATRIX_MAGIC, BINARY_MATRIX_VERSION, BINARY_MATRIX_DTYPES[dtype],
+                                       BINARY_MATRIX_NORMALIZATIONS[normalization], numOfIndividuals, totalCount)
+    with openAtomically(output, "wb") as f:
+        f.write(header)
+        if np is not None:
+            distances = np.asarray(distances, dtype=np.float64)
+            if counts is None:
+                distances = distances / float(totalCount)
+            else:
+                distances = distances / np.maximum(1, np.asarray(counts, dtype=np.float64))
+            f.write(distances.astype('<f8' if dtype == 'float64' else '<f4').tobytes())
+            return
+        if counts is None:
+            values = array('d' if dtype == 'float64' else 'f', [float(d)/totalCount for d in distances])
+        else:
+            values = array('d' if dtype == 'float64' else 'f', [float(d)/max(1, c) for d, c in zip(distances, counts)])
+        if sys.byteorder == 'big':
+            values.byteswap()
+        f.write(values.tobytes())
+
+#********************************************************************
+# Reads the header of a binary distances file, or returns None if @distancesPath is not one.
+# Returns a dict with the amount of individuals, dtype, normalization and amount of snps.
+#********************************************************************
+def readBinaryDistancesHeader(distancesPath):
+    with open(distancesPath, 'rb') as f:
+        data = f.read(BINARY_MATRIX_HEADER.size)
+    if len(data) < BINARY_MATRIX_HEADER.size or data[:4] != BINARY_MATRIX_MAGIC:
+        return None
+    magic, version, dtypeCode, normalizationCode, numOfIndividuals, totalCount = BINARY_MATRIX_HEADER.unpack(data)
+    if version != BINARY_MATRIX_VERSION:
+        raise ValueError('Unsupported binary distances file version ' + str(version) + ' in ' + distancesPath)
+    dtypes = dict((code, name) for name, code in BINARY_MATRIX_DTYPES.items())
+    normalizations = dict((code, name) for name, code in BINARY_MATRIX_NORMALIZATIONS.items())
+    return {'numOfIndividuals': numOfIndividuals, 'dtype': dtypes[dtypeCode], 'normalization': normalizations[normalizationCode], 'totalCount': totalCount}
+
+#********************************************************************
+# Reads a file written by writeDistancesToFile or writeBinaryDistancesFile as a condensed upper triangle
+# (a list, or a numpy array for binary files when numpy is available, row by row, i<j).
+#********************************************************************
+def readDistancesFile(distancesPath):
+    header = readBinaryDistancesHeader(distancesPath)
+    if header is not None:
+        dtype = header['dtype']
+        if np is not None:
+            return np.fromfile(distancesPath, dtype='<f8' if dtype == 'float64' else '<f4', offset=BINARY_MATRIX_HEADER.size).astype(np.float64)
+        values = array('d' if dtype == 'float64' else 'f')
+        with open(distancesPath, 'rb') as f:
+            f.seek(BINARY_MATRIX_HEADER.size)
+            values.frombytes(f.read())
+        if sys.byteorder == 'big':
+            values.byteswap()
+        return list(values)
+    distances = []
+    with open(distancesPath) as f:
+        for line in f:
+            if len(line)>1:
+                distances.extend([float(d) for d in line.replace(",\n","").split(',')])
+    return distances
+
+#********************************************************************
+# Reads a file written by writeCountsToFile.
+# Returns the default amount of snps, a dict mapping (i,j) to the amount of valid snps for pairs with missing values,
+# and the normalization used ('total' for files written before it was recorded).
+#********************************************************************
+def readCountsFile(countsPath):
+    counts = dict()
+    with open(countsPath) as f:
+        header = f.readline().split()
+        defaultAmount = int(header[1])
+        normalization = header[3] if len(header) > 3 else 'total'
+        # skip the format description
+        f.readline()
+        f.readline()
+        for line in f:
+            parts = line.split(',')
+            if len(parts) == 3:
+                counts[(int(parts[0]), int(parts[1]))] = int(parts[2])
+    return defaultAmount, counts, normalization
+
+#********************************************************************
+# Reads the outputs of a single window.
+# Returns the amount of snps in the window, and the condensed (row by row, i<j) sums of distances - not divided
+# by any amount of snps - and amounts of valid snps, so windows can be merged whatever normalization they used.
+#********************************************************************
+def readWindowFiles(distancesPath, countsPath, numOfIndividuals):
+    defaultAmount, missingCounts, normalization = readCountsFile(countsPath)
+    counts = []
+    for i in range(numOfIndividuals-1):
+        for j in range(i+1, numOfIndividuals):
+            counts.append(missingCounts.get((i, j), defaultAmount))
+    distances = readDistancesFile(distancesPath)
+    if np is not None and isinstance(distances, np.ndarray):
+        counts = np.asarray(counts, dtype=np.float64)
+        distances = distances * (np.maximum(1, counts) if normalization == 'valid' else defaultAmount)
+        return defaultAmount, distances, counts
+    if normalization == 'valid':
+        distances = [d*max(1, c) for d, c in zip(distances, counts)]
+    else:
+        distances = [d*defaultAmount for d in distances]
+    return defaultAmount, distances, counts
+
 #********************************************************************
 # Sum the non missing entries at locus l
 #********************************************************************
@@ -152,8 +982,30 @@ def nonMissingEntiresAtLocus(frequenciesPerLocus, l):
 # reads the RANDOM window in size @windowSize in index @windowIndex from the @genesFile, based on the @randomIndexListFile
 # The data in the @randomIndexListFile should be the output of buildShuffledArray(TotalSnps).
 # To run on a single machine use @windowSize=TotalSnps and @windowIndex=0.
+# The loci in the returned GenotypeStore are ordered by their position in the @inputFile.
 #********************************************************************
 def readRandomWindow(inputFile, windowSize, windowIndex, shuffeledFile, totalSnps, totalIndividuals, allelesString, alleleMissingValueChar, binaryMode, pivoted):
+    allelesToUse = windowLoci(windowSize, windowIndex, shuffeledFile, totalSnps)
+    if allelesToUse is None:
+        return None
+
+    window = GenotypeStore(totalIndividuals, len(allelesToUse), binaryMode)
+
+    inputFormat = genotypeFileFormat(inputFile)
+    if inputFormat == 'plink':
+        return ExtractWindowPlink(allelesToUse, inputFile, totalIndividuals, window, binaryMode, totalSnps)
+    if inputFormat == 'vcf':
+        return ExtractWindowVcf(allelesToUse, inputFile, totalIndividuals, window, allelesString, binaryMode, totalSnps)
+    if pivoted:
+        return ExtractWindowPivoted(allelesToUse, inputFile, totalIndividuals, window, allelesString, alleleMissingValueChar, binaryMode, totalSnps)
+    else:
+        return ExtractWindow(allelesToUse, inputFile, totalIndividuals, window, allelesString, alleleMissingValueChar, binaryMode, totalSnps)
+
+#********************************************************************
+# The loci of window @windowIndex, read from the @shuffeledFile (or all the snps, when it is ""), in their shuffled order.
+# Returns None when the window is out of the input.
+#********************************************************************
+def windowLoci(windowSize, windowIndex, shuffeledFile, totalSnps):
     startIndex = windowSize*windowIndex
     endIndex = windowSize*(windowIndex+1)
     if startIndex >= totalSnps :
@@ -163,100 +1015,304 @@ def readRandomWindow(inputFile, windowSize, windowIndex, shuffeledFile, totalSnp
     if(shuffeledFile!=""):
         randomListFile = open(shuffeledFile,'r')
         randomList = randomListFile.readline().split(',')
+        randomListFile.close()
     else:
         # We use all the snps
         randomList = range(totalSnps)
     # We take the (random) alleles from the random list
     allelesToUse = randomList[startIndex:endIndex]
-    allelesToUse = [int(x) for x in allelesToUse]
+    return [int(x) for x in allelesToUse]
+
+#********************************************************************
+# Maps every locus in the input to its position in the window, or to -1 if it is not in the window.
+# Loci in the window are ordered by their position in the input file.
+#********************************************************************
+def selectLoci(allelsToUse, totalSnps):
+    if totalSnps is None:
+        totalSnps = max(allelsToUse)+1
+    lociPositions = array('i', [-1]) * totalSnps
+    for position, l in enumerate(sorted(allelsToUse)):
+        lociPositions[l] = position
+    return lociPositions
 
-    window = dict()
-    for indi in range(0,totalIndividuals):
-        window[indi] = dict()
+#********************************************************************
+# Yields (index, line) for the lines of @fp, reading about @READ_CHUNK_SIZE bytes at a time.
+#********************************************************************
+def readLinesInChunks(fp):
+    index = 0
+    while True:
+        lines = fp.readlines(READ_CHUNK_SIZE)
+        if not lines:
+            return
+        for line in lines:
+            yield index, line
+            index = index + 1
 
-    if pivoted:
-        return ExtractWindowPivoted(allelesToUse, inputFile, totalIndividuals, window, allelesString, alleleMissingValueChar, binaryMode)
+#********************************************************************
+# When all @numOfTokens tokens in @line have the same width (e.g. '0 1 2' or 'A,C A,T'), returns the width.
+# Tokens can then be sliced directly out of the line. Otherwise returns None.
+#********************************************************************
+def fixedTokenWidth(line, numOfTokens):
+    if numOfTokens < 1 or (len(line)+1) % numOfTokens != 0:
+        return None
+    width = (len(line)+1) // numOfTokens - 1
+    if width < 1:
+        return None
+    separators = line[width::width+1]
+    # exactly numOfTokens-1 white spaces, all of them between the tokens
+    if len(separators) != numOfTokens-1 or (separators and not separators.isspace()):
+        return None
+    if line.count(' ') + line.count('\t') != numOfTokens-1:
+        return None
+    return width
+
+#********************************************************************
+# Builds a function mapping a single token of the input to its pair of alleles, (-1, -1) for a missing value.
+# Decoded tokens are memoized, as the input has very few distinct tokens.
+#********************************************************************
+def buildTokenDecoder(allelesString, alleleMissingValueChar, binaryMode, strictBinary):
+    if binaryMode:
+        decoded = {'0': (0, 0), '1': (1, 0), '2': (1, 1), '-': (-1, -1)}
     else:
-        return ExtractWindow(allelesToUse, inputFile, totalIndividuals, window, allelesString, alleleMissingValueChar, binaryMode)
+        decoded = dict()
+        alleleSymbols = allelesString.split(',')
+    def decode(token):
+        ans = decoded.get(token)
+        if ans is not None:
+            return ans
+        if binaryMode:
+            if strictBinary:
+                raise ValueError('value ' + token + ' is not one of 0,1,2,-')
+            return (-1, -1)
+        alleles = token.split(',')
+        # missing value
+        if (alleles[0] == alleleMissingValueChar) or (alleles[1] == alleleMissingValueChar):
+            ans = (-1, -1)
+        else:
+            ans = (alleleSymbols.index(alleles[0]), alleleSymbols.index(alleles[1]))
+        decoded[token] = ans
+        return ans
+    return decode
 
 #********************************************************************
 # Extracting the window when the input schema is: in each line i we have all of the alleles of individual i.
+# Lines of loci which are not in the window are skipped without being split, and reading stops after the last one.
 #********************************************************************
-def ExtractWindowPivoted(allelsToUse, inputFile, totalIndividuals, window, allelesString, alleleMissingValueChar,binaryMode):
-    alleleSymbols = allelesString.split(',')
-    fp = open(inputFile, 'r')
-    lociCounter = 0
-    for i, line in enumerate(fp):
-        if i in allelsToUse:
+def ExtractWindowPivoted(allelsToUse, inputFile, totalIndividuals, window, allelesString, alleleMissingValueChar,binaryMode, totalSnps=None):
+    lociPositions = selectLoci(allelsToUse, totalSnps)
+    lastLocus = max(allelsToUse)
+    decode = buildTokenDecoder(allelesString, alleleMissingValueChar, binaryMode, False)
+    with open(inputFile, 'r') as fp:
+        for i, line in readLinesInChunks(fp):
+            if i > lastLocus:
+                break
+            position = lociPositions[i]
+            if position < 0:
+                continue
             parts = line.split()
             for indi in range(0, totalIndividuals):
-                if binaryMode:  
-                        if parts[indi]=='1':
-                            val1=1
-                            val2=0
-                        elif parts[indi]=='2':
-                            val1=1
-                            val2=1
-                        elif parts[indi]=='0':
-                            val1=0
-                            val2=0
-                        else:
-                            val1=-1
-                            val2=-1
-                else:
-                    alleles = parts[indi].split(',')
-                    # missing value                
-                    if (alleles[0] == alleleMissingValueChar) or (alleles[1] == alleleMissingValueChar):
-                        val1 = -1
-                        val2 = -1
-                    else:
-                        val1 = alleleSymbols.index(alleles[0])
-                        val2 = alleleSymbols.index(alleles[1])
-                window[indi][lociCounter] = [val1, val2]
-            lociCounter = lociCounter + 1
-    fp.close()
+                val1, val2 = decode(parts[indi])
+                window.set(indi, position, val1, val2)
     return window
     
 #********************************************************************
 # Extracting the window when the input schema is: in each line i we have all of the individuals alleles at loci i.
+# Only the columns of the window are decoded. When all tokens have the same width they are sliced out of the line,
+# otherwise the line is split up to the last column of the window.
+#********************************************************************
+def ExtractWindow(allelsToUse, inputFile, totalIndividuals, window, allelesString, alleleMissingValueChar,binaryMode, totalSnps=None):    
+    lociPositions = selectLoci(allelsToUse, totalSnps)
+    numOfColumns = len(lociPositions)
+    selectedColumns = sorted(allelsToUse)
+    lastColumn = selectedColumns[-1]
+    decode = buildTokenDecoder(allelesString, alleleMissingValueChar, binaryMode, True)
+    with open(inputFile, 'r') as fp:
+        for indi, line in readLinesInChunks(fp):
+            if len(line)>2:
+                line = line.strip()
+                width = fixedTokenWidth(line, numOfColumns)
+                if width is None:
+                    loci = line.split(None, lastColumn+1)
+                for position, l in enumerate(selectedColumns):
+                    if width is None:
+                        token = loci[l]
+                    else:
+                        token = line[l*(width+1):l*(width+1)+width]
+                    try:
+                        val1, val2 = decode(token)
+                    except ValueError:
+                        error_msg = 'ERROR - you are running in binary mode, and there is a value which isnt one of 0,1,2,-. Perhaps you forgat to set binaryMode to False?.\n At line ' + str(indi+1) + ', column ' +str(l) +', value is ' + token
+                        raise ValueError(error_msg)
+                    window.set(indi, position, val1, val2)
+    return window
+
+#********************************************************************
+#********************************************************************
+#********************************************************************
+#
+#                     PLINK and VCF readers
+#
+#********************************************************************
+#********************************************************************
+#********************************************************************
+
+# The first bytes of a SNP major PLINK .bed file.
+PLINK_BED_MAGIC = b'\x6c\x1b\x01'
+# PLINK 2 bit genotype -> amount of copies of the first (A1) allele. 1 is a missing genotype.
+PLINK_GENOTYPE_CODES = (2, -1, 1, 0)
+
+#********************************************************************
+# 'plink' for a PLINK .bed file, 'vcf' for a .vcf or .vcf.gz file, and 'text' for the BuildMatrix text format.
+#********************************************************************
+def genotypeFileFormat(inputFile):
+    if inputFile.endswith('.bed'):
+        return 'plink'
+    if inputFile.endswith('.vcf') or inputFile.endswith('.vcf.gz') or inputFile.endswith('.vcf.bgz'):
+        return 'vcf'
+    return 'text'
+
+def openVcf(inputFile):
+    if inputFile.endswith('.vcf'):
+        return open(inputFile, 'r')
+    # bgzip files are series of gzip members, which gzip reads as a single stream
+    return gzip.open(inputFile, 'rt')
+
 #********************************************************************
-def ExtractWindow(allelsToUse, inputFile, totalIndividuals, window, allelesString, alleleMissingValueChar,binaryMode):    
-    alleleSymbols = allelesString.split(',')    
-    fp = open(inputFile, 'r')
-    line_counter=0
-    for indi, line in enumerate(fp):
-        line_counter+=1
-        if len(line)>2:
-            loci = line.split()
-            for l in range(len(loci)):                
-                if l in allelsToUse:
-                    if binaryMode:  
-                        if loci[l]=='1':
-                            val1=1
-                            val2=0
-                        elif loci[l]=='2':
-                            val1=1
-                            val2=1
-                        elif loci[l]=='0':
-                            val1=0
-                            val2=0
-                        elif loci[l]=='-':
-                            val1=-1
-                            val2=-1
-                        else:
-                            error_msg = 'ERROR - you are running in binary mode, and there is a value which isnt one of 0,1,2,-. Perhaps you forgat to set binaryMode to False?.\n At line ' + str(line_counter) + ', column ' +str(l) +', value is ' + loci[l]
-                            raise ValueError(error_msg)
+# The ids of the individuals of a PLINK or VCF input, in the order of the rows of the matrix:
+# '<FID> <IID>' from the .fam file, or the sample names in the VCF header.
+# Returns None for the text format, which has no ids.
+#********************************************************************
+def individualIds(inputFile):
+    inputFormat = genotypeFileFormat(inputFile)
+    if inputFormat == 'plink':
+        with open(inputFile[:-len('.bed')] + '.fam') as f:
+            return [' '.join(line.split()[:2]) for line in f if line.strip() != ""]
+    if inputFormat == 'vcf':
+        with openVcf(inputFile) as f:
+            for line in f:
+                if line.startswith('#CHROM'):
+                    return line.rstrip('\n').split('\t')[9:]
+                if not line.startswith('#'):
+                    break
+        raise ValueError('No #CHROM header line in ' + inputFile)
+    return None
+
+#********************************************************************
+# Writes the ids of the individuals of a PLINK or VCF @inputFile, one per line, in the order of the matrix.
+# Use it to build the individuals to sample sites list (-pmn) of NetStruct_Hierarchy.
+#********************************************************************
+def writeIndividualIds(inputFile, totalIndividuals, outputPath):
+    ids = individualIds(inputFile)
+    if ids is None:
+        return
+    if len(ids) != totalIndividuals:
+        raise ValueError('totalIndividuals is ' + str(totalIndividuals) + ' but ' + inputFile + ' has ' + str(len(ids)) + ' individuals')
+    with openAtomically(outputPath) as f:
+        for individualId in ids:
+            f.write(individualId + '\n')
+
+#********************************************************************
+# Extracting the window from a SNP major PLINK .bed file (with its .fam next to it), through a memory map.
+# Each variant is a block of ceil(individuals/4) bytes, 2 bits per individual (low bits first):
+# 00 - two copies of A1, 01 - missing, 10 - heterozygous, 11 - two copies of A2.
+# The genotype stored is the amount of copies of A1, as '0', '1' and '2' are in binary mode.
+#********************************************************************
+def ExtractWindowPlink(allelsToUse, inputFile, totalIndividuals, window, binaryMode, totalSnps=None):
+    if not binaryMode:
+        raise ValueError('PLINK .bed inputs are biallelic, run them with binaryMode set to True')
+    ids = individualIds(inputFile)
+    if len(ids) != totalIndividuals:
+        raise ValueError('totalIndividuals is ' + str(totalIndividuals) + ' but ' + inputFile + ' has ' + str(len(ids)) + ' individuals')
+    bytesPerVariant = (totalIndividuals + 3) // 4
+    selectedLoci = sorted(allelsToUse)
+    with open(inputFile, 'rb') as f:
+        bed = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        if bed[:3] != PLINK_BED_MAGIC:
+            raise ValueError(inputFile + ' is not a SNP major PLINK .bed file')
+        if len(bed) < 3 + (selectedLoci[-1] + 1) * bytesPerVariant:
+            raise ValueError(inputFile + ' has less than ' + str(selectedLoci[-1] + 1) + ' variants')
+        if np is not None:
+            variants = np.frombuffer(bed, dtype=np.uint8, count=len(bed) - 3, offset=3)
+            variants = variants[:(len(bed) - 3) // bytesPerVariant * bytesPerVariant].reshape(-1, bytesPerVariant)
+            bits = (variants[np.asarray(selectedLoci, dtype=np.int64)][:, :, None] >> np.array([0, 2, 4, 6], dtype=np.uint8)) & 3
+            bits = bits.reshape(len(selectedLoci), -1)[:, :totalIndividuals].T
+            codes = np.array([2, 0, 1, 0], dtype=np.uint8)[bits]
+            window.setBinaryCodes(codes, bits == 1)
+            del variants, bits
+        else:
+            for position, l in enumerate(selectedLoci):
+                start = 3 + l * bytesPerVariant
+                block = bed[start:start + bytesPerVariant]
+                for indi in range(totalIndividuals):
+                    code = PLINK_GENOTYPE_CODES[(block[indi >> 2] >> ((indi & 3) << 1)) & 3]
+                    if code == -1:
+                        window.set(indi, position, -1, -1)
                     else:
-                        alleles = loci[l].split(',')
-                        # missing value
-                        if (alleles[0] == alleleMissingValueChar) or (alleles[1] == alleleMissingValueChar):                            
-                            val1 = -1
-                            val2 = -1
-                        else:
-                            val1 = alleleSymbols.index(alleles[0])
-                            val2 = alleleSymbols.index(alleles[1])
-                    window[indi][l] = [val1, val2]                
-    fp.close()
+                        window.set(indi, position, *GenotypeStore.BINARY_ALLELES[code])
+    finally:
+        bed.close()
+    return window
+
+#********************************************************************
+# Builds a function mapping a VCF GT field ('0/1', '1|1', './.', '0' ...) to its pair of alleles, (-1, -1) for a
+# missing value. In binary mode any alternate allele is counted as allele 1. Otherwise the allele indices of the VCF
+# are looked up in @allelesString (e.g. '0,1,2,3').
+#********************************************************************
+def buildGtDecoder(allelesString, binaryMode):
+    decoded = dict()
+    alleleSymbols = allelesString.split(',')
+    def decode(gt):
+        ans = decoded.get(gt)
+        if ans is not None:
+            return ans
+        alleles = gt.replace('|', '/').split('/')
+        if len(alleles) == 1:
+            # haploid call
+            alleles = alleles * 2
+        if '.' in alleles[:2]:
+            ans = (-1, -1)
+        elif binaryMode:
+            ans = (min(int(alleles[0]), 1), min(int(alleles[1]), 1))
+        else:
+            ans = (alleleSymbols.index(alleles[0]), alleleSymbols.index(alleles[1]))
+        decoded[gt] = ans
+        return ans
+    return decode
+
+#********************************************************************
+# Extracting the window from a VCF (or bgzipped VCF) file, streamed line by line.
+# Variants (the data lines) are numbered from 0 in the order of the file. Lines of variants which are not in the
+# window are not split, and reading stops after the last one.
+#********************************************************************
+def ExtractWindowVcf(allelsToUse, inputFile, totalIndividuals, window, allelesString, binaryMode, totalSnps=None):
+    lociPositions = selectLoci(allelsToUse, totalSnps)
+    lastLocus = max(allelsToUse)
+    decode = buildGtDecoder(allelesString, binaryMode)
+    locus = -1
+    with openVcf(inputFile) as f:
+        for line in f:
+            if line.startswith('#'):
+                if line.startswith('#CHROM') and len(line.rstrip('\n').split('\t')) - 9 != totalIndividuals:
+                    raise ValueError('totalIndividuals is ' + str(totalIndividuals) + ' but ' + inputFile + ' has '
+                                     + str(len(line.rstrip('\n').split('\t')) - 9) + ' individuals')
+                continue
+            locus = locus + 1
+            if locus > lastLocus:
+                break
+            position = lociPositions[locus]
+            if position < 0:
+                continue
+            fields = line.rstrip('\n').split('\t')
+            formatKeys = fields[8].split(':')
+            gtIndex = formatKeys.index('GT')
+            for indi in range(totalIndividuals):
+                sample = fields[9 + indi]
+                gt = sample if gtIndex == 0 and len(formatKeys) == 1 else sample.split(':')[gtIndex]
+                val1, val2 = decode(gt)
+                window.set(indi, position, val1, val2)
+    if locus < lastLocus:
+        raise ValueError(inputFile + ' has less than ' + str(lastLocus + 1) + ' variants')
     return window
 
 #********************************************************************
@@ -275,14 +1331,14 @@ def ExtractWindow(allelsToUse, inputFile, totalIndividuals, window, allelesStrin
 def calcFrequenciesPerLocus(window, logFile, allelesString):
     # +1 for the missing value option
     numOfAlleles = len(allelesString.split(','))+1
-    numOfSnpsInWindow= len(window.get(0).keys())
+    numOfSnpsInWindow= window.numOfLoci
     frequenciesPerLocus = dict()
     for locus in range(0,numOfSnpsInWindow):
         if locus%max(1,int(numOfSnpsInWindow/100)) ==0:
             writeToLog('calcFrequenciesPerLocus finished ' + str(locus) + ' out of ' + str(numOfSnpsInWindow), logFile)
         counts = [0]*numOfAlleles
-        for i,val in window.items():
-            snp = val[locus]
+        for i in range(window.numOfIndividuals):
+            snp = window.get(i, locus)
             # if any of the allele is -1, we wont count this SNP
             if(snp[0]==-1) or (snp[1] == -1):
                 counts[numOfAlleles-1] = counts[numOfAlleles-1] + 2
@@ -296,15 +1352,16 @@ def calcFrequenciesPerLocus(window, logFile, allelesString):
 
 #********************************************************************
 # Calculates the distance between two individuals based on the given @frequenciesPerLocus
+# @i and @j are lists of the pairs of alleles of the two individuals, as returned by GenotypeStore.individual
 #********************************************************************
 def calcDistancesBetweenTwo(i, j, frequenciesPerLocus):
     dist = 0
     valid=0
-    for l in i.keys():
-        a = i.get(l)[0]
-        b = i.get(l)[1]
-        c = j.get(l)[0]
-        d = j.get(l)[1]
+    for l in range(len(i)):
+        a = i[l][0]
+        b = i[l][1]
+        c = j[l][0]
+        d = j[l][1]
         # we only use cases where all of the alleles are not '-1'
         if ( a!=-1 and b!=-1 and c!=-1 and d!=-1):
             valid = valid +1
@@ -324,23 +1381,78 @@ def calcDistancesBetweenTwo(i, j, frequenciesPerLocus):
 #********************************************************************
 def calcDistances(window, frequenciesPerLocus, logFile):
     allDist = dict()
-    allValids = dict()
-    numOfIndividuals = len(window.keys())
-    numOfSnpsInWindow= (len(list(window.values())[0].keys()))
-    for i in window.keys():
+    # the valid snps are counted in bulk, from the missing values bitmasks
+    allValids = window.validCounts()
+    numOfIndividuals = window.numOfIndividuals
+    for i in range(numOfIndividuals):
         if i%max(1,int(numOfIndividuals/100))==0:
             writeToLog('calcDistances finished ' + str(i) + ' out of ' + str(numOfIndividuals), logFile)
         allDist[i] = dict()
-        for j in window.keys():
-            if (i<j):
-                S_ij,C_ij = calcDistancesBetweenTwo(window.get(i),window.get(j),frequenciesPerLocus)
-                allDist[i][j] = S_ij
-                if C_ij<numOfSnpsInWindow:
-                    if allValids.get(i) is None:
-                        allValids[i] = dict()
-                    allValids[i][j] = C_ij
+        # the genotypes are unpacked one individual at a time, to keep the memory compact
+        individual = window.individual(i)
+        for j in range(i+1, numOfIndividuals):
+            S_ij,C_ij = calcDistancesBetweenTwo(individual,window.individual(j),frequenciesPerLocus)
+            allDist[i][j] = S_ij
     return allDist,allValids
 
+#********************************************************************
+# The (1-f) weight of every allele at every locus, computed once.
+# weights[k][l] is 1 - (frequency of allele k at locus l).
+#********************************************************************
+def calcLocusWeights(frequenciesPerLocus, numOfAlleles):
+    numOfLoci = len(frequenciesPerLocus.keys())
+    counts = np.array([frequenciesPerLocus[l] for l in range(numOfLoci)], dtype=np.float64).reshape(numOfLoci, -1)
+    # the last entry is the amount of missing ones, guard rail - we wont divide by 0
+    nonMissingEntires = np.maximum(1, counts[:, :-1].sum(axis=1))
+    return 1 - counts[:, :numOfAlleles].T / nonMissingEntires
+
+#********************************************************************
+# Same as calcDistances, using matrix products over batches of loci.
+# With n_k(i,l) the amount of copies of allele k of individual i at locus l, the distance between i and j is
+# 0.25 * sum over l,k of (1-f_k(l))*n_k(i,l)*n_k(j,l). Missing snps have n_k=0, so they are not counted.
+# Returns full matrices of distances and valid snps - use only the upper triangle.
+#********************************************************************
+def calcDistancesNumpy(window, frequenciesPerLocus, logFile, allelesString):
+    if np is None:
+        raise ImportError('The numpy engine requires numpy. Please install it, or use the python engine.')
+    numOfAlleles = len(allelesString.split(','))
+    weights = calcLocusWeights(frequenciesPerLocus, numOfAlleles)
+    numOfIndividuals = window.numOfIndividuals
+    numOfSnpsInWindow = window.numOfLoci
+    allDist = np.zeros((numOfIndividuals, numOfIndividuals), dtype=np.float64)
+    allValids = np.zeros((numOfIndividuals, numOfIndividuals), dtype=np.float64)
+    for start in range(0, numOfSnpsInWindow, LOCI_BATCH_SIZE):
+        writeToLog('calcDistancesNumpy finished ' + str(start) + ' out of ' + str(numOfSnpsInWindow) + ' loci', logFile)
+        end = min(start + LOCI_BATCH_SIZE, numOfSnpsInWindow)
+        alleleCounts, valid = window.alleleCountsBatch(start, end, numOfAlleles)
+        for k in range(numOfAlleles):
+            counts = alleleCounts[k].astype(np.float64)
+            if not counts.any():
+                continue
+            allDist += np.dot(counts * weights[k, start:end], counts.T)
+        batchValid = valid.astype(np.float64)
+        allValids += np.dot(batchValid, batchValid.T)
+    return 0.25*allDist, allValids
+
+#********************************************************************
+# Same as calcDistancesNumpy, between the individuals of two windows of the same loci (e.g. two blocks of individuals).
+# @weights are calcLocusWeights of the frequencies of the whole window.
+# Returns (rows x cols) matrices of distances and valid snps.
+#********************************************************************
+def calcDistancesBlockNumpy(rowsWindow, colsWindow, weights, numOfAlleles):
+    blockDist = np.zeros((rowsWindow.numOfIndividuals, colsWindow.numOfIndividuals), dtype=np.float64)
+    blockValids = np.zeros((rowsWindow.numOfIndividuals, colsWindow.numOfIndividuals), dtype=np.float64)
+    for start in range(0, rowsWindow.numOfLoci, LOCI_BATCH_SIZE):
+        end = min(start + LOCI_BATCH_SIZE, rowsWindow.numOfLoci)
+        rowsCounts, rowsValid = rowsWindow.alleleCountsBatch(start, end, numOfAlleles)
+        colsCounts, colsValid = colsWindow.alleleCountsBatch(start, end, numOfAlleles)
+        for k in range(numOfAlleles):
+            if not rowsCounts[k].any() or not colsCounts[k].any():
+                continue
+            blockDist += np.dot(rowsCounts[k].astype(np.float64) * weights[k, start:end], colsCounts[k].T.astype(np.float64))
+        blockValids += np.dot(rowsValid.astype(np.float64), colsValid.T.astype(np.float64))
+    return 0.25*blockDist, blockValids
+
 #********************************************************************
 #********************************************************************
 #********************************************************************
@@ -351,51 +1463,178 @@ def calcDistances(window, frequenciesPerLocus, logFile):
 #********************************************************************
 #********************************************************************
 
-def main(inputVector):
-    if len(inputVector)<6:
-        print ("Required parameters: inputFile outputFolder totalSnps totalIndividuals binaryMode.")
-        print ("If binaryMode is false, additional required parameters: allelesString alleleMissingValueChar.")        
-        print ("Non mandatory parameters: pivoted windowSize windowIndex shuffeledFile.")
-        return
-    # parse command line options
+#********************************************************************
+# Parses the command line options of main.
+#********************************************************************
+def parseParameters(inputVector):
+    params = dict()
+    params['inputFile'] = inputVector[1]
+    params['outputFolder'] = inputVector[2]
+    params['totalSnps'] = int(inputVector[3])
+    params['totalIndividuals'] = int(inputVector[4])
 
-    inputFile = inputVector[1]
-    outputFolder = inputVector[2]
-    totalSnps = int(inputVector[3])
-    totalIndividuals = int(inputVector[4])
-    
     if inputVector[5]=='True':
         binaryMode = True
     elif inputVector[5]=='False':
         binaryMode = False
     else:
         raise ValueError('binaryMode must be "True" or "False"')
+    params['binaryMode'] = binaryMode
 
     if binaryMode:
-        allelesString='0,1,2'
-        alleleMissingValueChar='-'
+        params['allelesString']='0,1,2'
+        params['alleleMissingValueChar']='-'
     else:
         if len(inputVector)<=7:
-            raise 'When binaryMode is false, you must supply allelesString and alleleMissingValueChar'
+            raise ValueError('When binaryMode is false, you must supply allelesString and alleleMissingValueChar')
         else:
-            allelesString = inputVector[6] #"A,T,C,G"
-            alleleMissingValueChar = inputVector[7] #'N'
+            params['allelesString'] = inputVector[6] #"A,T,C,G"
+            params['alleleMissingValueChar'] = inputVector[7] #'N'
 
-    pivoted= False
+    params['pivoted'] = False
     if len(inputVector)>8:
-        pivoted = bool(inputVector[8])
+        params['pivoted'] = bool(inputVector[8])
 
     # for parallel execution
-    shuffeledFile = ""
-    windowSize = totalSnps
-    windowIndex = 0
+    params['shuffeledFile'] = ""
+    params['windowSize'] = params['totalSnps']
+    params['windowIndex'] = 0
     if len(inputVector)>9:
-        windowSize = int(inputVector[9])
+        params['windowSize'] = int(inputVector[9])
     if len(inputVector)>10:
-        windowIndex = int(inputVector[10])
+        params['windowIndex'] = int(inputVector[10])
     if len(inputVector)>11:
-        shuffeledFile = inputVector[11]
+        params['shuffeledFile'] = inputVector[11]
 
+    params['engine'] = 'python'
+    if len(inputVector)>12:
+        params['engine'] = inputVector[12]
+    if params['engine'] not in ('python', 'numpy'):
+        raise ValueError('engine must be "python" or "numpy"')
+
+    params['normalization'] = 'total'
+    if len(inputVector)>13:
+        params['normalization'] = inputVector[13]
+    if params['normalization'] not in ('total', 'valid'):
+        raise ValueError('normalization must be "total" or "valid"')
+
+    params['outputFormat'] = 'text'
+    if len(inputVector)>14:
+        params['outputFormat'] = inputVector[14]
+    if params['outputFormat'] not in ('text', 'binary', 'binary32'):
+        raise ValueError('outputFormat must be "text", "binary" or "binary32"')
+
+    params['cacheFolder'] = ""
+    params['cacheMaxBytes'] = GENOTYPE_CACHE_MAX_BYTES
+    if len(inputVector)>15:
+        params['cacheFolder'] = inputVector[15]
+    if len(inputVector)>16:
+        params['cacheMaxBytes'] = int(float(inputVector[16]) * (1 << 30))
+    return params
+
+def distancesFileExtension(outputFormat):
+    return ".csv" if outputFormat == 'text' else ".bin"
+
+def binaryDtype(outputFormat):
+    return 'float32' if outputFormat == 'binary32' else 'float64'
+
+#********************************************************************
+# Paths of the outputs of window @windowIndex.
+#********************************************************************
+def windowPaths(outputFolder, windowSize, windowIndex, outputFormat='text'):
+    distancesPath = outputFolder + "Distances/Matrix" + str(windowSize) + "_" + str(windowIndex) + distancesFileExtension(outputFormat)
+    countsPath = outputFolder + "Distances/Counts" + str(windowSize) + "_" + str(windowIndex) + ".csv"
+    frequenciesPerLocusPath = outputFolder + "Frequencies/" + str(windowSize) + "_" + str(windowIndex) + ".csv"
+    logFile = outputFolder + "Log/" + str(windowSize) + "_" + str(windowIndex) + ".log"
+    return distancesPath, countsPath, frequenciesPerLocusPath, logFile
+
+#********************************************************************
+# Calculates the frequencies and the distances of a single @window, and writes them.
+# When the @frequenciesPerLocus of the window are given (e.g. from the genotype cache) they are not calculated.
+# Returns the distances and the valid counts, as returned by the selected @engine.
+#********************************************************************
+def processWindow(window, outputFolder, windowSize, windowIndex, allelesString, engine, normalization, logFile, outputFormat='text', frequenciesPerLocus=None):
+    distancesPath, countsPath, frequenciesPerLocusPath, _ = windowPaths(outputFolder, windowSize, windowIndex, outputFormat)
+    metricsPath = metricsPathOfLog(logFile)
+    numOfGenotypes = window.numOfIndividuals * window.numOfLoci
+    numOfPairs = window.numOfIndividuals * (window.numOfIndividuals - 1) // 2
+    writeToLog('Genotype store holds ' + str(window.numOfIndividuals) + ' individuals and ' + str(window.numOfLoci) + ' loci in '
+               + str(window.totalBytes()) + ' bytes, ' + str(window.bytesPerGenotype()) + ' bytes per genotype', logFile)
+
+    # Step A - frequencies per locus.
+    with measurePhase('frequencies', metricsPath, numOfGenotypes, 'genotypes'):
+        frequenciesPerLocus = windowFrequencies(window, frequenciesPerLocus, frequenciesPerLocusPath, allelesString, logFile)
+
+    # Step B - distances between individuals
+    numOfSnpsInWindow = window.numOfLoci
+    # with the 'total' normalization each distance is divided by the amount of snps in the window.
+    # in case you have many invalid entires in your data, it may influence the result - use 'valid'.
+    with measurePhase('distances', metricsPath, numOfPairs * numOfSnpsInWindow, 'pairLoci'):
+        if engine == 'numpy':
+            distances,counts = calcDistancesNumpy(window, frequenciesPerLocus, logFile, allelesString)
+        else:
+            distances,counts = calcDistances(window,frequenciesPerLocus, logFile)
+    with measurePhase('write', metricsPath, numOfPairs, 'pairs'):
+        writeWindowOutputs(distances, counts, window.numOfIndividuals, numOfSnpsInWindow, distancesPath, countsPath, engine, normalization, outputFormat)
+    return distances, counts
+
+#********************************************************************
+# Writes the @distances and valid @counts of a window, as returned by the selected @engine.
+# The distances file is written last, so a window whose distances file exists is complete.
+#********************************************************************
+def writeWindowOutputs(distances, counts, numOfIndividuals, numOfSnpsInWindow, distancesPath, countsPath, engine, normalization, outputFormat):
+    if engine == 'numpy':
+        writeCountsMatrixToFile(numOfSnpsInWindow, counts, countsPath, normalization)
+        if outputFormat == 'text':
+            writeDistanceMatrixToFile(distances, numOfSnpsInWindow, distancesPath, counts if normalization == 'valid' else None)
+    else:
+        writeCountsToFile(numOfSnpsInWindow,counts,countsPath, normalization)
+        if outputFormat == 'text':
+            writeDistancesToFile(distances,numOfSnpsInWindow,distancesPath, counts if normalization == 'valid' else None)
+    if outputFormat != 'text':
+        condensedDistances, condensedCounts = toCondensed(distances, counts, numOfIndividuals, numOfSnpsInWindow)
+        writeBinaryDistancesFile(condensedDistances, numOfIndividuals, numOfSnpsInWindow, distancesPath,
+                                 condensedCounts if normalization == 'valid' else None, normalization, binaryDtype(outputFormat))
+
+#********************************************************************
+# The frequencies per locus of @window - the given @frequenciesPerLocus, the ones written to @frequenciesPerLocusPath,
+# or calculated (and written) here.
+#********************************************************************
+def windowFrequencies(window, frequenciesPerLocus, frequenciesPerLocusPath, allelesString, logFile):
+    # For DR reasons - we check if the file exists.
+    if frequenciesPerLocus is not None:
+        if not os.path.isfile(frequenciesPerLocusPath):
+            writeFrequenciesPerLocusToFile(frequenciesPerLocus,frequenciesPerLocusPath)
+    elif os.path.isfile(frequenciesPerLocusPath):
+        # file exists
+        frequenciesPerLocus = readFrequenciesPerLocusFile(frequenciesPerLocusPath)
+    else:
+        frequenciesPerLocus = calcFrequenciesPerLocus(window, logFile, allelesString)
+
+        writeFrequenciesPerLocusToFile(frequenciesPerLocus,frequenciesPerLocusPath)
+    return frequenciesPerLocus
+
+def main(inputVector):
+    if len(inputVector)>1 and inputVector[1] == '-parallel':
+        return runParallel(inputVector)
+    if len(inputVector)>1 and inputVector[1] == '-tiled':
+        return runTiled(inputVector)
+    if len(inputVector)>1 and inputVector[1] == '-incremental':
+        return runIncremental(inputVector)
+    if len(inputVector)<6:
+        print ("Required parameters: inputFile outputFolder totalSnps totalIndividuals binaryMode.")
+        print ("If binaryMode is false, additional required parameters: allelesString alleleMissingValueChar.")
+        print ("Non mandatory parameters: pivoted windowSize windowIndex shuffeledFile engine normalization outputFormat cacheFolder cacheMaxGB.")
+        print ("Use '-parallel numOfWorkers' before the parameters to process all windows on a local pool of processes.")
+        print ("Use '-tiled tileSize numOfWorkers' before the parameters to process a window in resumable tiles of individuals.")
+        print ("Use '-incremental newInputFile numOfNewIndividuals' before the parameters to add individuals to a processed window.")
+        print ("  (the existing pairs are still corrected at the loci whose frequencies changed, so its cost also grows with the existing individuals.)")
+        return
+    # parse command line options
+    params = parseParameters(inputVector)
+    outputFolder = params['outputFolder']
+    windowSize = params['windowSize']
+    windowIndex = params['windowIndex']
 
     '''# can be used for adhoc runs
     inputFile = "./SampleInputGenes.txt"
@@ -411,39 +1650,787 @@ def main(inputVector):
     # a single character to represent a missing value
     alleleMissingValueChar = 'N'
     pivoted = False'''
-    
+
 
     #First check that the output file doesnt exist.
-    distancesPath = outputFolder + "Distances/Matrix" + str(windowSize) + "_" + str(windowIndex) + ".csv"
-    countsPath = outputFolder + "Distances/Counts" + str(windowSize) + "_" + str(windowIndex) + ".csv"
-    logFile = outputFolder + "Log/" + str(windowSize) + "_" + str(windowIndex) + ".log"
+    distancesPath, countsPath, frequenciesPerLocusPath, logFile = windowPaths(outputFolder, windowSize, windowIndex, params['outputFormat'])
     makeDirs(logFile)
 
     if os.path.isfile(distancesPath):
         # file exists
         writeToLog("file exist, exit.", logFile)
         return
-    window =readRandomWindow(inputFile, windowSize, windowIndex, shuffeledFile, totalSnps, totalIndividuals, allelesString, alleleMissingValueChar, binaryMode, pivoted)
+    metricsPath = metricsPathOfLog(logFile)
+    if not os.path.isfile(outputFolder + "Individuals.txt"):
+        writeIndividualIds(params['inputFile'], params['totalIndividuals'], outputFolder + "Individuals.txt")
+    frequenciesPerLocus = None
+    with measurePhase('parse', metricsPath, 0, 'genotypes') as record:
+        if params['cacheFolder'] != "":
+            store, alleleCounts = loadGenotypeCache(params, params['cacheFolder'], logFile, params['cacheMaxBytes'])
+            loci = sorted(windowLoci(windowSize, windowIndex, params['shuffeledFile'], params['totalSnps']))
+            window = store.takeLoci(loci)
+            frequenciesPerLocus = windowFrequenciesFromCounts(alleleCounts, loci)
+        else:
+            window =readRandomWindow(params['inputFile'], windowSize, windowIndex, params['shuffeledFile'], params['totalSnps'], params['totalIndividuals'],
+                                     params['allelesString'], params['alleleMissingValueChar'], params['binaryMode'], params['pivoted'])
+        record['items'] = window.numOfIndividuals * window.numOfLoci
+    processWindow(window, outputFolder, windowSize, windowIndex, params['allelesString'], params['engine'], params['normalization'], logFile, params['outputFormat'], frequenciesPerLocus)
+    writeMetricsSummary(_phaseMetrics, metricsPath, logFile)
+    flushLogs()
 
-    # Step A - frequencies per locus.
-    # For DR reasons - we check if the file exists.
-    frequenciesPerLocusPath = outputFolder + "Frequencies/" + str(windowSize) + "_" + str(windowIndex) + ".csv"
+#********************************************************************
+#********************************************************************
+#********************************************************************
+#
+#                       Parallel driver
+#
+#********************************************************************
+#********************************************************************
+#********************************************************************
 
-    if os.path.isfile(frequenciesPerLocusPath):
-        # file exists
-        frequenciesPerLocus = readFrequenciesPerLocusFile(frequenciesPerLocusPath)
+# The whole input, parsed once per process (or once in total, when the workers are forked).
+# With a genotype cache, the allele counts of all the loci as well.
+_parallelStore = None
+_parallelAlleleCounts = None
+_parallelParams = None
+
+def initParallelWorker(params):
+    global _parallelStore, _parallelAlleleCounts, _parallelParams
+    _parallelParams = params
+    if _parallelStore is None and params['cacheFolder'] != "":
+        logFile = params['outputFolder'] + "Log/" + str(params['windowSize']) + "_parallel.log"
+        _parallelStore, _parallelAlleleCounts = loadGenotypeCache(params, params['cacheFolder'], logFile, params['cacheMaxBytes'])
+    elif _parallelStore is None:
+        _parallelStore = readRandomWindow(params['inputFile'], params['totalSnps'], 0, "", params['totalSnps'], params['totalIndividuals'],
+                                          params['allelesString'], params['alleleMissingValueChar'], params['binaryMode'], params['pivoted'])
+
+#********************************************************************
+# Processes window @windowIndex, holding the (sorted) @loci, in a worker.
+# A window which was already written (e.g. by a previous run) is read back instead of recomputed.
+# Returns the amount of snps in the window, the condensed sums of distances (not yet divided) and valid counts,
+# and the phases measured while processing it.
+#********************************************************************
+def runParallelWindow(task):
+    windowIndex, loci = task
+    params = _parallelParams
+    numOfIndividuals = params['totalIndividuals']
+    distancesPath, countsPath, _, logFile = windowPaths(params['outputFolder'], params['windowSize'], windowIndex, params['outputFormat'])
+    makeDirs(logFile)
+    firstRecord = len(_phaseMetrics)
+    if os.path.isfile(distancesPath) and os.path.isfile(countsPath):
+        writeToLog("file exist, reading it.", logFile)
+        with measurePhase('read', metricsPathOfLog(logFile), numOfIndividuals * (numOfIndividuals - 1) // 2, 'pairs'):
+            numOfSnpsInWindow, distances, counts = readWindowFiles(distancesPath, countsPath, numOfIndividuals)
+        flushLogs()
+        return windowIndex, numOfSnpsInWindow, distances, counts, _phaseMetrics[firstRecord:]
+    with measurePhase('select', metricsPathOfLog(logFile), numOfIndividuals * len(loci), 'genotypes'):
+        window = _parallelStore.takeLoci(loci)
+        frequenciesPerLocus = None
+        if _parallelAlleleCounts is not None:
+            frequenciesPerLocus = windowFrequenciesFromCounts(_parallelAlleleCounts, loci)
+    distances, counts = processWindow(window, params['outputFolder'], params['windowSize'], windowIndex, params['allelesString'], params['engine'], params['normalization'], logFile, params['outputFormat'], frequenciesPerLocus)
+    distances, counts = toCondensed(distances, counts, numOfIndividuals, window.numOfLoci)
+    flushLogs()
+    return windowIndex, window.numOfLoci, distances, counts, _phaseMetrics[firstRecord:]
+
+#********************************************************************
+# Processes all the windows on a local pool of processes, and merges them.
+# Partial matrices are merged as they arrive: the sums of distances and the amounts of snps to divide them by
+# are summed separately, so the merged matrix is the one we would get from a single window holding all the snps.
+#********************************************************************
+def runParallel(inputVector):
+    if len(inputVector)<8:
+        print ("Required parameters: -parallel numOfWorkers inputFile outputFolder totalSnps totalIndividuals binaryMode.")
+        return
+    numOfWorkers = int(inputVector[2])
+    params = parseParameters(inputVector[0:1] + inputVector[3:])
+    outputFolder = params['outputFolder']
+    totalSnps = params['totalSnps']
+    windowSize = params['windowSize']
+    numOfIndividuals = params['totalIndividuals']
+    logFile = outputFolder + "Log/" + str(windowSize) + "_parallel.log"
+    metricsPath = metricsPathOfLog(logFile)
+    makeDirs(logFile)
+    writeIndividualIds(params['inputFile'], numOfIndividuals, outputFolder + "Individuals.txt")
+
+    shuffeledFile = params['shuffeledFile']
+    if shuffeledFile == "":
+        shuffeledFile = outputFolder + "Shuffled_" + str(totalSnps) + ".csv"
+    if not os.path.isfile(shuffeledFile):
+        writeToLog('Generating shuffled index ' + shuffeledFile, logFile)
+        makeDirs(shuffeledFile)
+        buildShuffledArray(totalSnps, shuffeledFile)
+    with open(shuffeledFile) as f:
+        randomList = [int(x) for x in f.readline().split(',') if x.strip() != ""]
+    tasks = []
+    for windowIndex in range(0, (totalSnps + windowSize - 1) // windowSize):
+        tasks.append((windowIndex, sorted(randomList[windowSize*windowIndex:windowSize*(windowIndex+1)])))
+
+    global _parallelStore, _parallelAlleleCounts
+    if 'fork' in multiprocessing.get_all_start_methods():
+        # Parse once here, the forked workers share the parsed input
+        writeToLog('Parsing ' + params['inputFile'], logFile)
+        context = multiprocessing.get_context('fork')
+        with measurePhase('parse', metricsPath, numOfIndividuals * totalSnps, 'genotypes'):
+            initParallelWorker(params)
     else:
-        frequenciesPerLocus = calcFrequenciesPerLocus(window, logFile, allelesString)
+        # Each worker parses the input once, in initParallelWorker
+        context = multiprocessing.get_context()
+    writeToLog('Processing ' + str(len(tasks)) + ' windows with ' + str(numOfWorkers) + ' workers', logFile)
+    # The workers must not inherit unflushed buffers
+    flushLogs()
 
-        writeFrequenciesPerLocusToFile(frequenciesPerLocus,frequenciesPerLocusPath)
+    totalCount = 0
+    distances = None
+    counts = None
+    windowMetrics = []
+    pool = context.Pool(numOfWorkers, initializer=initParallelWorker, initargs=(params,))
+    try:
+        with measurePhase('windows', metricsPath, len(tasks), 'windows'):
+            for windowIndex, numOfSnpsInWindow, windowDistances, windowCounts, records in pool.imap_unordered(runParallelWindow, tasks):
+                totalCount = totalCount + numOfSnpsInWindow
+                distances = addCondensed(distances, windowDistances)
+                counts = addCondensed(counts, windowCounts)
+                windowMetrics.extend(records)
+                writeToLog('Merged window ' + str(windowIndex) + ', ' + str(totalCount) + ' out of ' + str(totalSnps) + ' snps', logFile)
+    finally:
+        pool.close()
+        pool.join()
+    _parallelStore = None
+    _parallelAlleleCounts = None
 
-    # Step B - distances between individuals
-    distances,counts = calcDistances(window,frequenciesPerLocus, logFile)
+    outputFormat = params['outputFormat']
+    mergedDistancesPath = outputFolder + "Distances/Matrix" + str(windowSize) + "_merged" + distancesFileExtension(outputFormat)
+    mergedCountsPath = outputFolder + "Distances/Counts" + str(windowSize) + "_merged.csv"
+    normalization = params['normalization']
+    with measurePhase('write', metricsPath, numOfIndividuals * (numOfIndividuals - 1) // 2, 'pairs'):
+        if outputFormat == 'text':
+            writeCondensedDistancesToFile(distances, numOfIndividuals, totalCount, mergedDistancesPath, counts if normalization == 'valid' else None)
+        else:
+            writeBinaryDistancesFile(distances, numOfIndividuals, totalCount, mergedDistancesPath, counts if normalization == 'valid' else None,
+                                     normalization, binaryDtype(outputFormat))
+        writeCondensedCountsToFile(totalCount, counts, numOfIndividuals, mergedCountsPath, normalization)
+    writeToLog('Merged matrix written to ' + mergedDistancesPath, logFile)
+    # The phases of the workers are summed with the phases of this process
+    writeMetricsSummary(_phaseMetrics + windowMetrics, metricsPath, logFile)
+    flushLogs()
 
-    # this version does not support the option to divided each distance by the amount of valid snps.
-    # in case you have many invalid entires in your data, it may influence the result.
-    writeDistancesToFile(distances,len(list(window.values())[0].keys()),distancesPath)
-    writeCountsToFile(len(list(window.values())[0].keys()),counts,countsPath)
+#********************************************************************
+#********************************************************************
+#********************************************************************
+#
+#                         Tiled driver
+#
+#********************************************************************
+#********************************************************************
+#********************************************************************
+
+# The window of a tiled run, parsed once per process (or once in total, when the workers are forked),
+# with its frequencies, and the output files mapped by this process.
+_tiledWindow = None
+_tiledFrequencies = None
+_tiledWeights = None
+_tiledParams = None
+_tiledOutputs = None
+
+#********************************************************************
+# Paths of the state of a tiled run of window @windowIndex: the binary matrix being filled, the condensed valid
+# snps per pair (uint32), and the manifest of the completed tiles.
+#********************************************************************
+def tiledPaths(outputFolder, windowSize, windowIndex):
+    tilesFolder = outputFolder + "Tiles/" + str(windowSize) + "_" + str(windowIndex) + "/"
+    return tilesFolder + "Matrix.bin", tilesFolder + "Counts.u32", tilesFolder + "Manifest.txt"
+
+#********************************************************************
+# Index of the pair (@i, @j), i<j, in the condensed upper triangle (row by row) of @numOfIndividuals individuals.
+#********************************************************************
+def condensedIndex(i, j, numOfIndividuals):
+    return i*numOfIndividuals - i*(i+1)//2 + j - i - 1
+
+#********************************************************************
+# The tiles (I, J), I<=J, covering the upper triangle with blocks of @tileSize individuals, row by row.
+#********************************************************************
+def tilesOfTriangle(numOfIndividuals, tileSize):
+    numOfBlocks = (numOfIndividuals + tileSize - 1) // tileSize
+    return [(I, J) for I in range(numOfBlocks) for J in range(I, numOfBlocks)]
+
+#********************************************************************
+# Creates the (sparse) output files of a tiled run, in their final size, and the manifest describing the run.
+#********************************************************************
+def preallocateTiledOutputs(matrixPath, countsPath, manifestPath, description):
+    numOfIndividuals = description['numOfIndividuals']
+    numOfPairs = numOfIndividuals*(numOfIndividuals-1)//2
+    valueSize = 8 if description['dtype'] == 'float64' else 4
+    makeDirs(matrixPath)
+    with open(matrixPath, 'wb') as f:
+        f.write(BINARY_MATRIX_HEADER.pack(BINARY_MATRIX_MAGIC, BINARY_MATRIX_VERSION, BINARY_MATRIX_DTYPES[description['dtype']],
+                                          BINARY_MATRIX_NORMALIZATIONS[description['normalization']], numOfIndividuals, description['numOfSnps']))
+        f.truncate(BINARY_MATRIX_HEADER.size + numOfPairs*valueSize)
+    with open(countsPath, 'wb') as f:
+        f.truncate(numOfPairs*4)
+    with openAtomically(manifestPath) as f:
+        f.write(json.dumps(description, sort_keys=True) + '\n')
+
+#********************************************************************
+# The tiles completed by previous runs, as listed in the manifest, or None if there is no manifest.
+# A run with other parameters can not be resumed.
+#********************************************************************
+def readTiledManifest(manifestPath, description):
+    if not os.path.isfile(manifestPath):
+        return None
+    with open(manifestPath) as f:
+        lines = f.read().split('\n')
+    if json.loads(lines[0]) != json.loads(json.dumps(description)):
+        raise ValueError(manifestPath + ' was written by a run with other parameters, remove its folder to start over')
+    done = set()
+    # the last line is partial (or empty), a run may have stopped while writing it
+    for line in lines[1:-1]:
+        parts = line.split(',')
+        done.add((int(parts[0]), int(parts[1])))
+    return done
+
+#********************************************************************
+# Adds @tile to the manifest. Called only once the tile is flushed to the output files.
+#********************************************************************
+def markTileDone(manifestPath, tile):
+    with open(manifestPath, 'a') as f:
+        f.write(str(tile[0]) + ',' + str(tile[1]) + '\n')
+        f.flush()
+        os.fsync(f.fileno())
+
+#********************************************************************
+# Same as writeCondensedCountsToFile, for the condensed valid snps per pair of a tiled run in @tileCountsPath (uint32),
+# read a row at a time.
+#********************************************************************
+def writeTiledCountsToFile(defaultAmount, tileCountsPath, numOfIndividuals, countsPath, normalization):
+    with openAtomically(countsPath) as f, open(tileCountsPath, 'rb') as tileCounts:
+        f.write(countsHeader(defaultAmount, normalization))
+        f.write('If there are missing values, they will be listed below in the following format: \n')
+        f.write('<index of first individual>,<index of second individual>,<# of valid snps>\n')
+        for i in range(0, numOfIndividuals-1):
+            row = array('I')
+            row.frombytes(tileCounts.read(4*(numOfIndividuals-1-i)))
+            if sys.byteorder == 'big':
+                row.byteswap()
+            for j, count in enumerate(row):
+                if count < defaultAmount:
+                    f.write(str(i)+','+str(i+1+j)+','+str(count)+'\n')
+
+#********************************************************************
+# Reads (or calculates) the window of a tiled run and its frequencies, once per process.
+#********************************************************************
+def loadTiledWindow(params, logFile):
+    global _tiledWindow, _tiledFrequencies, _tiledWeights
+    windowSize = params['windowSize']
+    windowIndex = params['windowIndex']
+    frequenciesPerLocus = None
+    if params['cacheFolder'] != "":
+        store, alleleCounts = loadGenotypeCache(params, params['cacheFolder'], logFile, params['cacheMaxBytes'])
+        loci = sorted(windowLoci(windowSize, windowIndex, params['shuffeledFile'], params['totalSnps']))
+        window = store.takeLoci(loci)
+        frequenciesPerLocus = windowFrequenciesFromCounts(alleleCounts, loci)
+    else:
+        window = readRandomWindow(params['inputFile'], windowSize, windowIndex, params['shuffeledFile'], params['totalSnps'], params['totalIndividuals'],
+                                  params['allelesString'], params['alleleMissingValueChar'], params['binaryMode'], params['pivoted'])
+    _, _, frequenciesPerLocusPath, _ = windowPaths(params['outputFolder'], windowSize, windowIndex)
+    _tiledFrequencies = windowFrequencies(window, frequenciesPerLocus, frequenciesPerLocusPath, params['allelesString'], logFile)
+    if params['engine'] == 'numpy':
+        _tiledWeights = calcLocusWeights(_tiledFrequencies, len(params['allelesString'].split(',')))
+    _tiledWindow = window
+
+def tiledLogFile(params):
+    _, _, _, logFile = windowPaths(params['outputFolder'], params['windowSize'], params['windowIndex'])
+    return os.path.splitext(logFile)[0] + "_tiled.log"
+
+def initTiledWorker(params):
+    global _tiledParams, _tiledOutputs
+    _tiledParams = params
+    if _tiledWindow is None:
+        loadTiledWindow(params, tiledLogFile(params))
+    if _tiledOutputs is None or _tiledOutputs[0] != os.getpid():
+        matrixPath, countsPath, _ = tiledPaths(params['outputFolder'], params['windowSize'], params['windowIndex'])
+        with open(matrixPath, 'r+b') as f:
+            matrix = mmap.mmap(f.fileno(), 0)
+        with open(countsPath, 'r+b') as f:
+            counts = mmap.mmap(f.fileno(), 0)
+        _tiledOutputs = (os.getpid(), matrix, counts)
+
+def closeTiledOutputs():
+    global _tiledOutputs
+    if _tiledOutputs is not None and _tiledOutputs[0] == os.getpid():
+        _tiledOutputs[1].close()
+        _tiledOutputs[2].close()
+    _tiledOutputs = None
+
+#********************************************************************
+# Calculates the distances and valid snps between the individuals of block @tile[0] and the ones of block @tile[1].
+# Returns (rows x cols) matrices - numpy arrays or lists of lists, by the engine. Pairs below the diagonal are not used.
+#********************************************************************
+def calcTile(window, tile, tileSize, frequenciesPerLocus, weights, engine, allelesString):
+    numOfIndividuals = window.numOfIndividuals
+    rowStart = tile[0]*tileSize
+    colStart = tile[1]*tileSize
+    rowsWindow = window.takeIndividuals(rowStart, min(rowStart + tileSize, numOfIndividuals))
+    colsWindow = window.takeIndividuals(colStart, min(colStart + tileSize, numOfIndividuals))
+    if engine == 'numpy':
+        return calcDistancesBlockNumpy(rowsWindow, colsWindow, weights, len(allelesString.split(',')))
+    columns = [colsWindow.individual(c) for c in range(colsWindow.numOfIndividuals)]
+    distances = []
+    valids = []
+    for r in range(rowsWindow.numOfIndividuals):
+        individual = rowsWindow.individual(r)
+        rowDistances = [0]*len(columns)
+        rowValids = [0]*len(columns)
+        for c in range(max(0, rowStart + r + 1 - colStart), len(columns)):
+            rowDistances[c], rowValids[c] = calcDistancesBetweenTwo(individual, columns[c], frequenciesPerLocus)
+        distances.append(rowDistances)
+        valids.append(rowValids)
+    return distances, valids
+
+#********************************************************************
+# Writes the pairs i<j of a tile to the mapped @matrix (normalized, as writeBinaryDistancesFile writes them) and
+# @counts (valid snps, uint32). Returns the amount of pairs written.
+#********************************************************************
+def writeTile(matrix, counts, tile, tileSize, numOfIndividuals, distances, valids, numOfSnpsInWindow, normalization, dtype):
+    rowStart = tile[0]*tileSize
+    colStart = tile[1]*tileSize
+    colEnd = min(colStart + tileSize, numOfIndividuals)
+    valueSize = 8 if dtype == 'float64' else 4
+    numOfPairs = 0
+    for r in range(len(distances)):
+        i = rowStart + r
+        first = max(colStart, i+1)
+        if first >= colEnd:
+            continue
+        index = condensedIndex(i, first, numOfIndividuals)
+        if np is not None and isinstance(distances, np.ndarray):
+            rowDistances = distances[r, first - colStart:colEnd - colStart]
+            rowValids = valids[r, first - colStart:colEnd - colStart]
+            if normalization == 'valid':
+                rowDistances = rowDistances / np.maximum(1, rowValids)
+            else:
+                rowDistances = rowDistances / float(numOfSnpsInWindow)
+            values = rowDistances.astype('<f8' if dtype == 'float64' else '<f4').tobytes()
+            rowCounts = rowValids.astype('<u4').tobytes()
+        else:
+            rowValids = valids[r][first - colStart:colEnd - colStart]
+            if normalization == 'valid':
+                rowDistances = [float(d)/max(1, c) for d, c in zip(distances[r][first - colStart:colEnd - colStart], rowValids)]
+            else:
+                rowDistances = [float(d)/numOfSnpsInWindow for d in distances[r][first - colStart:colEnd - colStart]]
+            values = array('d' if dtype == 'float64' else 'f', rowDistances)
+            rowCounts = array('I', rowValids)
+            if sys.byteorder == 'big':
+                values.byteswap()
+                rowCounts.byteswap()
+            values = values.tobytes()
+            rowCounts = rowCounts.tobytes()
+        offset = BINARY_MATRIX_HEADER.size + index*valueSize
+        matrix[offset:offset + len(values)] = values
+        counts[index*4:index*4 + len(rowCounts)] = rowCounts
+        numOfPairs = numOfPairs + colEnd - first
+    return numOfPairs
+
+#********************************************************************
+# Calculates, writes and flushes a single @tile, in a worker.
+# Returns the tile and the phases measured while processing it.
+#********************************************************************
+def runTile(tile):
+    params = _tiledParams
+    firstRecord = len(_phaseMetrics)
+    with measurePhase('tile', metricsPathOfLog(tiledLogFile(params)), 0, 'pairs') as record:
+        distances, valids = calcTile(_tiledWindow, tile, params['tileSize'], _tiledFrequencies, _tiledWeights, params['engine'], params['allelesString'])
+        record['items'] = writeTile(_tiledOutputs[1], _tiledOutputs[2], tile, params['tileSize'], _tiledWindow.numOfIndividuals, distances, valids,
+                                    _tiledWindow.numOfLoci, params['normalization'], binaryDtype(params['outputFormat']))
+        _tiledOutputs[1].flush()
+        _tiledOutputs[2].flush()
+    flushLogs()
+    return tile, _phaseMetrics[firstRecord:]
+
+#********************************************************************
+# Processes a single window in tiles of @tileSize x @tileSize pairs of individuals, on a local pool of processes.
+# Each tile is written straight into a memory mapped binary matrix, which is never held in memory as a whole, and
+# recorded in a manifest once it is flushed. An interrupted run is resumed from the tiles in the manifest.
+# When all the tiles are done the matrix is moved to Distances/, as a window of the binary format.
+#********************************************************************
+def runTiled(inputVector):
+    if len(inputVector)<9:
+        print ("Required parameters: -tiled tileSize numOfWorkers inputFile outputFolder totalSnps totalIndividuals binaryMode.")
+        return
+    tileSize = int(inputVector[2])
+    numOfWorkers = int(inputVector[3])
+    params = parseParameters(inputVector[0:1] + inputVector[4:])
+    params['tileSize'] = tileSize
+    outputFolder = params['outputFolder']
+    windowSize = params['windowSize']
+    windowIndex = params['windowIndex']
+    logFile = tiledLogFile(params)
+    metricsPath = metricsPathOfLog(logFile)
+    makeDirs(logFile)
+    if params['outputFormat'] == 'text':
+        writeToLog('Tiles are written to a binary matrix, using the binary output format', logFile)
+        params['outputFormat'] = 'binary'
+    distancesPath, countsPath, _, _ = windowPaths(outputFolder, windowSize, windowIndex, params['outputFormat'])
+    if os.path.isfile(distancesPath):
+        writeToLog("file exist, exit.", logFile)
+        return
+    if not os.path.isfile(outputFolder + "Individuals.txt"):
+        writeIndividualIds(params['inputFile'], params['totalIndividuals'], outputFolder + "Individuals.txt")
+
+    global _tiledWindow, _tiledFrequencies, _tiledWeights
+    with measurePhase('parse', metricsPath, 0, 'genotypes') as record:
+        loadTiledWindow(params, logFile)
+        record['items'] = _tiledWindow.numOfIndividuals * _tiledWindow.numOfLoci
+    numOfIndividuals = _tiledWindow.numOfIndividuals
+    numOfSnpsInWindow = _tiledWindow.numOfLoci
+
+    matrixPath, tileCountsPath, manifestPath = tiledPaths(outputFolder, windowSize, windowIndex)
+    # The content of the input and of the shuffled file is a part of the description, so tiles of a window which was
+    # changed since are not resumed. With a genotype cache the hash of the input is taken from it.
+    if params['cacheFolder'] != "":
+        inputHash, _ = inputContentHash(params['inputFile'], params['cacheFolder'])
+    else:
+        inputHash = fileContentHash(params['inputFile'])
+    shuffeledFile = params['shuffeledFile']
+    description = {'version': 2, 'inputFile': os.path.abspath(params['inputFile']), 'inputSha1': inputHash,
+                   'shuffeledFile': os.path.abspath(shuffeledFile) if shuffeledFile != "" else "",
+                   'shuffeledSha1': fileContentHash(shuffeledFile) if shuffeledFile != "" else "",
+                   'numOfIndividuals': numOfIndividuals, 'numOfSnps': numOfSnpsInWindow, 'tileSize': tileSize,
+                   'engine': params['engine'], 'normalization': params['normalization'], 'dtype': binaryDtype(params['outputFormat'])}
+    done = readTiledManifest(manifestPath, description)
+    if done is None:
+        preallocateTiledOutputs(matrixPath, tileCountsPath, manifestPath, description)
+        done = set()
+    allTiles = tilesOfTriangle(numOfIndividuals, tileSize)
+    tasks = [tile for tile in allTiles if tile not in done]
+    writeToLog(str(len(allTiles) - len(tasks)) + ' out of ' + str(len(allTiles)) + ' tiles were done by previous runs, processing '
+               + str(len(tasks)) + ' tiles with ' + str(numOfWorkers) + ' workers', logFile)
+
+    tileMetrics = []
+    with measurePhase('tiles', metricsPath, len(tasks), 'tiles'):
+        if numOfWorkers > 1:
+            if 'fork' in multiprocessing.get_all_start_methods():
+                # the forked workers share the parsed window
+                context = multiprocessing.get_context('fork')
+            else:
+                # each worker parses the window once, in initTiledWorker
+                context = multiprocessing.get_context()
+            # The workers must not inherit unflushed buffers
+            flushLogs()
+            pool = context.Pool(numOfWorkers, initializer=initTiledWorker, initargs=(params,))
+            try:
+                for tile, records in pool.imap_unordered(runTile, tasks):
+                    markTileDone(manifestPath, tile)
+                    tileMetrics.extend(records)
+                    done.add(tile)
+                    writeToLog('Tile ' + str(tile) + ' done, ' + str(len(done)) + ' out of ' + str(len(allTiles)), logFile)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            initTiledWorker(params)
+            for tile in tasks:
+                runTile(tile)
+                markTileDone(manifestPath, tile)
+                done.add(tile)
+                writeToLog('Tile ' + str(tile) + ' done, ' + str(len(done)) + ' out of ' + str(len(allTiles)), logFile)
+    closeTiledOutputs()
+    _tiledWindow = None
+    _tiledFrequencies = None
+    _tiledWeights = None
+
+    with measurePhase('write', metricsPath, numOfIndividuals * (numOfIndividuals - 1) // 2, 'pairs'):
+        # like the matrix, the counts are never held in memory as a whole - they are mapped, or read a row at a time
+        if np is not None:
+            counts = np.memmap(tileCountsPath, dtype='<u4', mode='r') if numOfIndividuals > 1 else np.zeros(0, dtype='<u4')
+            writeCondensedCountsToFile(numOfSnpsInWindow, counts, numOfIndividuals, countsPath, params['normalization'])
+            counts = None
+        else:
+            writeTiledCountsToFile(numOfSnpsInWindow, tileCountsPath, numOfIndividuals, countsPath, params['normalization'])
+        makeDirs(distancesPath)
+        os.replace(matrixPath, distancesPath)
+    os.remove(tileCountsPath)
+    os.remove(manifestPath)
+    os.rmdir(os.path.dirname(manifestPath))
+    try:
+        # Tiles/ is removed with its last window - other windows may still be tiled in it
+        os.rmdir(outputFolder + "Tiles/")
+    except OSError:
+        pass
+    writeToLog('Tiled matrix written to ' + distancesPath, logFile)
+    writeMetricsSummary(_phaseMetrics + tileMetrics, metricsPath, logFile)
+    flushLogs()
+
+#********************************************************************
+#********************************************************************
+#********************************************************************
+#
+#                       Incremental driver
+#
+#********************************************************************
+#********************************************************************
+#********************************************************************
+
+#********************************************************************
+# Path of the state of the incremental updates of window @windowIndex - the genotypes of the window of all the
+# individuals added so far, with their allele counts per locus, in the genotype cache format - and the path the
+# state of an update is written to until the outputs of the window are.
+#********************************************************************
+def incrementalPaths(outputFolder, windowSize, windowIndex):
+    statePath = outputFolder + "Incremental/" + str(windowSize) + "_" + str(windowIndex) + ".gtc"
+    return statePath, statePath + ".pending"
+
+#********************************************************************
+# The amount of individuals in a file written by writeDistancesToFile or writeBinaryDistancesFile.
+#********************************************************************
+def numOfIndividualsInDistancesFile(distancesPath):
+    header = readBinaryDistancesHeader(distancesPath)
+    if header is not None:
+        return header['numOfIndividuals']
+    with open(distancesPath) as f:
+        return sum(1 for line in f if len(line)>1) + 1
+
+def numOfIndividualsInGenotypeCacheFile(cachePath):
+    with open(cachePath, 'rb') as f:
+        return GENOTYPE_CACHE_HEADER.unpack(f.read(GENOTYPE_CACHE_HEADER.size))[4]
+
+#********************************************************************
+# The genotypes of the window of the individuals added so far, and their allele counts per locus, from @statePath.
+# Before the first update these are the individuals of the input of the run, which are read (or taken from the
+# genotype cache) and written to @statePath.
+#********************************************************************
+def loadIncrementalState(params, statePath, logFile):
+    if not os.path.isfile(statePath):
+        writeToLog('No incremental state in ' + statePath + ', reading the window of ' + params['inputFile'], logFile)
+        if params['cacheFolder'] != "":
+            store, _ = loadGenotypeCache(params, params['cacheFolder'], logFile, params['cacheMaxBytes'])
+            window = store.takeLoci(sorted(windowLoci(params['windowSize'], params['windowIndex'], params['shuffeledFile'], params['totalSnps'])))
+        else:
+            window = readRandomWindow(params['inputFile'], params['windowSize'], params['windowIndex'], params['shuffeledFile'], params['totalSnps'], params['totalIndividuals'],
+                                      params['allelesString'], params['alleleMissingValueChar'], params['binaryMode'], params['pivoted'])
+        alleleCounts = calcAlleleCountsPerLocus(window, params['allelesString'], logFile)
+        writeGenotypeCacheFile(window, alleleCounts, len(params['allelesString'].split(','))+1, statePath)
+    return readGenotypeCacheFile(statePath)
+
+#********************************************************************
+# Sums two allele counts per locus, as returned by calcAlleleCountsPerLocus.
+#********************************************************************
+def addAlleleCounts(alleleCounts, moreAlleleCounts):
+    if np is not None and isinstance(alleleCounts, np.ndarray):
+        return alleleCounts.astype(np.uint32) + np.asarray(moreAlleleCounts, dtype=np.uint32)
+    return [[a + b for a, b in zip(locusCounts, moreLocusCounts)] for locusCounts, moreLocusCounts in zip(alleleCounts, moreAlleleCounts)]
+
+#********************************************************************
+# The loci at which the frequencies of the alleles in @frequenciesPerLocus differ from the ones in @oldFrequenciesPerLocus.
+#********************************************************************
+def changedLoci(oldFrequenciesPerLocus, frequenciesPerLocus):
+    ans = []
+    for l in range(len(frequenciesPerLocus.keys())):
+        # the last entry is the amount of missing ones, guard rail - we wont divide by 0
+        old = oldFrequenciesPerLocus[l][:-1]
+        new = frequenciesPerLocus[l][:-1]
+        oldTotal = max(1, sum(old))
+        newTotal = max(1, sum(new))
+        if any(o*newTotal != c*oldTotal for o, c in zip(old, new)):
+            ans.append(l)
+    return ans
+
+#********************************************************************
+# The change of the (1-f) weight of every allele at each of @loci when the frequencies change from
+# @oldFrequenciesPerLocus to @frequenciesPerLocus - weightsChange[l][k] is f_k - f'_k at the l-th locus of @loci.
+#********************************************************************
+def calcWeightsChange(oldFrequenciesPerLocus, frequenciesPerLocus, loci):
+    weightsChange = []
+    for locus in loci:
+        # guard rail - we wont divide by 0
+        oldTotal = float(max(1, nonMissingEntiresAtLocus(oldFrequenciesPerLocus, locus)))
+        newTotal = float(max(1, nonMissingEntiresAtLocus(frequenciesPerLocus, locus)))
+        weightsChange.append([o/oldTotal - c/newTotal for o, c in zip(oldFrequenciesPerLocus[locus][:-1], frequenciesPerLocus[locus][:-1])])
+    return weightsChange
+
+#********************************************************************
+# Same as calcDistancesBetweenTwo, for the change of the distance between two individuals when the weights of their
+# loci change by @weightsChange (as returned by calcWeightsChange), in one pass over the loci.
+#********************************************************************
+def calcWeightsChangeBetweenTwo(i, j, weightsChange):
+    change = 0
+    for l in range(len(i)):
+        a = i[l][0]
+        b = i[l][1]
+        c = j[l][0]
+        d = j[l][1]
+        if ( a!=-1 and b!=-1 and c!=-1 and d!=-1):
+            Iac = 1 if(a==c) else 0
+            Iad = 1 if(a==d) else 0
+            Ibc = 1 if(b==c) else 0
+            Ibd = 1 if(b==d) else 0
+            change = change + 0.25*(weightsChange[l][a]*(Iac+Iad) + weightsChange[l][b]*(Ibc+Ibd))
+    return change
+
+#********************************************************************
+# Same as calcDistancesNumpy, for the change of the distances of the individuals of @window when the weights of
+# their loci change by @weightsChange (calcLocusWeights with the new frequencies minus with the old ones).
+# Returns a full matrix - use only the upper triangle.
+#********************************************************************
+def calcWeightsChangeNumpy(window, weightsChange, numOfAlleles):
+    change = np.zeros((window.numOfIndividuals, window.numOfIndividuals), dtype=np.float64)
+    for start in range(0, window.numOfLoci, LOCI_BATCH_SIZE):
+        end = min(start + LOCI_BATCH_SIZE, window.numOfLoci)
+        alleleCounts, _ = window.alleleCountsBatch(start, end, numOfAlleles)
+        for k in range(numOfAlleles):
+            counts = alleleCounts[k].astype(np.float64)
+            if not counts.any():
+                continue
+            change += np.dot(counts * weightsChange[k, start:end], counts.T)
+    return 0.25*change
+
+#********************************************************************
+# The distances and valid snps of all the individuals after @newWindow is added to the individuals of @window, with
+# the numpy engine. The distances of the pairs of @window are @oldDistances and @oldCounts (condensed, as returned by
+# readWindowFiles), corrected at the loci whose frequencies changed. Returns full matrices, as calcDistancesNumpy.
+#********************************************************************
+def calcIncrementalNumpy(window, newWindow, oldDistances, oldCounts, oldFrequenciesPerLocus, frequenciesPerLocus, allelesString, logFile):
+    if np is None:
+        raise ImportError('The numpy engine requires numpy. Please install it, or use the python engine.')
+    numOfAlleles = len(allelesString.split(','))
+    weights = calcLocusWeights(frequenciesPerLocus, numOfAlleles)
+    weightsChange = weights - calcLocusWeights(oldFrequenciesPerLocus, numOfAlleles)
+    loci = np.nonzero((weightsChange != 0).any(axis=0))[0]
+    n = window.numOfIndividuals
+    numOfIndividuals = n + newWindow.numOfIndividuals
+    allDist = np.zeros((numOfIndividuals, numOfIndividuals), dtype=np.float64)
+    allValids = np.zeros((numOfIndividuals, numOfIndividuals), dtype=np.float64)
+    upper = np.triu_indices(n, 1)
+    allDist[:n, :n][upper] = oldDistances
+    allValids[:n, :n][upper] = oldCounts
+    writeToLog('Correcting the distances of ' + str(n) + ' individuals at ' + str(len(loci)) + ' out of ' + str(window.numOfLoci) + ' loci', logFile)
+    if len(loci) > 0:
+        allDist[:n, :n] += calcWeightsChangeNumpy(window.takeLoci(loci.tolist()), weightsChange[:, loci], numOfAlleles)
+    writeToLog('Calculating the distances of ' + str(newWindow.numOfIndividuals) + ' new individuals', logFile)
+    allDist[:n, n:], allValids[:n, n:] = calcDistancesBlockNumpy(window, newWindow, weights, numOfAlleles)
+    allDist[n:, n:], allValids[n:, n:] = calcDistancesBlockNumpy(newWindow, newWindow, weights, numOfAlleles)
+    return allDist, allValids, len(loci)
+
+#********************************************************************
+# Same as calcIncrementalNumpy, with the python engine. Returns the distances and the valid counts as calcDistances.
+#********************************************************************
+def calcIncremental(window, newWindow, oldDistances, oldCounts, oldFrequenciesPerLocus, frequenciesPerLocus, logFile):
+    loci = changedLoci(oldFrequenciesPerLocus, frequenciesPerLocus)
+    n = window.numOfIndividuals
+    numOfIndividuals = n + newWindow.numOfIndividuals
+    numOfSnpsInWindow = window.numOfLoci
+    allDist = dict()
+    allValids = dict()
+    index = 0
+    for i in range(numOfIndividuals):
+        allDist[i] = dict()
+        for j in range(i+1, n):
+            allDist[i][j] = float(oldDistances[index])
+            if oldCounts[index] < numOfSnpsInWindow:
+                allValids.setdefault(i, dict())[j] = int(oldCounts[index])
+            index = index + 1
+    writeToLog('Correcting the distances of ' + str(n) + ' individuals at ' + str(len(loci)) + ' out of ' + str(numOfSnpsInWindow) + ' loci', logFile)
+    if len(loci) > 0:
+        changedWindow = window.takeLoci(loci)
+        weightsChange = calcWeightsChange(oldFrequenciesPerLocus, frequenciesPerLocus, loci)
+        for i in range(n):
+            individual = changedWindow.individual(i)
+            for j in range(i+1, n):
+                allDist[i][j] = allDist[i][j] + calcWeightsChangeBetweenTwo(individual, changedWindow.individual(j), weightsChange)
+    writeToLog('Calculating the distances of ' + str(newWindow.numOfIndividuals) + ' new individuals', logFile)
+    newIndividuals = [newWindow.individual(j) for j in range(newWindow.numOfIndividuals)]
+    for i in range(numOfIndividuals):
+        individual = window.individual(i) if i < n else newIndividuals[i-n]
+        for j in range(max(i+1, n), numOfIndividuals):
+            S_ij,C_ij = calcDistancesBetweenTwo(individual, newIndividuals[j-n], frequenciesPerLocus)
+            allDist[i][j] = S_ij
+            if C_ij < numOfSnpsInWindow:
+                allValids.setdefault(i, dict())[j] = C_ij
+    return allDist, allValids, len(loci)
+
+#********************************************************************
+# Adds the @numOfNewIndividuals individuals of @newInputFile (of the same loci and format as the input) to a window
+# which was already processed, without calculating the distances of its pairs again.
+# Only the distances between the new individuals and all the others are calculated. The distances of the existing
+# pairs depend on the individuals added only through the frequencies, so they are corrected at the loci whose
+# frequencies changed: by 0.25 * sum over l,k of (f_k(l) - f'_k(l))*n_k(i,l)*n_k(j,l), where f' are the frequencies
+# with the new individuals. Their valid snps do not change.
+# The correction is a pass over all the existing pairs at the changed loci, so its cost depends on the existing
+# individuals too, not only on the new ones.
+# The outputs of the window are written again for all the individuals, the new ones last, as a run on all of them
+# would write them. The genotypes and the allele counts the next batch needs are kept in Incremental/.
+#********************************************************************
+def runIncremental(inputVector):
+    if len(inputVector)<9:
+        print ("Required parameters: -incremental newInputFile numOfNewIndividuals inputFile outputFolder totalSnps totalIndividuals binaryMode.")
+        return
+    newInputFile = inputVector[2]
+    numOfNewIndividuals = int(inputVector[3])
+    params = parseParameters(inputVector[0:1] + inputVector[4:])
+    outputFolder = params['outputFolder']
+    windowSize = params['windowSize']
+    windowIndex = params['windowIndex']
+    allelesString = params['allelesString']
+    distancesPath, countsPath, frequenciesPerLocusPath, logFile = windowPaths(outputFolder, windowSize, windowIndex, params['outputFormat'])
+    logFile = logFile[:-len(".log")] + "_incremental.log"
+    metricsPath = metricsPathOfLog(logFile)
+    makeDirs(logFile)
+    if not os.path.isfile(distancesPath):
+        raise ValueError(distancesPath + ' does not exist, process the window before adding individuals to it')
+    statePath, pendingPath = incrementalPaths(outputFolder, windowSize, windowIndex)
+    if os.path.isfile(pendingPath):
+        if numOfIndividualsInDistancesFile(distancesPath) == numOfIndividualsInGenotypeCacheFile(pendingPath):
+            # The previous update wrote the outputs, and stopped before its state replaced the old one
+            os.replace(pendingPath, statePath)
+            writeToLog('The previous update of the window was completed, its individuals are already in ' + distancesPath, logFile)
+            flushLogs()
+            return
+        os.remove(pendingPath)
+
+    with measurePhase('parse', metricsPath, 0, 'genotypes') as record:
+        window, alleleCounts = loadIncrementalState(params, statePath, logFile)
+        newWindow = readRandomWindow(newInputFile, windowSize, windowIndex, params['shuffeledFile'], params['totalSnps'], numOfNewIndividuals,
+                                     allelesString, params['alleleMissingValueChar'], params['binaryMode'], params['pivoted'])
+        record['items'] = newWindow.numOfIndividuals * newWindow.numOfLoci
+    n = window.numOfIndividuals
+    numOfIndividuals = n + numOfNewIndividuals
+    numOfSnpsInWindow = window.numOfLoci
+    if numOfIndividualsInDistancesFile(distancesPath) != n:
+        raise ValueError(distancesPath + ' does not hold the ' + str(n) + ' individuals of ' + statePath)
+
+    with measurePhase('frequencies', metricsPath, newWindow.numOfIndividuals * numOfSnpsInWindow, 'genotypes'):
+        newAlleleCounts = addAlleleCounts(alleleCounts, calcAlleleCountsPerLocus(newWindow, allelesString, logFile))
+        oldFrequenciesPerLocus = windowFrequenciesFromCounts(alleleCounts, range(numOfSnpsInWindow))
+        frequenciesPerLocus = windowFrequenciesFromCounts(newAlleleCounts, range(numOfSnpsInWindow))
+        _, oldDistances, oldCounts = readWindowFiles(distancesPath, countsPath, n)
+
+    numOfNewPairs = numOfIndividuals * (numOfIndividuals - 1) // 2 - n * (n - 1) // 2
+    with measurePhase('distances', metricsPath, numOfNewPairs * numOfSnpsInWindow, 'pairLoci'):
+        if params['engine'] == 'numpy':
+            distances, counts, numOfChangedLoci = calcIncrementalNumpy(window, newWindow, oldDistances, oldCounts, oldFrequenciesPerLocus, frequenciesPerLocus, allelesString, logFile)
+        else:
+            distances, counts, numOfChangedLoci = calcIncremental(window, newWindow, oldDistances, oldCounts, oldFrequenciesPerLocus, frequenciesPerLocus, logFile)
+
+    # The distances file is written last and the state replaced after it, so an update which stopped is either
+    # completed (when the distances file holds all the individuals) or run again.
+    with measurePhase('write', metricsPath, numOfIndividuals * (numOfIndividuals - 1) // 2, 'pairs'):
+        writeGenotypeCacheFile(window.concatIndividuals(newWindow), newAlleleCounts, len(allelesString.split(','))+1, pendingPath)
+        writeFrequenciesPerLocusToFile(frequenciesPerLocus, frequenciesPerLocusPath)
+        newIds = individualIds(newInputFile)
+        if newIds is not None and os.path.isfile(outputFolder + "Individuals.txt"):
+            if len(newIds) != numOfNewIndividuals:
+                raise ValueError('numOfNewIndividuals is ' + str(numOfNewIndividuals) + ' but ' + newInputFile + ' has ' + str(len(newIds)) + ' individuals')
+            with open(outputFolder + "Individuals.txt") as f:
+                ids = [line.rstrip('\n') for line in f if line.strip() != ""][:n]
+            with openAtomically(outputFolder + "Individuals.txt") as f:
+                for individualId in ids + newIds:
+                    f.write(individualId + '\n')
+        writeWindowOutputs(distances, counts, numOfIndividuals, numOfSnpsInWindow, distancesPath, countsPath, params['engine'], params['normalization'], params['outputFormat'])
+    os.replace(pendingPath, statePath)
+    writeToLog('Added ' + str(numOfNewIndividuals) + ' individuals to ' + distancesPath + ', ' + str(numOfNewPairs) + ' new pairs, the distances of '
+               + str(n * (n - 1) // 2) + ' pairs corrected at ' + str(numOfChangedLoci) + ' out of ' + str(numOfSnpsInWindow) + ' loci', logFile)
+    writeMetricsSummary(_phaseMetrics, metricsPath, logFile)
+    flushLogs()
 
 if __name__ == "__main__":
     main(sys.argv)
@@ -469,26 +2456,146 @@ def initMatrix(n):
             m[i][j]=0
     return m
 
+#********************************************************************
+# Paths of the distances (.csv, or .bin when there is no .csv) and counts files of window @iw in @distancesFolder.
+#********************************************************************
+def windowFilesInFolder(distancesFolder, windowSize, iw):
+    countsPath = distancesFolder + "Counts" + str(windowSize) +"_"+ str(iw) +".csv"
+    fname = distancesFolder +"Matrix"+ str(windowSize) +"_"+ str(iw) +".csv"
+    if not os.path.isfile(fname):
+        fname = distancesFolder +"Matrix"+ str(windowSize) +"_"+ str(iw) +".bin"
+    return fname, countsPath
+
 #********************************************************************
 # Merges random @numOfWindowsToGroup.
-# @DistancesFolder should hold all distances as writen by writeDistancesToFile
+# @DistancesFolder should hold all distances as writen by writeDistancesToFile (or writeBinaryDistancesFile)
+# The merged matrix is written in the binary format when @outputPath ends with .bin
 # Normally @firstIndexOfWindows=0 and @lastIndexOfWindows=(int)totalSnps/windowSize
+# The sums of distances and the amounts of snps used to divide them are summed separately, whatever the
+# normalization of each window was. The merged matrix is divided using @normalization ('total' or 'valid').
 #********************************************************************
-def mergeMatrixsRandomly(outputPath,distancesFolder,windowSize,numOfWindowsToGroup,firstIndexOfWindows,lastIndexOfWindows,numOfIndividuals):
-    m = initMatrix(numOfIndividuals)
+def mergeMatrixsRandomly(outputPath,distancesFolder,windowSize,numOfWindowsToGroup,firstIndexOfWindows,lastIndexOfWindows,numOfIndividuals,normalization='total'):
+    m = None
+    counts = None
     totalCount =0
     for iw in random.sample(range(firstIndexOfWindows, lastIndexOfWindows), numOfWindowsToGroup):
-        count = int(open(distancesFolder + "Counts" + str(windowSize) +"_"+ str(iw) +".csv").readline().split()[1])
+        fname, countsPath = windowFilesInFolder(distancesFolder, windowSize, iw)
+        count, distances, validCounts = readWindowFiles(fname, countsPath, numOfIndividuals)
         totalCount = totalCount + count
-        fname = distancesFolder +"Matrix"+ str(windowSize) +"_"+ str(iw) +".csv"
-        with open(fname) as fp:
-            for i, line in enumerate(fp):
-                if(len(line)>1):
-                    parts = line.replace(",\n","").split(',')
-                    for j in range(0,len(parts)):
-                        d = (float(parts[j]))
-                        oldD = m[i][(i+1)+j]
-                        # the first entry in each line is the distance between i and i+1
-                        m[i][(i+1)+j] =  oldD + d
-    writeDistancesToFile(m, totalCount, outputPath)
+        m = addCondensed(m, distances)
+        counts = addCondensed(counts, validCounts)
+    if outputPath.endswith(".bin"):
+        writeBinaryDistancesFile(m, numOfIndividuals, totalCount, outputPath, counts if normalization == 'valid' else None, normalization)
+    else:
+        writeCondensedDistancesToFile(m, numOfIndividuals, totalCount, outputPath, counts if normalization == 'valid' else None)
+
+#********************************************************************
+# Draws the windows of each of @numOfReplicates replicates out of @windows, using the random.Random @rng.
+# Returns a list holding, per replicate, a dict mapping a window to the amount of times it is used.
+# 'bootstrap' - each replicate draws @numOfWindowsToGroup windows (default - all of them) with replacement.
+# 'jackknife' - the windows are randomly split to @numOfReplicates groups, each replicate leaves one group out.
+#               With @numOfReplicates equal to the amount of windows this is the delete-one jackknife.
+#********************************************************************
+def resampleWindows(windows, numOfReplicates, method, rng, numOfWindowsToGroup=None):
+    replicates = []
+    if method == 'bootstrap':
+        if numOfWindowsToGroup is None:
+            numOfWindowsToGroup = len(windows)
+        for r in range(numOfReplicates):
+            multiplicities = dict()
+            for k in range(numOfWindowsToGroup):
+                iw = rng.choice(windows)
+                multiplicities[iw] = multiplicities.get(iw, 0) + 1
+            replicates.append(multiplicities)
+    elif method == 'jackknife':
+        if numOfReplicates < 2 or numOfReplicates > len(windows):
+            raise ValueError('A jackknife needs between 2 and ' + str(len(windows)) + ' replicates, got ' + str(numOfReplicates))
+        shuffled = list(windows)
+        rng.shuffle(shuffled)
+        for r in range(numOfReplicates):
+            leftOut = set(shuffled[r::numOfReplicates])
+            replicates.append(dict((iw, 1) for iw in windows if iw not in leftOut))
+    else:
+        raise ValueError('Unknown resampling method ' + str(method) + ', expected bootstrap or jackknife')
+    return replicates
 
+#********************************************************************
+# Generates @numOfReplicates bootstrap or jackknife replicates of the merged matrix of windows
+# @firstIndexOfWindows..@lastIndexOfWindows-1 in @distancesFolder (see mergeMatrixsRandomly).
+# Each window is read once, and added to all the replicates using it, weighted by the amount of times it was drawn.
+# As in mergeMatrixsRandomly, the sums of distances and the amounts of snps (from the Counts files) are summed
+# separately, and each replicate is divided using @normalization.
+# Replicate r is written to @outputFolder/Replicates/Matrix<windowSize>_<method>_<r>.csv (.bin for a binary
+# @outputFormat, which NetStruct_Hierarchy accepts as -pm as well) along with its Counts file.
+# The windows used by each replicate are listed in Windows<windowSize>_<method>.csv.
+# The same @seed gives the same replicates.
+# With numpy the sums of all the replicates are accumulated in memory mapped files in @outputFolder/Replicates/
+# (removed when done), in blocks of PAIRS_BLOCK_SIZE pairs, so the memory used does not grow with @numOfReplicates.
+# The amounts of valid snps per pair are only summed for the 'valid' @normalization - with 'total' the Counts files
+# of the replicates hold only the total amount of snps.
+#********************************************************************
+def generateReplicates(outputFolder, distancesFolder, windowSize, firstIndexOfWindows, lastIndexOfWindows, numOfIndividuals,
+                       numOfReplicates, method='bootstrap', seed=None, numOfWindowsToGroup=None, normalization='total', outputFormat='text'):
+    windows = list(range(firstIndexOfWindows, lastIndexOfWindows))
+    replicates = resampleWindows(windows, numOfReplicates, method, random.Random(seed), numOfWindowsToGroup)
+    replicatesFolder = outputFolder + "Replicates/"
+    prefix = replicatesFolder + "Matrix" + str(windowSize) + "_" + method + "_"
+    makeDirs(prefix)
+    with openAtomically(replicatesFolder + "Windows" + str(windowSize) + "_" + method + ".csv") as f:
+        f.write('<replicate>,<window>:<times used>,...\n')
+        for r, multiplicities in enumerate(replicates):
+            f.write(str(r) + ',' + ','.join([str(iw) + ':' + str(multiplicities[iw]) for iw in sorted(multiplicities)]) + '\n')
+
+    numOfPairs = numOfIndividuals*(numOfIndividuals-1)//2
+    useCounts = normalization == 'valid'
+    distancesSumsPath = replicatesFolder + "Sums" + str(windowSize) + "_" + method + ".f8"
+    countsSumsPath = replicatesFolder + "CountsSums" + str(windowSize) + "_" + method + ".f8"
+    counts = None
+    if np is not None:
+        # the files are created filled with zeros
+        distances = np.memmap(distancesSumsPath, dtype=np.float64, mode='w+', shape=(numOfReplicates, max(1, numOfPairs)))
+        if useCounts:
+            counts = np.memmap(countsSumsPath, dtype=np.float64, mode='w+', shape=(numOfReplicates, max(1, numOfPairs)))
+    else:
+        distances = [[0.0]*numOfPairs for r in range(numOfReplicates)]
+        if useCounts:
+            counts = [[0]*numOfPairs for r in range(numOfReplicates)]
+    totalCounts = [0]*numOfReplicates
+    for iw in windows:
+        users = [(r, multiplicities[iw]) for r, multiplicities in enumerate(replicates) if iw in multiplicities]
+        if len(users) == 0:
+            continue
+        fname, countsPath = windowFilesInFolder(distancesFolder, windowSize, iw)
+        count, windowDistances, windowCounts = readWindowFiles(fname, countsPath, numOfIndividuals)
+        if np is not None:
+            windowDistances = np.asarray(windowDistances, dtype=np.float64)
+            windowCounts = np.asarray(windowCounts, dtype=np.float64)
+        for r, times in users:
+            totalCounts[r] = totalCounts[r] + times*count
+            if np is not None:
+                for start in range(0, numOfPairs, PAIRS_BLOCK_SIZE):
+                    end = min(start + PAIRS_BLOCK_SIZE, numOfPairs)
+                    distances[r, start:end] += times*windowDistances[start:end]
+                    if useCounts:
+                        counts[r, start:end] += times*windowCounts[start:end]
+            else:
+                distances[r] = [a + times*b for a, b in zip(distances[r], windowDistances)]
+                if useCounts:
+                    counts[r] = [a + times*b for a, b in zip(counts[r], windowCounts)]
+
+    for r in range(numOfReplicates):
+        distancesPath = prefix + str(r) + distancesFileExtension(outputFormat)
+        countsPath = replicatesFolder + "Counts" + str(windowSize) + "_" + method + "_" + str(r) + ".csv"
+        replicateDistances = distances[r][:numOfPairs]
+        validCounts = counts[r][:numOfPairs] if useCounts else None
+        if outputFormat == 'text':
+            writeCondensedDistancesToFile(replicateDistances, numOfIndividuals, totalCounts[r], distancesPath, validCounts)
+        else:
+            writeBinaryDistancesFile(replicateDistances, numOfIndividuals, totalCounts[r], distancesPath, validCounts, normalization, binaryDtype(outputFormat))
+        writeCondensedCountsToFile(totalCounts[r], validCounts, numOfIndividuals, countsPath, normalization)
+    if np is not None:
+        # the maps are closed when the arrays are released
+        distances = counts = replicateDistances = validCounts = None
+        for path in (distancesSumsPath, countsSumsPath):
+            if os.path.isfile(path):
+                os.remove(path)
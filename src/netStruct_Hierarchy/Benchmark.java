@@ -0,0 +1,110 @@
+package netStruct_Hierarchy;
+import java.io.File;
+import java.io.FileWriter;
+import java.io.IOException;
+import java.io.PrintWriter;
+import java.lang.management.ManagementFactory;
+import java.lang.management.MemoryPoolMXBean;
+import java.lang.management.MemoryType;
+import java.lang.management.ThreadMXBean;
+import java.util.Arrays;
+import java.util.HashSet;
+import java.util.LinkedList;
+import java.util.List;
+import java.util.Set;
+
+// Times the stages of NetStruct_Hierarchy (TextConvertor.createInputs and CommBraker.brakeRec) on a given matrix,
+// and appends the results as json lines to a results file. Used by BuildMatrix/NetStruct_Hierarchy_Benchmark.py.
+// Parameters are:
+// pathToMatrix pathToMapNode2SampleSite pathToSampleSites pathToWorkingDir pathToResults label benchmarks [stepSize minSizeOfCommToBrake beta jumpThresholds numOfThreads]
+// benchmarks - comma separated, createInputs and/or brakeRec (brakeRec runs createInputs first, unmeasured, if needed).
+public class Benchmark {
+	private static final ThreadMXBean threadMXBean = ManagementFactory.getThreadMXBean();
+
+	public static void main(String[] args) throws Exception {
+		if (args.length < 7){
+			System.out.println("Required parameters: pathToMatrix pathToMapNode2SampleSite pathToSampleSites pathToWorkingDir pathToResults label benchmarks.");
+			System.out.println("Non mandatory parameters: stepSize minSizeOfCommToBrake beta jumpThresholds numOfThreads.");
+			return;
+		}
+		String pathToMatrix = args[0];
+		String pathToMapNode2SampleSite = args[1];
+		String pathToSampleSites = args[2];
+		String pathToWorkingDir = args[3];
+		String pathToResults = args[4];
+		String label = args[5];
+		List<String> benchmarks = Arrays.asList(args[6].split(","));
+		double stepSize = args.length > 7 ? Double.parseDouble(args[7]) : 0.01;
+		int minSizeOfCommToBrake = args.length > 8 ? Integer.parseInt(args[8]) : 5;
+		String beta = args.length > 9 ? args[9] : "1.0";
+		boolean jumpThresholds = args.length > 10 ? Boolean.parseBoolean(args[10]) : false;
+		int numOfThreads = args.length > 11 ? Integer.parseInt(args[11]) : 1;
+
+		new File(pathToWorkingDir).mkdirs();
+		int numOfNodes = Common.numOfLinesInFile(pathToMapNode2SampleSite);
+		String description = "\"label\": \"" + label + "\", \"language\": \"java\", \"numOfIndividuals\": " + numOfNodes
+				+ ", \"stepSize\": " + stepSize + ", \"jumpThresholds\": " + jumpThresholds + ", \"numOfThreads\": " + numOfThreads + ", \"minSizeOfCommToBrake\": " + minSizeOfCommToBrake + ", \"beta\": \"" + beta
+				+ "\", \"java\": \"" + System.getProperty("java.version") + "\", \"date\": \"" + Common.getDate() + "\"";
+
+		Set<Integer> individulasToExclude = new HashSet<Integer>();
+		CommId rootComm = new CommId(pathToWorkingDir, 0, 0, 0);
+		long numOfPairs = (long)numOfNodes*(numOfNodes-1)/2;
+		double[] minAndMaxEdgesWeights = null;
+		if (benchmarks.contains("createInputs") || benchmarks.contains("brakeRec")){
+			long[] start = startMeasurement();
+			minAndMaxEdgesWeights = TextConvertor.createInputs(true, pathToMatrix, "", rootComm.edgesFileName, rootComm.commsFileName, individulasToExclude);
+			if (benchmarks.contains("createInputs")){
+				writeResult(pathToResults, description, "createInputs", start, numOfPairs, "pairs");
+			}
+		}
+		if (benchmarks.contains("brakeRec")){
+			CommAnalyzer commAnalyzer = new CommAnalyzer(pathToMapNode2SampleSite, pathToSampleSites, minSizeOfCommToBrake, individulasToExclude);
+			String pathToLog = pathToWorkingDir + "log_benchmark.log";
+			String pathToCommAnalysisFile = pathToWorkingDir + "1_CommAnalysis_benchmark.txt";
+			List<CommId> firstLevelComms = new LinkedList<CommId>();
+			firstLevelComms.add(rootComm);
+			long[] start = startMeasurement();
+			List<CommId> comms = CommBraker.brakeRec(pathToWorkingDir, firstLevelComms, minAndMaxEdgesWeights[0] + stepSize, stepSize, minAndMaxEdgesWeights[1],
+					minSizeOfCommToBrake, beta, pathToLog, commAnalyzer, pathToCommAnalysisFile, false, true, -1, 0, true, jumpThresholds, numOfThreads, 0, null, null);
+			writeResult(pathToResults, description + ", \"numOfComms\": " + comms.size(), "brakeRec", start, numOfPairs, "pairs");
+		}
+	}
+
+	// Resets the peak usage of the heap, and returns the start times - wall clock and cpu, in nanoseconds.
+	private static long[] startMeasurement(){
+		System.gc();
+		for (MemoryPoolMXBean pool : ManagementFactory.getMemoryPoolMXBeans()){
+			if (pool.getType() == MemoryType.HEAP){
+				pool.resetPeakUsage();
+			}
+		}
+		return new long[]{System.nanoTime(), cpuTime()};
+	}
+
+	private static long cpuTime(){
+		return threadMXBean.isCurrentThreadCpuTimeSupported() ? threadMXBean.getCurrentThreadCpuTime() : 0;
+	}
+
+	// Sum of the peak usage of the heap pools since the last startMeasurement.
+	private static long peakHeapBytes(){
+		long peak = 0;
+		for (MemoryPoolMXBean pool : ManagementFactory.getMemoryPoolMXBeans()){
+			if (pool.getType() == MemoryType.HEAP){
+				peak += pool.getPeakUsage().getUsed();
+			}
+		}
+		return peak;
+	}
+
+	private static void writeResult(String pathToResults, String description, String benchmark, long[] start, long items, String unit) throws IOException{
+		double seconds = (System.nanoTime() - start[0]) / 1e9;
+		double cpuSeconds = (cpuTime() - start[1]) / 1e9;
+		double throughput = items / Math.max(seconds, 1e-9);
+		String result = "{" + description + ", \"benchmark\": \"" + benchmark + "\", \"seconds\": " + seconds + ", \"cpuSeconds\": " + cpuSeconds
+				+ ", \"peakHeapBytes\": " + peakHeapBytes() + ", \"items\": " + items + ", \"unit\": \"" + unit + "\", \"throughput\": " + throughput + "}";
+		System.out.println(benchmark + ": " + seconds + " seconds, " + throughput + " " + unit + "/s");
+		PrintWriter writer = new PrintWriter(new FileWriter(pathToResults, true));
+		writer.println(result);
+		writer.close();
+	}
+}
@@ -0,0 +1,116 @@
+package netStruct_Hierarchy;
+import java.io.Closeable;
+import java.io.IOException;
+import java.io.InputStream;
+import java.nio.ByteBuffer;
+import java.nio.ByteOrder;
+import java.nio.MappedByteBuffer;
+import java.nio.channels.FileChannel;
+import java.nio.file.Files;
+import java.nio.file.Paths;
+import java.nio.file.StandardOpenOption;
+import java.util.InputMismatchException;
+
+// Reads a binary matrix written by BuildMatrix (writeBinaryDistancesFile) through memory mapped buffers.
+// Layout (little endian): a 32 bytes header -
+// 'NSTM', version (uint16), dtype (uint8, 1=float32, 2=float64), normalization (uint8, 0=total, 1=valid),
+// amount of nodes (uint64), amount of snps (uint64), 8 reserved bytes.
+// Followed by the upper triangle, row by row - the weight between i and j (i<j) for i=0..n-2, j=i+1..n-1.
+public class BinaryMatrixReader implements Closeable {
+	public static final int HEADER_SIZE = 32;
+	private static final byte[] MAGIC = {'N','S','T','M'};
+	private static final int VERSION = 1;
+	// A single mapped buffer is limited to 2GB, so large matrices are mapped in segments.
+	private static final long MAX_SEGMENT_SIZE = 1L << 30;
+
+	public final int numOfNodes;
+	public final long numOfSnps;
+	public final String normalization;
+	private final int valueSize;
+	private final long valuesPerSegment;
+	private final FileChannel channel;
+	private final MappedByteBuffer[] segments;
+
+	public BinaryMatrixReader(String pathToMatrix) throws IOException {
+		channel = FileChannel.open(Paths.get(pathToMatrix), StandardOpenOption.READ);
+		ByteBuffer header = channel.map(FileChannel.MapMode.READ_ONLY, 0, HEADER_SIZE).order(ByteOrder.LITTLE_ENDIAN);
+		for (byte b : MAGIC){
+			if (header.get() != b){
+				channel.close();
+				throw new InputMismatchException("Not a binary matrix file: " + pathToMatrix);
+			}
+		}
+		int version = header.getShort() & 0xFFFF;
+		if (version != VERSION){
+			channel.close();
+			throw new InputMismatchException("Unsupported binary matrix version " + version + " in " + pathToMatrix);
+		}
+		int dtype = header.get() & 0xFF;
+		if (dtype != 1 && dtype != 2){
+			channel.close();
+			throw new InputMismatchException("Unsupported binary matrix dtype " + dtype + " in " + pathToMatrix);
+		}
+		valueSize = dtype == 1 ? 4 : 8;
+		int normalizationCode = header.get() & 0xFF;
+		if (normalizationCode != 0 && normalizationCode != 1){
+			channel.close();
+			throw new InputMismatchException("Unsupported binary matrix normalization " + normalizationCode + " in " + pathToMatrix);
+		}
+		normalization = normalizationCode == 1 ? "valid" : "total";
+		numOfNodes = (int)header.getLong();
+		numOfSnps = header.getLong();
+
+		long numOfValues = size();
+		if (channel.size() < HEADER_SIZE + numOfValues*valueSize){
+			channel.close();
+			throw new InputMismatchException("Binary matrix file is truncated: " + pathToMatrix);
+		}
+		valuesPerSegment = MAX_SEGMENT_SIZE / valueSize;
+		int numOfSegments = (int)((numOfValues + valuesPerSegment - 1) / valuesPerSegment);
+		segments = new MappedByteBuffer[numOfSegments];
+		for (int s = 0; s < numOfSegments; s++){
+			long first = s*valuesPerSegment;
+			long length = Math.min(valuesPerSegment, numOfValues - first)*valueSize;
+			segments[s] = channel.map(FileChannel.MapMode.READ_ONLY, HEADER_SIZE + first*valueSize, length);
+			segments[s].order(ByteOrder.LITTLE_ENDIAN);
+		}
+	}
+
+	// Amount of weights in the file - n(n-1)/2.
+	public long size(){
+		return (long)numOfNodes*(numOfNodes-1)/2;
+	}
+
+	// The index-th weight in the upper triangle.
+	public double get(long index){
+		MappedByteBuffer segment = segments[(int)(index / valuesPerSegment)];
+		int position = (int)(index % valuesPerSegment)*valueSize;
+		return valueSize == 4 ? segment.getFloat(position) : segment.getDouble(position);
+	}
+
+	public static boolean isBinaryMatrix(String pathToMatrix) throws IOException {
+		byte[] start = new byte[MAGIC.length];
+		InputStream in = Files.newInputStream(Paths.get(pathToMatrix));
+		int read = 0;
+		try{
+			while (read < start.length){
+				int r = in.read(start, read, start.length - read);
+				if (r < 0) break;
+				read += r;
+			}
+		}
+		finally{
+			in.close();
+		}
+		if (read < start.length) return false;
+		for (int i = 0; i < MAGIC.length; i++){
+			if (start[i] != MAGIC[i]) return false;
+		}
+		return true;
+	}
+
+	@Override
+	public void close() throws IOException {
+		channel.close();
+	}
+}
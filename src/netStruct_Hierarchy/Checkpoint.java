@@ -0,0 +1,179 @@
+package netStruct_Hierarchy;
+import java.io.BufferedReader;
+import java.io.BufferedWriter;
+import java.io.File;
+import java.io.FileOutputStream;
+import java.io.FileReader;
+import java.io.IOException;
+import java.io.OutputStreamWriter;
+import java.io.RandomAccessFile;
+import java.nio.charset.StandardCharsets;
+import java.nio.file.Files;
+import java.nio.file.StandardCopyOption;
+import java.util.ArrayList;
+import java.util.HashMap;
+import java.util.List;
+import java.util.Map;
+
+// The state of a tree build, written (atomically) to the output directory after each level is broken, so an
+// interrupted run can continue from the last finished level (-res true) instead of starting over.
+// The manifest holds the params of the run, the thresholds range, the size of the comm analysis file after the
+// level, and the tree so far - a line per comm:
+//		<level> <entry> <line> <parentLevel> <parentEntry> <parentLine> <th> <metricUsed>
+// The comms of the deepest level are the ones to break next (none, when the tree is complete).
+public class Checkpoint {
+	public static final String FILE_NAME = "Checkpoint.txt";
+	private static final String HEADER = "NetStruct_Hierarchy checkpoint 1";
+
+	private final String pathToCheckpoint;
+	private final CommId rootComm;
+	private final String params;
+	private final String pathToCommAnalysisFile;
+	public final double minThresholdToUse;
+	public final double maxThresholdToUse;
+	// Set by read - all the comms in the tree (the root included), and the comms to break next.
+	public List<CommId> comms;
+	public List<CommId> commsToBrake;
+
+	public Checkpoint(String pathToOutputDir, CommId rootComm, String params, String pathToCommAnalysisFile, double minThresholdToUse, double maxThresholdToUse){
+		this.pathToCheckpoint = pathToOutputDir + FILE_NAME;
+		this.rootComm = rootComm;
+		this.params = params;
+		this.pathToCommAnalysisFile = pathToCommAnalysisFile;
+		this.minThresholdToUse = minThresholdToUse;
+		this.maxThresholdToUse = maxThresholdToUse;
+		this.comms = null;
+		this.commsToBrake = null;
+	}
+
+	public static boolean exists(String pathToOutputDir){
+		return new File(pathToOutputDir + FILE_NAME).exists();
+	}
+
+	public boolean isComplete(){
+		return commsToBrake != null && commsToBrake.isEmpty();
+	}
+
+	// Writes the tree under the root, after a level was broken into @commsInNextLevel (and its analysis written).
+	// The manifest is written to a temporary file, synced, and moved over the previous one, so it is never partial.
+	public void write(List<CommId> commsInNextLevel) throws IOException {
+		long[] start = Metrics.start();
+		File analysisFile = new File(pathToCommAnalysisFile);
+		File tmp = new File(pathToCheckpoint + ".tmp");
+		FileOutputStream stream = new FileOutputStream(tmp);
+		BufferedWriter writer = new BufferedWriter(new OutputStreamWriter(stream, StandardCharsets.UTF_8));
+		writer.write(HEADER);
+		writer.newLine();
+		writer.write("params " + params);
+		writer.newLine();
+		writer.write("minThresholdToUse " + minThresholdToUse);
+		writer.newLine();
+		writer.write("maxThresholdToUse " + maxThresholdToUse);
+		writer.newLine();
+		writer.write("analysisBytes " + (analysisFile.exists() ? analysisFile.length() : 0));
+		writer.newLine();
+		writer.write("complete " + commsInNextLevel.isEmpty());
+		writer.newLine();
+		int numOfComms = 0;
+		List<CommId> level = new ArrayList<CommId>();
+		level.add(rootComm);
+		while (!level.isEmpty()){
+			List<CommId> nextLevel = new ArrayList<CommId>();
+			for (CommId comm : level){
+				writeComm(writer, comm);
+				numOfComms++;
+				nextLevel.addAll(comm.childComms);
+			}
+			level = nextLevel;
+		}
+		writer.flush();
+		stream.getFD().sync();
+		writer.close();
+		Files.move(tmp.toPath(), new File(pathToCheckpoint).toPath(), StandardCopyOption.REPLACE_EXISTING, StandardCopyOption.ATOMIC_MOVE);
+		Metrics.record("checkpoint", start, numOfComms, "comms", "");
+	}
+
+	private static void writeComm(BufferedWriter writer, CommId comm) throws IOException {
+		CommId parent = comm.parentComm;
+		writer.write(comm.level + " " + comm.entry + " " + comm.line + " "
+				+ (parent == null ? "-1 -1 -1" : parent.level + " " + parent.entry + " " + parent.line) + " "
+				+ comm.th + " " + comm.metricUsed);
+		writer.newLine();
+	}
+
+	// Reads the manifest of the run in @pathToOutputDir, rebuilding the tree under @rootComm.
+	// The comm analysis file is cut back to its size when the manifest was written (dropping the lines of a level
+	// which was not finished). Fails if the manifest was written by a run with other params.
+	public static Checkpoint read(String pathToOutputDir, CommId rootComm, String params, String pathToCommAnalysisFile) throws IOException {
+		long[] start = Metrics.start();
+		String pathToCheckpoint = pathToOutputDir + FILE_NAME;
+		BufferedReader reader = new BufferedReader(new FileReader(pathToCheckpoint));
+		if (!HEADER.equals(reader.readLine())){
+			reader.close();
+			throw new IOException("Not a checkpoint file: " + pathToCheckpoint);
+		}
+		String paramsInFile = valueOf(reader.readLine(), "params");
+		if (!params.equals(paramsInFile)){
+			reader.close();
+			throw new IOException("The checkpoint in " + pathToOutputDir + " was written with other params (" + paramsInFile + "), expected " + params);
+		}
+		double minThresholdToUse = Double.parseDouble(valueOf(reader.readLine(), "minThresholdToUse"));
+		double maxThresholdToUse = Double.parseDouble(valueOf(reader.readLine(), "maxThresholdToUse"));
+		long analysisBytes = Long.parseLong(valueOf(reader.readLine(), "analysisBytes"));
+		boolean complete = Boolean.parseBoolean(valueOf(reader.readLine(), "complete"));
+		Checkpoint checkpoint = new Checkpoint(pathToOutputDir, rootComm, params, pathToCommAnalysisFile, minThresholdToUse, maxThresholdToUse);
+
+		// The comms are written level by level, so the parent of a comm is always read before it.
+		Map<CommId, CommId> commsById = new HashMap<CommId, CommId>();
+		List<CommId> comms = new ArrayList<CommId>();
+		int deepestLevel = -1;
+		String line;
+		while ((line = reader.readLine()) != null){
+			String[] parts = line.split(" ");
+			int level = Integer.parseInt(parts[0]);
+			CommId comm;
+			if (level == rootComm.level && parts[3].equals("-1")){
+				comm = rootComm;
+			}
+			else{
+				CommId parentComm = commsById.get(new CommId(pathToOutputDir, Integer.parseInt(parts[3]), Integer.parseInt(parts[4]), Integer.parseInt(parts[5])));
+				if (parentComm == null){
+					reader.close();
+					throw new IOException("Parent of comm is missing in " + pathToCheckpoint + ": " + line);
+				}
+				comm = new CommId(pathToOutputDir, level, Integer.parseInt(parts[1]), Integer.parseInt(parts[2]), Double.parseDouble(parts[6]), parentComm);
+				parentComm.childComms.add(comm);
+			}
+			comm.metricUsed = parts[7];
+			commsById.put(comm, comm);
+			comms.add(comm);
+			deepestLevel = Math.max(deepestLevel, level);
+		}
+		reader.close();
+		checkpoint.comms = comms;
+		checkpoint.commsToBrake = new ArrayList<CommId>();
+		if (!complete){
+			for (CommId comm : comms){
+				if (comm.level == deepestLevel){
+					checkpoint.commsToBrake.add(comm);
+				}
+			}
+		}
+
+		File analysisFile = new File(pathToCommAnalysisFile);
+		if (analysisFile.exists() && analysisFile.length() > analysisBytes){
+			RandomAccessFile analysis = new RandomAccessFile(analysisFile, "rw");
+			analysis.setLength(analysisBytes);
+			analysis.close();
+		}
+		Metrics.record("checkpointRead", start, comms.size(), "comms", "");
+		return checkpoint;
+	}
+
+	private static String valueOf(String line, String key) throws IOException {
+		if (line == null || !line.startsWith(key + " ")){
+			throw new IOException("Bad checkpoint file, expected " + key + " but got: " + line);
+		}
+		return line.substring(key.length() + 1);
+	}
+}
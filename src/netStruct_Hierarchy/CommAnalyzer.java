@@ -1,13 +1,14 @@
 package netStruct_Hierarchy;
+import java.io.BufferedWriter;
 import java.io.File;
 import java.io.IOException;
 import java.nio.charset.StandardCharsets;
 import java.nio.file.Files;
-import java.nio.file.Path;
 import java.nio.file.Paths;
 import java.nio.file.StandardOpenOption;
 import java.util.ArrayList;
 import java.util.Arrays;
+import java.util.Collection;
 import java.util.Collections;
 import java.util.Comparator;
 import java.util.HashMap;
@@ -29,9 +30,13 @@ public class CommAnalyzer {
 	public Set<Integer> droppedIndividuals;
 	public Set<Integer> individulasToExclude;
 	
-	public static String[][] samplesSites;
-	private static Set<String> samplesSitesSet;
-	public static int amountOfSampleSites;
+	// The sample sites, by area (a line of the sample sites file each).
+	public String[][] samplesSites;
+	// The sample sites get ids by their order in the sample sites file - sampleSiteNames[id].
+	public String[] sampleSiteNames;
+	private Map<String,Integer> sampleSiteIds;
+	// The id of the sample site of each node (-1 for nodes without one, e.g. excluded nodes).
+	public int[] sampleSiteOfNode;
 	
 	public CommAnalyzer(String pathToMapNode2SampleSite, String pathToSampleSites, int minSizeOfCommToOutput, Set<Integer> individulasToExclude) throws IOException{		
 		this.individulasToExclude = individulasToExclude;
@@ -43,107 +48,103 @@ public class CommAnalyzer {
 	}
 		
 	
+	// Gives each node the id of its sample site (and verifies all sample sites of nodes are listed).
 	private void VerifySampleSitesList() {
+		int maxNode = -1;
+		for (Integer node : mapNode2SampleSite.keySet()){
+			maxNode = Math.max(maxNode, node);
+		}
+		sampleSiteOfNode = new int[maxNode + 1];
+		Arrays.fill(sampleSiteOfNode, -1);
 		for (Entry<Integer, String> entry : mapNode2SampleSite.entrySet()){
-			if (!samplesSitesSet.contains(entry.getValue())){
+			Integer sampleSiteId = sampleSiteIds.get(entry.getValue());
+			if (sampleSiteId == null){
 				throw new InputMismatchException(" Not all sample sites are listed in the sampleSitesFile. SampleSite " + entry.getValue() 
 				+ " is missing. It is assigned to individual id " + entry.getKey() );
 			}
+			sampleSiteOfNode[entry.getKey()] = sampleSiteId;
 		}		
 	}
 
 
 	private void InitSamplesSitesList(String pathToSampleSites) throws IOException {	
-		samplesSitesSet = new HashSet<>();
+		sampleSiteIds = new HashMap<>();
 		samplesSites = TextConvertor.getSampleSites(pathToSampleSites);
-		amountOfSampleSites = 0;
+		List<String> names = new ArrayList<String>();
 		for (String[] sampleSiteArea : samplesSites){			
 			for(String sampleSite : sampleSiteArea){
-				amountOfSampleSites++;
-				samplesSitesSet.add(sampleSite);
+				if (sampleSiteIds.put(sampleSite, names.size()) != null){
+					throw new InputMismatchException(" Sample sites must all be unique names. Please verify - " + pathToSampleSites );		
+				}
+				names.add(sampleSite);
 			}			
 		}
-		if(amountOfSampleSites != samplesSitesSet.size()){
-			throw new InputMismatchException(" Sample sites must all be unique names. Please verify - " + pathToSampleSites );		
-		}
+		sampleSiteNames = names.toArray(new String[names.size()]);
 	}
 
+	public int amountOfSampleSites(){
+		return sampleSiteNames.length;
+	}
 
-
-
-	public Map<String,Integer> perSampleSiteCounts(CommId commId) throws IOException{
-		Map<String,Integer> ans = new HashMap<String,Integer>();
-		for(String[] sampleSitesArea : samplesSites){
-			for(String sampleSite : sampleSitesArea){
-				ans.put(sampleSite, 0);
-			}
-		}
-		Set<Integer> nodes = commId.GetNodes();
-		for (Integer node:nodes){
-			String sampleSite = mapNode2SampleSite.get(node);
-			ans.put(sampleSite, ans.get(sampleSite)+1);			
-		}
-		return ans;
+	// The comms x sample sites counts of @comms.
+	public CommSiteCounts CountSampleSites(Collection<CommId> comms) throws IOException{
+		return CommSiteCounts.count(comms, sampleSiteOfNode, sampleSiteNames.length);
 	}
 	
 	public void WriteCommAnalysisToFile(List<CommId> comms, String pathS) throws IOException {
-		Map<CommId,Map<String,Integer>> mapCommToMapSampleSiteToCount = new HashMap<CommId,Map<String,Integer>>();
-		for (CommId commId : comms){
-			Map<String,Integer> mapSampleSiteToCount = perSampleSiteCounts(commId);
-			mapCommToMapSampleSiteToCount.put(commId, mapSampleSiteToCount);
-		}
-		WriteCommAnalysisToFile(mapCommToMapSampleSiteToCount, pathS);
+		WriteCommAnalysisToFile(CountSampleSites(comms), pathS);
 	}
 	
-	public void WriteCommAnalysisToFile(Map<CommId,Map<String,Integer>> mapCommToMapSampleSiteToCount, String pathS) throws IOException {
-		Path path = Paths.get(pathS);	    	    
+	public void WriteCommAnalysisToFile(CommSiteCounts counts, String pathS) throws IOException {
+		BufferedWriter writer = null;
 		
 		int prevLevel=-1;
-		List<CommId> comms = SortCommsByLevelAndEntry(mapCommToMapSampleSiteToCount.keySet());
+		List<CommId> comms = SortCommsByLevelAndEntry(counts.comms());
+		StringBuilder commLine = new StringBuilder();
 		for (CommId commId : comms){
-			Map<String,Integer> mapSampleSiteToCount = mapCommToMapSampleSiteToCount.get(commId);
-			String commLine ="";
-			int commSize = SumAmountOfNodes(mapSampleSiteToCount);			
+			int commSize = counts.size(commId);			
 			if(commSize>=minSizeOfCommToOutput){
 				int commLevel = commId.level;
 				if (commLevel>prevLevel){
-					Files.write(path, Arrays.asList(" ----------- LEVEL " + commLevel + " ----------- "), StandardCharsets.UTF_8, Files.exists(path) ? StandardOpenOption.APPEND : StandardOpenOption.CREATE);					
+					if (writer == null) writer = openToAppend(pathS);
+					writer.write(" ----------- LEVEL " + commLevel + " ----------- ");
+					writer.newLine();
 					prevLevel = commLevel;
 				}				
-				commLine = commLine + "Size_" + String.format("%04d", commSize) + "_" + commId.toString() + "\t";			
+				commLine.setLength(0);
+				commLine.append("Size_").append(String.format("%04d", commSize)).append('_').append(commId.toString()).append('\t');			
 				
+				int sampleSiteId = 0;
 				for(String[] sampleSitesArea : samplesSites){
-					commLine = commLine + "|";					
+					commLine.append('|');					
 					for(String sampleSite : sampleSitesArea){
-						commLine = commLine + sampleSite + ":" + mapSampleSiteToCount.get(sampleSite) + "\t";					
+						commLine.append(sampleSite).append(':').append(counts.count(commId, sampleSiteId)).append('\t');					
+						sampleSiteId++;
 					}
 				}
-				Files.write(path, Arrays.asList(commLine), StandardCharsets.UTF_8, StandardOpenOption.APPEND);
+				writer.append(commLine);
+				writer.newLine();
 			}			
 		}
+		if (writer != null) writer.close();
+	}
+	
+	// A buffered writer appending to @pathToFile (created if missing). The writers below open their file once, on the
+	// first line they write (so no file is created when there is nothing to write), and close it when done.
+	private static BufferedWriter openToAppend(String pathToFile) throws IOException {
+		return Files.newBufferedWriter(Paths.get(pathToFile), StandardCharsets.UTF_8, StandardOpenOption.CREATE, StandardOpenOption.APPEND);
 	}
 
-	private int SumAmountOfNodes(Map<String, Integer> map) {
-		int sum = 0;
-		for (int f : map.values()) {
-		    sum += f;
-		}
-		return sum;
+	// For the files written in a single pass - a run resumed after it wrote them (see Checkpoint) writes them again.
+	private static BufferedWriter openToWrite(String pathToFile) throws IOException {
+		return Files.newBufferedWriter(Paths.get(pathToFile), StandardCharsets.UTF_8, StandardOpenOption.CREATE, StandardOpenOption.TRUNCATE_EXISTING, StandardOpenOption.WRITE);
 	}
 
-	private List<CommId> SortCommsByLevelAndEntry(Set<CommId> keySet) {
+	private List<CommId> SortCommsByLevelAndEntry(Collection<CommId> keySet) {
 		List<CommId> ans = new ArrayList<CommId>(keySet);	
 		Collections.sort(ans, new CommIdComperator());
 		return ans;
 	}
-
-	public Map<CommId, Map<String, Integer>> commsToMapSampleSiteToCount(List<CommId> comms) throws IOException {
-		Map<CommId,Map<String,Integer>> ans = new HashMap<CommId,Map<String,Integer>>();
-		for(CommId comm : comms){
-			ans.put(comm, perSampleSiteCounts(comm));
-		}
-		return ans;
-	}
 	
 	private static class CommIdComperator implements Comparator<CommId>{
 
@@ -162,23 +163,21 @@ public class CommAnalyzer {
 	 *  For f1 score
 	 * 
 	 */
-	public Map<String, SampleSite> InitSampleSites() {		
-		Map<String, SampleSite> sampleSites = new HashMap<>();
-		for(String[] sampleSitesInArea : samplesSites){
-			for(String sampleSite : sampleSitesInArea){
-				sampleSites.put(sampleSite, new SampleSite(sampleSite));
-			}
+	// The sample sites, by their ids, with their members.
+	public SampleSite[] InitSampleSites() {		
+		SampleSite[] sampleSites = new SampleSite[sampleSiteNames.length];
+		for(int sampleSiteId = 0; sampleSiteId < sampleSiteNames.length; sampleSiteId++){
+			sampleSites[sampleSiteId] = new SampleSite(sampleSiteNames[sampleSiteId]);
 		}
 		
-		for (Entry<Integer, String> IdSampleSite : mapNode2SampleSite.entrySet()){
-			SampleSite sampleSite = sampleSites.get(IdSampleSite.getValue());
-			Integer id = IdSampleSite.getKey();
+		for (Integer id : mapNode2SampleSite.keySet()){
+			SampleSite sampleSite = sampleSites[sampleSiteOfNode[id]];
 			sampleSite.members.put(id, new Individual(id, sampleSite));
 		}		
 		return sampleSites;
 	}
 	
-	public void SetPathFromRootToAll(Map<String, SampleSite> sampleSites, Set<CommId> comms) throws IOException {		
+	public void SetPathFromRootToAll(SampleSite[] sampleSites, Collection<CommId> comms) throws IOException {		
 		List<CommId> sortedComms = SortCommsByLevelAndEntry(comms);	
 		// We use this to verify there is no bug.
 		int previousLevel = -1;
@@ -190,68 +189,46 @@ public class CommAnalyzer {
 		}
 	}
 
-	private void UpdatePathFromRoot(CommId comm, Map<String, SampleSite> sampleSites) throws IOException {
+	private void UpdatePathFromRoot(CommId comm, SampleSite[] sampleSites) throws IOException {
 		String levelEntry = " " + comm.level + "-" + comm.entry + "-" + comm.line; 
-		for (Integer personId : comm.GetNodes()){
-			String sampleSiteS = mapNode2SampleSite.get((Integer)personId);
-			SampleSite sampleSite = sampleSites.get(sampleSiteS);
-			String newPathFromRoot = sampleSite.members.get(personId).pathFromRoot + levelEntry;
-			sampleSite.members.get(personId).pathFromRoot = newPathFromRoot;
+		for (int personId : comm.GetNodesArray()){
+			Individual person = sampleSites[sampleSiteOfNode[personId]].members.get(personId);
+			person.pathFromRoot = person.pathFromRoot + levelEntry;
 		}
 		
 	}
 
-	public void WriteF1ScoreMatrixToFile(Map<String, Map<String, Double>> f1ScoreMatrix,
+	// f1ScoreMatrix[id1][id2] is the F1 score of the sample sites id1 and id2, set where the name of id1 is smaller
+	// than the name of id2 (as written to the file).
+	public void WriteF1ScoreMatrixToFile(double[][] f1ScoreMatrix,
 		String pathToF1ScoreMatrixFile) throws IOException {
-		Path path = Paths.get(pathToF1ScoreMatrixFile);
-		for(String[] sampleSitesInArea1 : samplesSites){
-			for(String sampleSite1 : sampleSitesInArea1){		
-				Map<String, Double> map1 = f1ScoreMatrix.get(sampleSite1);
-				for(String[] sampleSitesInArea2 : samplesSites){
-					for(String sampleSite2 : sampleSitesInArea2){	
-						if (sampleSite1.compareTo(sampleSite2)<0){	
-							String commLine =sampleSite1 +" " + sampleSite2 + " " + map1.get(sampleSite2);
-							Files.write(path, Arrays.asList(commLine), StandardCharsets.UTF_8, Files.exists(path) ? StandardOpenOption.APPEND : StandardOpenOption.CREATE);
-						}					
-					}
-				}				
+		BufferedWriter writer = null;
+		for(int sampleSiteId1 = 0; sampleSiteId1 < sampleSiteNames.length; sampleSiteId1++){
+			String sampleSite1 = sampleSiteNames[sampleSiteId1];
+			for(int sampleSiteId2 = 0; sampleSiteId2 < sampleSiteNames.length; sampleSiteId2++){
+				String sampleSite2 = sampleSiteNames[sampleSiteId2];
+				if (sampleSite1.compareTo(sampleSite2)<0){	
+					if (writer == null) writer = openToAppend(pathToF1ScoreMatrixFile);
+					writer.write(sampleSite1 +" " + sampleSite2 + " " + f1ScoreMatrix[sampleSiteId1][sampleSiteId2]);
+					writer.newLine();
+				}					
 			}
 		}					
+		if (writer != null) writer.close();
 	}
 	
 
-	public Map<String, Map<String, Double>> CalcF1ScoresMatrix(Map<String, SampleSite> sampleSites) {
-		Map<String, Map<String, Double>> f1ScoresMatrix = InitF1ScoresMatrix();		
-		for(String sampleSiteS1 : sampleSites.keySet()){
-			for(String sampleSiteS2 : sampleSites.keySet()){
-				if (sampleSiteS1.compareTo(sampleSiteS2)<0){
-					double f1Score = sampleSites.get(sampleSiteS1).calcF1Score(sampleSites.get(sampleSiteS2));
-					f1ScoresMatrix.get(sampleSiteS1).put(sampleSiteS2, f1Score);
+	public double[][] CalcF1ScoresMatrix(SampleSite[] sampleSites) {
+		double[][] f1ScoresMatrix = new double[sampleSites.length][sampleSites.length];
+		for(int sampleSiteId1 = 0; sampleSiteId1 < sampleSites.length; sampleSiteId1++){
+			for(int sampleSiteId2 = 0; sampleSiteId2 < sampleSites.length; sampleSiteId2++){
+				if (sampleSites[sampleSiteId1].code.compareTo(sampleSites[sampleSiteId2].code)<0){
+					f1ScoresMatrix[sampleSiteId1][sampleSiteId2] = sampleSites[sampleSiteId1].calcF1Score(sampleSites[sampleSiteId2]);
 				}
 			}			
 		}
 		return f1ScoresMatrix;
 	}
-
-	private Map<String, Map<String, Double>> InitF1ScoresMatrix() {
-		Map<String, Map<String, Double>> f1ScoresMatrix = new HashMap<>();
-		for(String[] sampleSitesInArea : samplesSites){
-			for(String sampleSite : sampleSitesInArea){
-				f1ScoresMatrix.put(sampleSite, GenerateSampleSitesMap());
-			}
-		}
-		return f1ScoresMatrix;
-	}
-
-	private Map<String, Double> GenerateSampleSitesMap() {
-		Map<String, Double> sampleSitesMap = new HashMap<>();
-		for(String[] sampleSitesInArea : samplesSites){
-			for(String sampleSite : sampleSitesInArea){
-				sampleSitesMap.put(sampleSite, 0.0);
-			}
-		}
-		return sampleSitesMap;
-	}
 	
 	
 	/*
@@ -269,45 +246,56 @@ public class CommAnalyzer {
 	}
 	
 	private void SetSingleCommIdForNodes(CommId commId) throws IOException{
-		Set<Integer> nodes = commId.GetNodes();
-		for (Integer node:nodes){
+		for (int node : commId.GetNodesArray()){
 			mapNode2CommID.put(node, commId);			
 		}
 	}
 	
 	public void WriteStructureOutputToFile(CommId rootComm, Set<CommId> comms, String pathToStructureFile, int minSizeOfCommToOutput, boolean useLeafSizesForStructure, boolean useProportionalTreeSplitsForStructure) throws IOException {
-		Path path = pathToStructureFile=="" ? null : Paths.get(pathToStructureFile);
+		WriteStructureOutputToFile(rootComm, comms, pathToStructureFile, minSizeOfCommToOutput, useLeafSizesForStructure, useProportionalTreeSplitsForStructure, false);
+	}
+	
+	// Each line of the structure file is <sampleSite> <node> <leafs vector of the node's comm>. With @sparseStructure the
+	// vector is written as <amount of leafs> followed by <leaf index>:<value> of its non zero values (see CommId.WriteLeafsVector).
+	public void WriteStructureOutputToFile(CommId rootComm, Set<CommId> comms, String pathToStructureFile, int minSizeOfCommToOutput, boolean useLeafSizesForStructure, boolean useProportionalTreeSplitsForStructure, boolean sparseStructure) throws IOException {
 		rootComm.resetLeafMap();
 		rootComm.PopulateLeafMap(minSizeOfCommToOutput,useLeafSizesForStructure,useProportionalTreeSplitsForStructure);
-		SetLeafsVectorAsString(rootComm,comms);		
+		SetLeafsVector(rootComm,comms);		
 		SetCommIdsForNodes(comms);	
-		if(path!=null){
+		if(!pathToStructureFile.equals("")){
+			BufferedWriter writer = null;
 			for ( Entry<Integer, CommId> nodeCommId: mapNode2CommID.entrySet()){
 				Integer node = nodeCommId.getKey();				
 				CommId commId = nodeCommId.getValue();
 				String sampleSite = mapNode2SampleSite.get((Integer)node);
-				String leafsVectorAsString = commId.leafsVectorAsString;
-				String line = sampleSite + " " + node + " " + leafsVectorAsString;
-				
-				Files.write(path, Arrays.asList(line), StandardCharsets.UTF_8, Files.exists(path) ? StandardOpenOption.APPEND : StandardOpenOption.CREATE);
+				if (writer == null) writer = openToAppend(pathToStructureFile);
+				writer.write(sampleSite + " " + node + " ");
+				commId.WriteLeafsVector(writer, sparseStructure);
+				writer.newLine();
 			}
+			if (writer != null) writer.close();
 		}
 	}
 
 	// The root holds all leafs, enabiling us to discover the amount of leafs, and the communities in them.
 	// We use it to generate the LeafsVector per comm in comms.
-	private void SetLeafsVectorAsString(CommId rootComm, Set<CommId> comms) {
+	private void SetLeafsVector(CommId rootComm, Set<CommId> comms) {
 		Set<CommId> allLeafs = rootComm.leafs.keySet();
 		List<CommId> sortedAllLeafs = SortCommsByLevelAndEntry(allLeafs);
 		for (CommId  comm : comms){
-			comm.SetLeafsVectorAsString(sortedAllLeafs);
+			comm.SetLeafsVector(sortedAllLeafs);
 		}
 		
 	}
 
+	// Rebuilds the tree from the comm analysis file. The thresholds of the entries are taken from the names of the comms
+	// files in @pathToWorkingDir (listed once), and parents are found by their id.
 	public List<CommId> getCommsFromFiles(String pathToWorkingDir, String pathToCommAnalysisFile, CommId rootComm) throws IOException {
 		List<CommId> comms= new ArrayList<>();
 		comms.add(rootComm);
+		Map<CommId, CommId> commsById = new HashMap<CommId, CommId>();
+		commsById.put(rootComm, rootComm);
+		Map<String, Double> thresholdsOfEntries = FindLongThresholds(pathToWorkingDir);
 		List<String> lines = Files.readAllLines(Paths.get(pathToCommAnalysisFile));
 		for (String lineInFile : lines){
 			if(!lineInFile.contains("---")){
@@ -319,35 +307,36 @@ public class CommAnalyzer {
 				int parentLevel = Integer.parseInt(parts[9]);
 				int parentEntry = Integer.parseInt(parts[11]);
 				int parentLine = Integer.parseInt(parts[13]);				
-				double th = FindLongThreshold(pathToWorkingDir, level,entry,parentLevel,parentEntry,parentLine);
-				CommId parentComm = FindComm(comms,parentLevel,parentEntry,parentLine);				
-				CommId comm = new CommId(pathToWorkingDir, level, entry, line, th , parentComm);
+				Double th = thresholdsOfEntries.get(EntryKey(level,entry,parentLevel,parentEntry,parentLine));
+				CommId parentComm = commsById.get(new CommId(pathToWorkingDir, parentLevel, parentEntry, parentLine));
+				if (parentComm == null){
+					throw new RuntimeException("Comm not found! Level-" + parentLevel + " Entry-" + parentEntry + " Line-" + parentLine);
+				}
+				CommId comm = new CommId(pathToWorkingDir, level, entry, line, th == null ? 0 : th , parentComm);
 				comms.add(comm);
+				commsById.put(comm, comm);
 				parentComm.childComms.add(comm);
 			}
 		}
 		return comms;
 	}
 
-	public static double FindLongThreshold(String pathToWorkingDir, int level, int entry, int parentLevel, int parentEntry,
-			int parentLine) {
-			for (File fileEntry : new File(pathToWorkingDir).listFiles()) {	        
-				if(fileEntry.getName().contains("Level_" +level +"_Entry_" +entry  +"_ParentLevel_" +parentLevel +"_ParentEntry_" +parentEntry +"_ParentLine_" +parentLine)){	  
-				//*** if(fileEntry.getName().contains("Level_" +level +"_Entry_" +entry +"_ParentEntry_" +parentEntry +"_ParentLine_" +parentLine)){
-					String[] parts = fileEntry.getName().split("_");
-					return Double.parseDouble(parts[parts.length-2]);
-				}
+	// The threshold of each entry (by EntryKey), from the names of its comms files - Le_#_En_#_PaLe_#_PaEn_#_PaLi_#_TH_#_C.txt
+	// (the analysis file holds a rounded threshold only).
+	private static Map<String, Double> FindLongThresholds(String pathToWorkingDir) {
+		Map<String, Double> ans = new HashMap<String, Double>();
+		for (String fileName : new File(pathToWorkingDir).list()) {	        
+			if (fileName.startsWith("Le_") && fileName.contains("_PaLe_") && fileName.endsWith("_C.txt")){
+				String[] parts = fileName.split("_");
+				ans.put(EntryKey(Integer.parseInt(parts[1]), Integer.parseInt(parts[3]), Integer.parseInt(parts[5]), Integer.parseInt(parts[7]), Integer.parseInt(parts[9])),
+						Double.parseDouble(parts[parts.length-2]));
 			}
-		return 0;
+		}
+		return ans;
 	}
 
-	private CommId FindComm(List<CommId> comms, int level, int entry, int line) {
-		for (CommId comm : comms){
-			if (comm.level == level && comm.entry == entry && comm.line == line){
-				return comm;
-			}
-		}
-		throw new RuntimeException("Comm not found! Level-" + level + " Entry-" + entry + " Line-" + line);
+	private static String EntryKey(int level, int entry, int parentLevel, int parentEntry, int parentLine) {
+		return level + "_" + entry + "_" + parentLevel + "_" + parentEntry + "_" + parentLine;
 	}
 
 	
@@ -362,12 +351,11 @@ public class CommAnalyzer {
 			Integer node = nodeCommId.getKey();
 			mapNode2LeafsInSubTree.put(node, new HashSet<Integer>());
 			CommId commId = nodeCommId.getValue();
-			String leafs = commId.leafsVectorAsString;
-			String[] leafsStringA = leafs.split(",");
+			double[] leafsVector = commId.leafsVector;
 			// First we assign the leafs for each node.
 			Set<Integer> leafsInSubTree = mapNode2LeafsInSubTree.get(node);			
-			for(Integer i = 0 ; i < leafsStringA.length ; i++){
-				if(!leafsStringA[i].equals("0.0")){
+			for(int i = 0 ; i < leafsVector.length ; i++){
+				if(leafsVector[i] != 0.0){
 					leafsInSubTree.add(i);
 				}
 			}
@@ -403,30 +391,37 @@ public class CommAnalyzer {
 
 
 	public void WriteLeafsNoOverlapAsCommunitiesToFile(String pathToLeafsFile) throws IOException {		
-		Path path = Paths.get(pathToLeafsFile);
+		BufferedWriter writer = null;
 		for (Set<Integer> individuals : mapLeaf2NodesNoOverlap.values()){
-			String line = "";
+			if (writer == null) writer = openToWrite(pathToLeafsFile);
+			boolean first = true;
 			for ( Integer ind: individuals){
-				line = line + ind + " ";
+				if (!first) writer.write(' ');
+				writer.write(ind.toString());
+				first = false;
 			}
-			line = line.substring(0,line.length()-1);
-			Files.write(path, Arrays.asList(line), StandardCharsets.UTF_8, Files.exists(path) ? StandardOpenOption.APPEND : StandardOpenOption.CREATE);
+			writer.newLine();
 		}
 		for (Integer ind : droppedIndividuals){
-			String line = ind +"";
-			Files.write(path, Arrays.asList(line), StandardCharsets.UTF_8, Files.exists(path) ? StandardOpenOption.APPEND : StandardOpenOption.CREATE);
+			if (writer == null) writer = openToWrite(pathToLeafsFile);
+			writer.write(ind.toString());
+			writer.newLine();
 		}
+		if (writer != null) writer.close();
 	}
 	
 	public void WriteLeafsWithOverlapAsCommunitiesToFile(String pathToLeafsFile) throws IOException {		
-		Path path = Paths.get(pathToLeafsFile);
+		BufferedWriter writer = null;
 		for (Set<Integer> individuals : mapLeaf2NodesWithOverlap.values()){
-			String line = "";
+			if (writer == null) writer = openToWrite(pathToLeafsFile);
+			boolean first = true;
 			for ( Integer ind: individuals){
-				line = line + ind + " ";
+				if (!first) writer.write(' ');
+				writer.write(ind.toString());
+				first = false;
 			}
-			line = line.substring(0,line.length()-1);
-			Files.write(path, Arrays.asList(line), StandardCharsets.UTF_8, Files.exists(path) ? StandardOpenOption.APPEND : StandardOpenOption.CREATE);
+			writer.newLine();
 		}		
+		if (writer != null) writer.close();
 	}
 }
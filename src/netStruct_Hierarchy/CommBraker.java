@@ -1,62 +1,190 @@
 package netStruct_Hierarchy;
+import java.io.File;
+import java.util.ArrayList;
 import java.util.LinkedList;
 import java.util.List;
+import java.util.concurrent.Callable;
+import java.util.concurrent.ExecutionException;
+import java.util.concurrent.ExecutorService;
+import java.util.concurrent.Executors;
+import java.util.concurrent.Future;
 
 public class CommBraker {
 
-	public static List<CommId> brakeRec(String pathToWorkingDir, List<CommId> commsInCurrentLevel, double minThresholdToUse, double stepSize, double maxThresholdToUse, int minSizeOfCommToBrake, String beta, String pathToLog,CommAnalyzer commAnalyzer, String pathToCommAnalysisFile, boolean dynamicChoose, boolean useModularityAsDefaultMetric, int maxLevels, int nectarVerboseLevel, boolean useWeighted) throws Exception{
-		
+	// The comms of a level share no data, so with @numOfThreads > 1 they are broken concurrently, on a pool of threads.
+	// Entries are numbered in the order of the comms before the tasks start, and the results are collected in that
+	// order, so the output does not depend on the amount of threads.
+	// When @checkpoint is not null, it is written after each level (see Checkpoint).
+	// When @splitCache is not null, the results of NECTAR are shared with the other runs using it (see SplitCache).
+	// Comms broken concurrently run NECTAR in a process of their own, with a max heap of @nectarHeapMb (see NectarProcess.heapMb).
+	public static List<CommId> brakeRec(String pathToWorkingDir, List<CommId> commsInCurrentLevel, double minThresholdToUse, double stepSize, double maxThresholdToUse, int minSizeOfCommToBrake, String beta, String pathToLog,CommAnalyzer commAnalyzer, String pathToCommAnalysisFile, boolean dynamicChoose, boolean useModularityAsDefaultMetric, int maxLevels, int nectarVerboseLevel, boolean useWeighted, boolean jumpThresholds, int numOfThreads, int nectarHeapMb, Checkpoint checkpoint, SplitCache splitCache) throws Exception{
+
 		List<CommId> ans = new LinkedList<CommId>();
 		if (commsInCurrentLevel.size() == 0 || maxLevels == 0)
-			return ans;	
+			return ans;
 		Common.writeToLog(pathToLog, "Level " + commsInCurrentLevel.get(0).level + " has " + commsInCurrentLevel.size() + " comms." +"\n", true);
-		
+
 		List<CommId> commsInNextLevel = new LinkedList<CommId>();
-		int entry  = 0;
-		for (CommId comm : commsInCurrentLevel){		
-			if (comm!=null){	
-				boolean shouldUseModularity = dynamicChoose ?  NectarIntegration.ShouldUseModularity(comm, useModularityAsDefaultMetric) : useModularityAsDefaultMetric;
-				if (shouldUseModularity){
-					comm.metricUsed = "Modularity";
+		long[] levelStart = Metrics.start();
+		List<CommId> commsToBrake = new ArrayList<CommId>();
+		for (CommId comm : commsInCurrentLevel){
+			if (comm!=null){
+				commsToBrake.add(comm);
+			}
+		}
+		List<List<CommId>> commsCreatedPerEntry = new ArrayList<List<CommId>>();
+		if (numOfThreads > 1 && commsToBrake.size() > 1){
+			ExecutorService pool = Executors.newFixedThreadPool(Math.min(numOfThreads, commsToBrake.size()));
+			int heapMb = NectarProcess.heapMb(nectarHeapMb, numOfThreads);
+			try{
+				List<Future<List<CommId>>> results = new ArrayList<Future<List<CommId>>>();
+				for (int entry = 0; entry < commsToBrake.size(); entry++){
+					results.add(pool.submit(new BrakeCommTask(pathToWorkingDir, commsToBrake.get(entry), entry, minThresholdToUse, stepSize, maxThresholdToUse, minSizeOfCommToBrake, beta, pathToLog, dynamicChoose, useModularityAsDefaultMetric, nectarVerboseLevel, useWeighted, jumpThresholds, splitCache, heapMb)));
 				}
-				else{
-					comm.metricUsed = "WOCC";
+				for (Future<List<CommId>> result : results){
+					try{
+						commsCreatedPerEntry.add(result.get());
+					} catch (ExecutionException e) {
+						if (e.getCause() instanceof Exception) throw (Exception)e.getCause();
+						throw e;
+					}
 				}
-				List<CommId> commsCreated =  brakeSingleComm(shouldUseModularity, pathToWorkingDir,comm, entry, minThresholdToUse, stepSize, maxThresholdToUse, minSizeOfCommToBrake, beta, nectarVerboseLevel, useWeighted);				
-				comm.childComms.addAll(commsCreated);
-				commsInNextLevel.addAll(commsCreated);
-				ans.addAll(commsCreated);
-				entry++;
+			}
+			finally{
+				pool.shutdownNow();
+			}
+		}
+		else{
+			for (int entry = 0; entry < commsToBrake.size(); entry++){
+				commsCreatedPerEntry.add(brakeComm(pathToWorkingDir, commsToBrake.get(entry), entry, minThresholdToUse, stepSize, maxThresholdToUse, minSizeOfCommToBrake, beta, pathToLog, dynamicChoose, useModularityAsDefaultMetric, nectarVerboseLevel, useWeighted, jumpThresholds, splitCache, null));
 			}
 		}
+		for (int entry = 0; entry < commsToBrake.size(); entry++){
+			List<CommId> commsCreated = commsCreatedPerEntry.get(entry);
+			commsToBrake.get(entry).childComms.addAll(commsCreated);
+			commsInNextLevel.addAll(commsCreated);
+			ans.addAll(commsCreated);
+		}
+		Metrics.record("level", levelStart, commsInCurrentLevel.size(), "comms", "\"level\": " + commsInCurrentLevel.get(0).level + ", \"threads\": " + numOfThreads);
 		// WAS commAnalyzer.WriteCommAnalysisToFile(commsInNextLevel, pathToCommAnalysisFile);
 		commAnalyzer.WriteCommAnalysisToFile(commsInCurrentLevel, pathToCommAnalysisFile);
+		if (checkpoint != null){
+			checkpoint.write(commsInNextLevel);
+		}
+		// The logs of a run which is killed are kept up to its last level.
+		Common.flushLogs();
+		Metrics.flush();
 		// Run on the next level
-		ans.addAll(brakeRec(pathToWorkingDir, commsInNextLevel, minThresholdToUse, stepSize, maxThresholdToUse, minSizeOfCommToBrake, beta, pathToLog,commAnalyzer, pathToCommAnalysisFile, dynamicChoose, useModularityAsDefaultMetric, maxLevels-1,nectarVerboseLevel,useWeighted));
+		ans.addAll(brakeRec(pathToWorkingDir, commsInNextLevel, minThresholdToUse, stepSize, maxThresholdToUse, minSizeOfCommToBrake, beta, pathToLog,commAnalyzer, pathToCommAnalysisFile, dynamicChoose, useModularityAsDefaultMetric, maxLevels-1,nectarVerboseLevel,useWeighted,jumpThresholds,numOfThreads,nectarHeapMb,checkpoint,splitCache));
 		return ans;
 	}
-	
+
+	// Brakes @comm.
+	// When running concurrently (with a @nectarProcess), NECTAR writes its outputs to a scratch directory of this entry,
+	// which is removed when done, and runs in the process, which is closed when done.
+	private static List<CommId> brakeComm(String pathToWorkingDir, CommId comm, int entry, double minThresholdToUse, double stepSize, double maxThresholdToUse, int minSizeOfCommToBrake, String beta, String pathToLog, boolean dynamicChoose, boolean useModularityAsDefaultMetric, int nectarVerboseLevel, boolean useWeighted, boolean jumpThresholds, SplitCache splitCache, NectarProcess nectarProcess) throws Exception {
+		if (nectarProcess == null){
+			return brakeCommWithMetric(pathToWorkingDir, comm, entry, minThresholdToUse, stepSize, maxThresholdToUse, minSizeOfCommToBrake, beta, pathToLog, dynamicChoose, useModularityAsDefaultMetric, nectarVerboseLevel, useWeighted, jumpThresholds, splitCache, null);
+		}
+		File scratchDir = new File(pathToWorkingDir + "Tmp_Le_" + (comm.level+1) + "_En_" + entry + "/");
+		scratchDir.mkdirs();
+		try{
+			return brakeCommWithMetric(scratchDir.getPath() + File.separator, comm, entry, minThresholdToUse, stepSize, maxThresholdToUse, minSizeOfCommToBrake, beta, pathToLog, dynamicChoose, useModularityAsDefaultMetric, nectarVerboseLevel, useWeighted, jumpThresholds, splitCache, nectarProcess);
+		}
+		finally{
+			nectarProcess.close();
+			File[] leftovers = scratchDir.listFiles();
+			if (leftovers != null){
+				for (File leftover : leftovers){
+					leftover.delete();
+				}
+			}
+			scratchDir.delete();
+		}
+	}
+
+	// Chooses the metric of @comm and brakes it.
+	private static List<CommId> brakeCommWithMetric(String pathToWorkingDir, CommId comm, int entry, double minThresholdToUse, double stepSize, double maxThresholdToUse, int minSizeOfCommToBrake, String beta, String pathToLog, boolean dynamicChoose, boolean useModularityAsDefaultMetric, int nectarVerboseLevel, boolean useWeighted, boolean jumpThresholds, SplitCache splitCache, NectarProcess nectarProcess) throws Exception {
+		boolean shouldUseModularity = dynamicChoose ?  NectarIntegration.ShouldUseModularity(comm, useModularityAsDefaultMetric, nectarProcess) : useModularityAsDefaultMetric;
+		if (shouldUseModularity){
+			comm.metricUsed = "Modularity";
+		}
+		else{
+			comm.metricUsed = "WOCC";
+		}
+		return brakeSingleComm(shouldUseModularity, pathToWorkingDir, comm, entry, minThresholdToUse, stepSize, maxThresholdToUse, minSizeOfCommToBrake, beta, nectarVerboseLevel, useWeighted, jumpThresholds, pathToLog, nectarProcess, splitCache);
+	}
+
+	private static class BrakeCommTask implements Callable<List<CommId>> {
+		private final String pathToWorkingDir;
+		private final CommId comm;
+		private final int entry;
+		private final double minThresholdToUse;
+		private final double stepSize;
+		private final double maxThresholdToUse;
+		private final int minSizeOfCommToBrake;
+		private final String beta;
+		private final String pathToLog;
+		private final boolean dynamicChoose;
+		private final boolean useModularityAsDefaultMetric;
+		private final int nectarVerboseLevel;
+		private final boolean useWeighted;
+		private final boolean jumpThresholds;
+		private final SplitCache splitCache;
+		private final int nectarHeapMb;
+
+		BrakeCommTask(String pathToWorkingDir, CommId comm, int entry, double minThresholdToUse, double stepSize, double maxThresholdToUse, int minSizeOfCommToBrake, String beta, String pathToLog, boolean dynamicChoose, boolean useModularityAsDefaultMetric, int nectarVerboseLevel, boolean useWeighted, boolean jumpThresholds, SplitCache splitCache, int nectarHeapMb){
+			this.pathToWorkingDir = pathToWorkingDir;
+			this.comm = comm;
+			this.entry = entry;
+			this.minThresholdToUse = minThresholdToUse;
+			this.stepSize = stepSize;
+			this.maxThresholdToUse = maxThresholdToUse;
+			this.minSizeOfCommToBrake = minSizeOfCommToBrake;
+			this.beta = beta;
+			this.pathToLog = pathToLog;
+			this.dynamicChoose = dynamicChoose;
+			this.useModularityAsDefaultMetric = useModularityAsDefaultMetric;
+			this.nectarVerboseLevel = nectarVerboseLevel;
+			this.useWeighted = useWeighted;
+			this.jumpThresholds = jumpThresholds;
+			this.splitCache = splitCache;
+			this.nectarHeapMb = nectarHeapMb;
+		}
+
+		public List<CommId> call() throws Exception {
+			return brakeComm(pathToWorkingDir, comm, entry, minThresholdToUse, stepSize, maxThresholdToUse, minSizeOfCommToBrake, beta, pathToLog, dynamicChoose, useModularityAsDefaultMetric, nectarVerboseLevel, useWeighted, jumpThresholds, splitCache, new NectarProcess(nectarHeapMb));
+		}
+	}
+
 	// takes the parentComm and brakes it to comms.
 	// Return a list of comms which are the output og the split.
-	private static List<CommId> brakeSingleComm(Boolean shouldUseModularity, String pathToWorkingDir, CommId parentComm, int entry, double minThresholdToUse, double stepSize, double maxThresholdToUse, int minSizeOfCommToBrake, String beta, int nectarVerboseLevel, boolean useWeighted) throws Exception {
+	private static List<CommId> brakeSingleComm(Boolean shouldUseModularity, String pathToWorkingDir, CommId parentComm, int entry, double minThresholdToUse, double stepSize, double maxThresholdToUse, int minSizeOfCommToBrake, String beta, int nectarVerboseLevel, boolean useWeighted, boolean jumpThresholds, String pathToLog, NectarProcess nectarProcess, SplitCache splitCache) throws Exception {
 		CommId commGenerated= NectarIntegration.findNextThreshold(
 				shouldUseModularity,
 				pathToWorkingDir,
 				parentComm,
 				entry,
 				minThresholdToUse,
-				stepSize, 
+				stepSize,
 				maxThresholdToUse,
 				minSizeOfCommToBrake,
 				beta,
 				nectarVerboseLevel,
-				useWeighted
+				useWeighted,
+				jumpThresholds,
+				pathToLog,
+				nectarProcess,
+				splitCache
 				);
 		List<CommId> CommsToBrake = new LinkedList<CommId>();
 		if (commGenerated != null){
-			int numOfLines = Common.numOfLinesInFile(commGenerated.commsFileName);
-			for (int line = 0 ; line < numOfLines ; line++){
-				CommsToBrake.add(new CommId(commGenerated.pathToWorkingDir, commGenerated.level, commGenerated.entry, line, commGenerated.th, commGenerated.parentComm));
+			// The comms file is read once, for all the comms of the entry.
+			List<int[]> nodesPerLine = TextConvertor.getAllSortedNodes(commGenerated.commsFileName);
+			for (int line = 0 ; line < nodesPerLine.size() ; line++){
+				CommId comm = new CommId(commGenerated.pathToWorkingDir, commGenerated.level, commGenerated.entry, line, commGenerated.th, commGenerated.parentComm);
+				comm.SetNodes(nodesPerLine.get(line));
+				CommsToBrake.add(comm);
 			}
 		}
 		return CommsToBrake;
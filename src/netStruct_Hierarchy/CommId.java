@@ -1,7 +1,9 @@
 package netStruct_Hierarchy;
 import java.io.IOException;
 import java.util.ArrayList;
+import java.util.Arrays;
 import java.util.HashMap;
+import java.util.LinkedHashSet;
 import java.util.List;
 import java.util.Map;
 import java.util.Map.Entry;
@@ -13,6 +15,8 @@ import java.text.*;
 // In each "entry" we have several comms - each in its own line - the id is the "line".
 // To generate the comm, a ceratin threshold was used. We store it in "th.
 // Each "entry" was derived from a ceratin comm - "parentComm" points to it.
+// The nodes of the comm are read from its line of the comms file once, and kept sorted in memory - the comms and
+// edges files are outputs, and are not read again.
 public class CommId {	
 	public String pathToWorkingDir;
 	public int level;
@@ -25,9 +29,14 @@ public class CommId {
 	public String edgesFileName;
 	public String commsFileName;
 	public Map<CommId, Double> leafs;
-	public String leafsVectorAsString;
+	// The share of each leaf (in the order of the sorted leafs of the tree) in the comm. Formatted only when written.
+	public double[] leafsVector;
 	public boolean leafPopulated = false;
 	private int size; 
+	// The nodes of the comm, sorted. null until first used (or set by SetNodes).
+	private int[] nodes;
+	// The amount of edges in the edges file of the comm's entry. -1 until first used.
+	private int numOfEdges;
 	
 	public CommId(String pathToWorkingDir, int level, int entry, int line, double th , CommId parentComm) throws IOException{		
 		this(pathToWorkingDir,level,entry,line);
@@ -50,11 +59,13 @@ public class CommId {
 		this.commsFileName = generateFileName("C");
 		this.leafs = new HashMap<CommId, Double>();
 		this.size=-1;
+		this.nodes = null;
+		this.numOfEdges = -1;
 	}
 	
 	public int Size() throws IOException{
 		if (size==-1){			
-			size = GetNodes().size();
+			size = GetNodesArray().length;
 		}
 		return size;
 	}
@@ -64,14 +75,46 @@ public class CommId {
 		return pathToWorkingDir + "Le_" + level + "_En_" + entry + "_PaLe_" + parentComm.level + "_PaEn_" + parentComm.entry + "_PaLi_" + parentComm.line + "_TH_" + String.format("%1$,.7f", th) + "_" + type + ".txt";
 	}
 	
+	// The nodes of the comm, sorted. Do not modify the returned array.
+	public synchronized int[] GetNodesArray() throws IOException{
+		if (nodes == null){
+			nodes = TextConvertor.getSortedNodes(commsFileName, line);
+		}
+		return nodes;
+	}
+	
+	// Sets the nodes of the comm, when they are already in memory (e.g. all the lines of a comms file were read at once).
+	// @sortedNodes must be sorted, without duplicates.
+	public synchronized void SetNodes(int[] sortedNodes){
+		nodes = sortedNodes;
+		size = sortedNodes.length;
+	}
+	
 	public Set<Integer> GetNodes() throws IOException{
-		return TextConvertor.getListOfNodes(commsFileName, line);
+		int[] sortedNodes = GetNodesArray();
+		Set<Integer> ans = new LinkedHashSet<Integer>(sortedNodes.length * 2);
+		for (int node : sortedNodes){
+			ans.add(node);
+		}
+		return ans;
+	}
+	
+	public boolean Contains(int node) throws IOException{
+		return Arrays.binarySearch(GetNodesArray(), node) >= 0;
 	}
 	
 	public Set<Edge> GetEdges() throws IOException{
 		return TextConvertor.getListOfEdges(edgesFileName);
 	}
 	
+	// The amount of edges in the edges file of the comm's entry (as GetEdges().size(), without keeping the edges).
+	public synchronized int NumOfEdges() throws IOException{
+		if (numOfEdges == -1){
+			numOfEdges = Common.numOfLinesInFile(edgesFileName);
+		}
+		return numOfEdges;
+	}
+	
 
 	public void PopulateLeafMap(int minSizeOfCommToOutput, boolean useLeafSizesForStructure, boolean useProportionalTreeSplitForStructure) throws IOException{		
 		if (useLeafSizesForStructure) PopulateLeafMapByLeafSize(minSizeOfCommToOutput);
@@ -86,7 +129,7 @@ public class CommId {
 		leafPopulated = true;
 		if (IsLeaf(minSizeOfCommToOutput)) {
 			if(Size() >= minSizeOfCommToOutput){
-				leafs.put(this, (double)(GetNodes().size()));	
+				leafs.put(this, (double)(Size()));	
 			}
 		}
 		else{
@@ -179,26 +222,45 @@ public class CommId {
         return result;
     }
 
-	public void SetLeafsVectorAsString(List<CommId> sortedAllLeafs) {
-		leafsVectorAsString = "";
-		Double[] v = new Double[sortedAllLeafs.size()];
+	public void SetLeafsVector(List<CommId> sortedAllLeafs) {
+		leafsVector = new double[sortedAllLeafs.size()];
 		int index = 0;
 		double sum = 0;
 		for (CommId comm : sortedAllLeafs){
 			Double val = leafs.get(comm);
-			v[index] = (val ==null ? 0.0 : val);
+			leafsVector[index] = (val ==null ? 0.0 : val);
 			index++;
 			sum = sum + (val ==null ? 0.0 : val);
 		}		
-		
-		for(int a = 0; a < v.length; a++) {
-			leafsVectorAsString = leafsVectorAsString + ((double)v[a] / (double)sum) + ',';
+		for(int a = 0; a < leafsVector.length; a++) {
+			leafsVector[a] = leafsVector[a] / sum;
 		}
-		if(leafsVectorAsString.length()>0){
-			leafsVectorAsString =  leafsVectorAsString.substring(0,leafsVectorAsString.length()-1);
+	}
+
+	// Writes the leafs vector to @out - comma separated, or when @sparse, as the amount of leafs followed by
+	// <leaf index>:<value> of the non zero values only (space separated).
+	public void WriteLeafsVector(Appendable out, boolean sparse) throws IOException {
+		if (sparse){
+			out.append(String.valueOf(leafsVector.length));
+			for(int a = 0; a < leafsVector.length; a++) {
+				if (leafsVector[a] != 0.0){
+					out.append(' ').append(String.valueOf(a)).append(':').append(String.valueOf(leafsVector[a]));
+				}
+			}
+			return;
+		}
+		for(int a = 0; a < leafsVector.length; a++) {
+			if (a > 0) out.append(',');
+			out.append(String.valueOf(leafsVector[a]));
 		}
 	}
 
+	public String LeafsVectorAsString() throws IOException {
+		StringBuilder ans = new StringBuilder(leafsVector.length * 8);
+		WriteLeafsVector(ans, false);
+		return ans.toString();
+	}
+
 	public void resetLeafMap() {
 		leafPopulated=false;
 		this.leafs = new HashMap<CommId, Double>();
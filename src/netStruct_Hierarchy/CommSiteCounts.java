@@ -0,0 +1,111 @@
+package netStruct_Hierarchy;
+import java.io.IOException;
+import java.util.ArrayList;
+import java.util.Collection;
+import java.util.HashMap;
+import java.util.InputMismatchException;
+import java.util.List;
+import java.util.Map;
+
+// The amount of nodes from each sample site in each comm - a dense matrix with a row per comm and a column per
+// sample site (by the ids given to the sample sites by CommAnalyzer), filled in a single pass over the nodes of the comms.
+public class CommSiteCounts {
+	public final int numOfSites;
+	private final List<CommId> comms;
+	private final Map<CommId, Integer> rows;
+	// counts[row * numOfSites + site]
+	private final int[] counts;
+	private final int[] sizes;
+
+	private CommSiteCounts(int numOfSites, List<CommId> comms, Map<CommId, Integer> rows, int[] counts, int[] sizes){
+		this.numOfSites = numOfSites;
+		this.comms = comms;
+		this.rows = rows;
+		this.counts = counts;
+		this.sizes = sizes;
+	}
+
+	// Counts the nodes of each of @comms by their sample site - @sampleSiteOfNode[node] is the id of the sample site of
+	// the node (-1 for nodes without one).
+	public static CommSiteCounts count(Collection<CommId> comms, int[] sampleSiteOfNode, int numOfSites) throws IOException{
+		List<CommId> uniqueComms = new ArrayList<CommId>(comms.size());
+		Map<CommId, Integer> rows = new HashMap<CommId, Integer>(comms.size() * 2);
+		for (CommId comm : comms){
+			if (!rows.containsKey(comm)){
+				rows.put(comm, uniqueComms.size());
+				uniqueComms.add(comm);
+			}
+		}
+		int[] counts = new int[uniqueComms.size() * numOfSites];
+		int[] sizes = new int[uniqueComms.size()];
+		for (int row = 0; row < uniqueComms.size(); row++){
+			CommId comm = uniqueComms.get(row);
+			int offset = row * numOfSites;
+			for (int node : comm.GetNodesArray()){
+				int site = node < sampleSiteOfNode.length ? sampleSiteOfNode[node] : -1;
+				if (site == -1){
+					throw new InputMismatchException("Node " + node + " of comm " + comm + " has no sample site.");
+				}
+				counts[offset + site]++;
+			}
+			sizes[row] = comm.GetNodesArray().length;
+		}
+		return new CommSiteCounts(numOfSites, uniqueComms, rows, counts, sizes);
+	}
+
+	// The comms counted, in the order they were given.
+	public List<CommId> comms(){
+		return comms;
+	}
+
+	public boolean contains(CommId comm){
+		return rows.containsKey(comm);
+	}
+
+	public int count(CommId comm, int site){
+		return counts[row(comm) * numOfSites + site];
+	}
+
+	// The amount of nodes in the comm (the sum of its row).
+	public int size(CommId comm){
+		return sizes[row(comm)];
+	}
+
+	// The row of the comm, as needed by the chi-square test.
+	public long[] countsOf(CommId comm){
+		int offset = row(comm) * numOfSites;
+		long[] ans = new long[numOfSites];
+		for (int site = 0; site < numOfSites; site++){
+			ans[site] = counts[offset + site];
+		}
+		return ans;
+	}
+
+	// The rows of @commsToKeep only (all must be counted here), without counting again.
+	public CommSiteCounts subset(Collection<CommId> commsToKeep){
+		List<CommId> subsetComms = new ArrayList<CommId>(commsToKeep.size());
+		Map<CommId, Integer> subsetRows = new HashMap<CommId, Integer>(commsToKeep.size() * 2);
+		for (CommId comm : commsToKeep){
+			if (!subsetRows.containsKey(comm)){
+				subsetRows.put(comm, subsetComms.size());
+				subsetComms.add(comm);
+			}
+		}
+		int[] subsetCounts = new int[subsetComms.size() * numOfSites];
+		int[] subsetSizes = new int[subsetComms.size()];
+		for (int subsetRow = 0; subsetRow < subsetComms.size(); subsetRow++){
+			int row = row(subsetComms.get(subsetRow));
+			System.arraycopy(counts, row * numOfSites, subsetCounts, subsetRow * numOfSites, numOfSites);
+			subsetSizes[subsetRow] = sizes[row];
+		}
+		return new CommSiteCounts(numOfSites, subsetComms, subsetRows, subsetCounts, subsetSizes);
+	}
+
+	private int row(CommId comm){
+		Integer row = rows.get(comm);
+		if (row == null){
+			throw new IllegalArgumentException("Comm " + comm + " was not counted.");
+		}
+		return row;
+	}
+}
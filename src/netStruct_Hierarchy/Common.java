@@ -1,15 +1,16 @@
 package netStruct_Hierarchy;
 import java.io.BufferedReader;
+import java.io.BufferedWriter;
 import java.io.File;
 import java.io.FileReader;
 import java.io.FileWriter;
 import java.io.IOException;
 import java.nio.charset.StandardCharsets;
 import java.nio.file.Files;
-import java.nio.file.Path;
 import java.nio.file.Paths;
 import java.nio.file.StandardOpenOption;
-import java.util.Arrays;
+import java.util.HashMap;
+import java.util.Map;
 import java.util.Date;
 import java.text.SimpleDateFormat;
 public class Common {
@@ -39,16 +40,55 @@ public class Common {
         return dateFormatter.format(now);	
 	}
 	
+	// Logs are kept open and buffered. They are flushed by flushLogs (after each level of the tree, and when the JVM
+	// exits), and a run closes its log with closeLog when it is done.
+	private static Map<String, BufferedWriter> logWriters = new HashMap<String, BufferedWriter>();
+	static {
+		Runtime.getRuntime().addShutdownHook(new Thread(){
+			public void run(){
+				try {
+					flushLogs();
+				} catch (IOException e) {
+					System.out.println("Failed to flush logs: " + e.getMessage());
+				}
+			}
+		});
+	}
+	
 	public static void writeToLog(String pathToLog, String msg, boolean debug) throws IOException{
 		String msgWithTime  = getDate() + ": " + msg;
 	    System.out.println(msgWithTime);
-	    if (!debug){   
-			Path path = Paths.get(pathToLog);
-		    Files.write(path, Arrays.asList(msgWithTime), StandardCharsets.UTF_8,
-		        Files.exists(path) ? StandardOpenOption.APPEND : StandardOpenOption.CREATE);
+	    if (!debug){
+	    	synchronized (logWriters){
+	    		BufferedWriter writer = logWriters.get(pathToLog);
+	    		if (writer == null){
+	    			writer = Files.newBufferedWriter(Paths.get(pathToLog), StandardCharsets.UTF_8, StandardOpenOption.CREATE, StandardOpenOption.APPEND);
+	    			logWriters.put(pathToLog, writer);
+	    		}
+	    		writer.write(msgWithTime);
+	    		writer.newLine();
+	    	}
 	    }
 	}
 	
+	public static void flushLogs() throws IOException{
+		synchronized (logWriters){
+			for (BufferedWriter writer : logWriters.values()){
+				writer.flush();
+			}
+		}
+	}
+	
+	// Flushes and closes the log in @pathToLog (if it is open). A later message to it opens it again.
+	public static void closeLog(String pathToLog) throws IOException{
+		synchronized (logWriters){
+			BufferedWriter writer = logWriters.remove(pathToLog);
+			if (writer != null){
+				writer.close();
+			}
+		}
+	}
+	
 	public static void renameFile(String pathToFile) throws Exception {
 		String newName = pathToFile + "renamed.txt";
 		// Note that as we add "renamed.txt" each time we fail, we will have no more than 21 attempts
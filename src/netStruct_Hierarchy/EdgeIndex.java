@@ -0,0 +1,152 @@
+package netStruct_Hierarchy;
+import java.io.BufferedReader;
+import java.io.FileReader;
+import java.io.IOException;
+import java.io.PrintWriter;
+import java.util.Arrays;
+import java.util.BitSet;
+
+// The edges of a single community - the edges of an edges file with both nodes in the community - kept in memory
+// in primitive arrays sorted by weight (edges of equal weight keep the order of the file).
+// The edges with weight >= th are a suffix of the arrays, so no file is read to filter them by a threshold.
+public class EdgeIndex {
+	public final int size;
+	public final int[] from;
+	public final int[] to;
+	public final double[] weight;
+	// The nodes of the community, sorted.
+	public final int[] nodes;
+
+	private EdgeIndex(int size, int[] from, int[] to, double[] weight, int[] nodes){
+		this.size = size;
+		this.from = from;
+		this.to = to;
+		this.weight = weight;
+		this.nodes = nodes;
+	}
+
+	// Reads the edges of @pathToEdges (as written by TextConvertor) between the given @sortedNodes
+	// (sorted, without duplicates - as CommId.GetNodesArray()).
+	public static EdgeIndex build(int[] sortedNodes, String pathToEdges) throws IOException{
+		BitSet inComm = new BitSet();
+		for (int node : sortedNodes){
+			inComm.set(node);
+		}
+		int size = 0;
+		int[] from = new int[1024];
+		int[] to = new int[1024];
+		double[] weight = new double[1024];
+		BufferedReader reader = new BufferedReader(new FileReader(pathToEdges));
+		String line;
+		while ((line = reader.readLine()) != null){
+			String[] parts = line.split("\t");
+			int nodeFrom = Integer.parseInt(parts[0]);
+			int nodeTo = Integer.parseInt(parts[1]);
+			if (!inComm.get(nodeFrom) || !inComm.get(nodeTo)) continue;
+			if (size == from.length){
+				from = Arrays.copyOf(from, size*2);
+				to = Arrays.copyOf(to, size*2);
+				weight = Arrays.copyOf(weight, size*2);
+			}
+			from[size] = nodeFrom;
+			to[size] = nodeTo;
+			weight[size] = Double.parseDouble(parts[2]);
+			size++;
+		}
+		reader.close();
+
+		int[] order = new int[size];
+		for (int i = 0; i < size; i++){
+			order[i] = i;
+		}
+		sortByWeight(order, new int[size], weight, 0, size);
+		int[] sortedFrom = new int[size];
+		int[] sortedTo = new int[size];
+		double[] sortedWeight = new double[size];
+		for (int i = 0; i < size; i++){
+			sortedFrom[i] = from[order[i]];
+			sortedTo[i] = to[order[i]];
+			sortedWeight[i] = weight[order[i]];
+		}
+		return new EdgeIndex(size, sortedFrom, sortedTo, sortedWeight, sortedNodes.clone());
+	}
+
+	// The amount of connected components (isolated nodes included) of the community's graph with edges [i, size),
+	// for every i in [0, size]. Edges are added from the heaviest down, to a union-find of the nodes.
+	public int[] componentsOfSuffixes(){
+		int[] components = new int[size + 1];
+		int[] parent = new int[nodes.length];
+		for (int i = 0; i < parent.length; i++){
+			parent[i] = i;
+		}
+		int numOfComponents = nodes.length;
+		components[size] = numOfComponents;
+		for (int i = size - 1; i >= 0; i--){
+			int rootFrom = findRoot(parent, Arrays.binarySearch(nodes, from[i]));
+			int rootTo = findRoot(parent, Arrays.binarySearch(nodes, to[i]));
+			if (rootFrom != rootTo){
+				parent[rootFrom] = rootTo;
+				numOfComponents--;
+			}
+			components[i] = numOfComponents;
+		}
+		return components;
+	}
+
+	private static int findRoot(int[] parent, int node){
+		while (parent[node] != node){
+			// path halving
+			parent[node] = parent[parent[node]];
+			node = parent[node];
+		}
+		return node;
+	}
+
+	// Index of the first edge with weight >= @th (size if there is none).
+	public int firstAtLeast(double th){
+		int low = 0;
+		int high = size;
+		while (low < high){
+			int mid = (low + high) >>> 1;
+			if (weight[mid] >= th) high = mid;
+			else low = mid + 1;
+		}
+		return low;
+	}
+
+	public int numOfEdgesAtLeast(double th){
+		return size - firstAtLeast(th);
+	}
+
+	// Writes the edges with weight >= @th, in the format of TextConvertor, to @pathToEdges.
+	// Returns the amount of edges written.
+	public int writeEdgesAtLeast(double th, String pathToEdges) throws IOException{
+		int first = firstAtLeast(th);
+		PrintWriter writer = new PrintWriter(pathToEdges, "UTF-8");
+		for (int i = first; i < size; i++){
+			writer.println(from[i] + "\t" + to[i] + "\t" + weight[i]);
+		}
+		writer.close();
+		return size - first;
+	}
+
+	// A stable merge sort of the edge indices in @order[start, end) by weight.
+	private static void sortByWeight(int[] order, int[] buffer, double[] weight, int start, int end){
+		if (end - start < 2) return;
+		int mid = (start + end) >>> 1;
+		sortByWeight(order, buffer, weight, start, mid);
+		sortByWeight(order, buffer, weight, mid, end);
+		if (weight[order[mid - 1]] <= weight[order[mid]]) return;
+		System.arraycopy(order, start, buffer, start, end - start);
+		int left = start;
+		int right = mid;
+		for (int i = start; i < end; i++){
+			if (right >= end || (left < mid && weight[buffer[left]] <= weight[buffer[right]])){
+				order[i] = buffer[left++];
+			}
+			else{
+				order[i] = buffer[right++];
+			}
+		}
+	}
+}
@@ -1,9 +1,7 @@
 package netStruct_Hierarchy;
 import java.util.ArrayList;
 import java.util.Collection;
-import java.util.HashMap;
 import java.util.List;
-import java.util.Map;
 
 import org.apache.commons.math3.stat.inference.ChiSquareTest;
 
@@ -13,8 +11,9 @@ public class MergeComms {
 	// Each community looks at its children. 
 	// If (according to ChiSquare test) a child is similar to the parent, he is removed.
 	// The child's children become the parent's children.
-	public static Map<CommId,Map<String,Integer>> MergeCommsByPVal(CommId root, Map<CommId,Map<String,Integer>> mapCommToMapCodeToCount, double pVal) {
-		Map<CommId,Map<String,Integer>> ans = new HashMap<CommId, Map<String,Integer>>();
+	// Returns the counts of the comms left in the tree.
+	public static CommSiteCounts MergeCommsByPVal(CommId root, CommSiteCounts counts, double pVal) {
+		List<CommId> ans = new ArrayList<CommId>();
 		List<CommId> commsToInspectCurrentLevel = new ArrayList<CommId>();
 		List<CommId> commsToInspectNextLevel = new ArrayList<CommId>();
 		commsToInspectNextLevel.add(root);
@@ -23,20 +22,20 @@ public class MergeComms {
 			commsToInspectCurrentLevel.addAll(commsToInspectNextLevel);
 			// We are done with these.
 			for(CommId comm : commsToInspectCurrentLevel){
-				ans.put(comm, mapCommToMapCodeToCount.get(comm));
+				ans.add(comm);
 			}
 			commsToInspectNextLevel =  new ArrayList<CommId>();
 			for(CommId commToInspect: commsToInspectCurrentLevel){
-				commsToInspectNextLevel.addAll(MergeChildrensOfComm(commToInspect, mapCommToMapCodeToCount, pVal));
+				commsToInspectNextLevel.addAll(MergeChildrensOfComm(commToInspect, counts, pVal));
 			}
 		}
 		
-		return ans;
+		return counts.subset(ans);
 		
 		}
 	
 		private static Collection<? extends CommId> MergeChildrensOfComm(CommId commToInspect,
-			Map<CommId, Map<String, Integer>> mapCommToMapCodeToCount, double pVal) {
+			CommSiteCounts counts, double pVal) {
 			
 			List<CommId> ans = new ArrayList<>();			
 			List<CommId> newChildComms = commToInspect.childComms;
@@ -46,7 +45,7 @@ public class MergeComms {
 				childsToScan.addAll(newChildComms);
 				newChildComms = new ArrayList<CommId>();
 				for (CommId child : childsToScan)
-					if (ShouldMergeComms(commToInspect,child, mapCommToMapCodeToCount,pVal)){
+					if (ShouldMergeComms(commToInspect,child, counts,pVal)){
 						// Remove child from parent
 						commToInspect.childComms.remove(child);
 						// Make the child's kids point to parent
@@ -70,12 +69,10 @@ public class MergeComms {
 
 
 	private static boolean ShouldMergeComms(CommId commToInspect, CommId child,
-				Map<CommId, Map<String, Integer>> mapCommToMapCodeToCount, double pVal) {		
+				CommSiteCounts counts, double pVal) {		
 		
-		Map<String, Integer> parentMapCodeToCount = mapCommToMapCodeToCount.get(commToInspect);
-			long[] parentCounts = getCountsFromMap(parentMapCodeToCount);
-			Map<String, Integer> childMapCodeToCount = mapCommToMapCodeToCount.get(child);
-			long[] childCounts = getCountsFromMap(childMapCodeToCount);
+			long[] parentCounts = counts.countsOf(commToInspect);
+			long[] childCounts = counts.countsOf(child);
 			return calcPVal(parentCounts,childCounts) > pVal;
 		}
 
@@ -89,25 +86,6 @@ public class MergeComms {
 		return d;
 	}*/
 
-	private static long[] getCountsFromMap(Map<String, Integer> mapCodeToCount) {
-		long[] ans = new long[CommAnalyzer.amountOfSampleSites];		
-		String[][] codes = CommAnalyzer.samplesSites;
-		int counter = -1;
-		for (String[] area : codes){
-			for (String code : area){
-				counter++;
-				Integer count = mapCodeToCount.get(code);
-				if(count == null){
-					ans[counter] = 0;
-				}
-				else{
-					ans[counter] = count;
-				}
-			}
-		}
-		return ans;
-	}
-
 	public static double calcPVal(long[] parentCounts, long[] childCounts){
 	// Only keep entries in the expected that have value larger than 0.
 	List<Integer> nonZeroIndexs = new ArrayList<>();
@@ -0,0 +1,111 @@
+package netStruct_Hierarchy;
+import java.io.BufferedWriter;
+import java.io.FileWriter;
+import java.io.IOException;
+import java.lang.management.ManagementFactory;
+import java.lang.management.MemoryPoolMXBean;
+import java.lang.management.MemoryType;
+import java.lang.management.ThreadMXBean;
+import java.util.LinkedHashMap;
+import java.util.Map;
+import java.util.Map.Entry;
+
+// Records the wall time, cpu time, peak heap and rate of the phases of a run (matrix ingestion, threshold iterations,
+// NECTAR runs, structure output...).
+// Each phase is written as a json line to the (buffered) metrics file, and summed per phase for the summary
+// written at the end of the run. Nothing is recorded before init is called.
+// Usage:
+//		long[] start = Metrics.start();
+//		... the phase ...
+//		Metrics.record("phase", start, items, "unit", "\"extra\": 1");
+public class Metrics {
+	private static final ThreadMXBean threadMXBean = ManagementFactory.getThreadMXBean();
+	private static BufferedWriter writer = null;
+	// phase -> {count, nanoseconds, cpu nanoseconds, items}
+	private static Map<String, long[]> totals = new LinkedHashMap<String, long[]>();
+	private static Map<String, String> units = new LinkedHashMap<String, String>();
+
+	public static synchronized void init(String pathToMetrics) throws IOException{
+		close();
+		writer = new BufferedWriter(new FileWriter(pathToMetrics, true));
+		totals.clear();
+		units.clear();
+	}
+
+	// The start times of a phase - wall clock and cpu of the current thread, in nanoseconds.
+	public static long[] start(){
+		return new long[]{System.nanoTime(), cpuTime()};
+	}
+
+	// Records a phase which started at @start, handling @items items (of @unit).
+	// @details are extra json fields (e.g. "\"th\": 0.1"), or "".
+	public static synchronized void record(String phase, long[] start, long items, String unit, String details) throws IOException{
+		if (writer == null) return;
+		long nanos = System.nanoTime() - start[0];
+		long cpuNanos = cpuTime() - start[1];
+		long[] total = totals.get(phase);
+		if (total == null){
+			total = new long[4];
+			totals.put(phase, total);
+			units.put(phase, unit);
+		}
+		total[0]++;
+		total[1] += nanos;
+		total[2] += cpuNanos;
+		total[3] += items;
+		double seconds = nanos / 1e9;
+		writer.write("{\"phase\": \"" + phase + "\", \"seconds\": " + seconds + ", \"cpuSeconds\": " + cpuNanos / 1e9
+				+ ", \"peakHeapBytes\": " + peakHeapBytes() + ", \"items\": " + items + ", \"unit\": \"" + unit
+				+ "\", \"rate\": " + items / Math.max(seconds, 1e-9) + (details.isEmpty() ? "" : ", " + details) + "}");
+		writer.newLine();
+	}
+
+	// Writes a line per phase - amount of times it ran, total wall and cpu time and rate - to the log,
+	// and a summary json line to the metrics file.
+	public static synchronized void writeSummary(String pathToLog, boolean debug) throws IOException{
+		if (writer == null) return;
+		Common.writeToLog(pathToLog, "Metrics summary (phase: runs, seconds, cpu seconds, items, rate):", debug);
+		StringBuilder summary = new StringBuilder("{\"phase\": \"summary\", \"peakHeapBytes\": " + peakHeapBytes());
+		for (Entry<String, long[]> entry : totals.entrySet()){
+			long[] total = entry.getValue();
+			double seconds = total[1] / 1e9;
+			String unit = units.get(entry.getKey());
+			double rate = total[3] / Math.max(seconds, 1e-9);
+			Common.writeToLog(pathToLog, "\t" + entry.getKey() + ": " + total[0] + ", " + seconds + ", " + total[2] / 1e9 + ", "
+					+ total[3] + " " + unit + ", " + rate + " " + unit + "/s", debug);
+			summary.append(", \"" + entry.getKey() + "\": {\"runs\": " + total[0] + ", \"seconds\": " + seconds
+					+ ", \"cpuSeconds\": " + total[2] / 1e9 + ", \"items\": " + total[3] + ", \"rate\": " + rate + "}");
+		}
+		writer.write(summary.append("}").toString());
+		writer.newLine();
+		writer.flush();
+	}
+
+	public static synchronized void flush() throws IOException{
+		if (writer != null){
+			writer.flush();
+		}
+	}
+
+	public static synchronized void close() throws IOException{
+		if (writer != null){
+			writer.close();
+			writer = null;
+		}
+	}
+
+	private static long cpuTime(){
+		return threadMXBean.isCurrentThreadCpuTimeSupported() ? threadMXBean.getCurrentThreadCpuTime() : 0;
+	}
+
+	// Sum of the peak usage of the heap pools, since the start of the run.
+	private static long peakHeapBytes(){
+		long peak = 0;
+		for (MemoryPoolMXBean pool : ManagementFactory.getMemoryPoolMXBeans()){
+			if (pool.getType() == MemoryType.HEAP){
+				peak += pool.getPeakUsage().getUsed();
+			}
+		}
+		return peak;
+	}
+}
@@ -3,8 +3,11 @@ import java.io.BufferedReader;
 import java.io.File;
 import java.io.FileReader;
 import java.io.IOException;
-import java.io.PrintWriter;
-import java.util.Set;
+import java.nio.charset.StandardCharsets;
+import java.nio.file.Files;
+import java.nio.file.Paths;
+import java.util.ArrayList;
+import java.util.List;
 
 public class NectarIntegration {	
 	// Input:
@@ -15,6 +18,13 @@ public class NectarIntegration {
 	// By-product: files for next step-
 	// 1. list of edges with weight above the used threshold
 	// 2. nectar output. 
+	// The edges of the parent comm are read once, to an EdgeIndex. An edges file is written only to run NECTAR on it.
+	// With @jumpThresholds, thresholds of the grid which keep the same edges as the last threshold NECTAR did not split
+	// are skipped - the graph only changes at the weights of its edges, so NECTAR would not split them either.
+	// The first splitting threshold of the grid is the same in both modes.
+	// With a @splitCache (in a sweep), NECTAR is not run on a threshold it was already run on for the same nodes - its
+	// output is taken from the cache.
+	// With a @nectarProcess (when comms are broken concurrently), NECTAR runs in it rather than in this JVM.
 	public static CommId findNextThreshold(
 			Boolean shouldUseModularity,
 			String pathToWorkingDir,
@@ -26,17 +36,66 @@ public class NectarIntegration {
 			int minSizeOfCommToBrake,
 			String betas,
 			int nectarVerboseLevel,
-			boolean useWeighted
+			boolean useWeighted,
+			boolean jumpThresholds,
+			String pathToLog,
+			NectarProcess nectarProcess,
+			SplitCache splitCache
 			) throws Exception{		
 		double th = -1;
+		if (Math.max(minThresholdToUse,parentComm.th + stepSize) > maxThresholdToUse){
+			return null;
+		}
+		int[] nodes = parentComm.GetNodesArray();
+		// Not enough nodes in comm.
+		if (nodes.length < minSizeOfCommToBrake){
+			return null;
+		}
+		long[] indexStart = Metrics.start();
+		EdgeIndex edgeIndex = EdgeIndex.build(nodes, parentComm.edgesFileName);
+		Metrics.record("edgeIndex", indexStart, edgeIndex.size, "edges", "\"level\": " + (parentComm.level+1) + ", \"entry\": " + entry);
+		int[] components = jumpThresholds ? edgeIndex.componentsOfSuffixes() : null;
+		int lastFirstEdge = -1;
+		int numOfThresholds = 0;
+		int skippedNectarRuns = 0;
+		int reusedSplits = 0;
 		for (th = Math.max(minThresholdToUse,parentComm.th + stepSize) ; th <= maxThresholdToUse ; th = th + stepSize){
+			numOfThresholds++;
+			long[] iterationStart = Metrics.start();
+			String iterationDetails = "\"level\": " + (parentComm.level+1) + ", \"entry\": " + entry + ", \"th\": " + th;
+			if (jumpThresholds){
+				int firstEdge = edgeIndex.firstAtLeast(th);
+				// Same edges as in the last run of NECTAR, which did not split them.
+				if (firstEdge == lastFirstEdge){
+					skippedNectarRuns++;
+					continue;
+				}
+				lastFirstEdge = firstEdge;
+				iterationDetails = iterationDetails + ", \"edges\": " + (edgeIndex.size - firstEdge) + ", \"components\": " + components[firstEdge];
+			}
 			CommId newComms = new CommId(parentComm.pathToWorkingDir, parentComm.level+1, entry, -1, th,parentComm);
-			String pathToEdgesForNectar = createFileForNectarWeighted(th, newComms, pathToWorkingDir, minSizeOfCommToBrake);
-			// Not enough nodes in comm.
-			if (pathToEdgesForNectar == null){				
-				return null;
-			}			
-			runNectar(pathToEdgesForNectar, pathToWorkingDir, betas, shouldUseModularity, nectarVerboseLevel, useWeighted); //TODO params
+			SplitCache.Key splitKey = null;
+			if (splitCache != null){
+				splitKey = SplitCache.key(nodes, edgeIndex.numOfEdgesAtLeast(th), shouldUseModularity, betas, useWeighted);
+				List<String> cachedSplit = splitCache.get(splitKey);
+				if (cachedSplit != null){
+					reusedSplits++;
+					if (cachedSplit.isEmpty()){
+						Metrics.record("thresholdIteration", iterationStart, 1, "iterations", iterationDetails + ", \"split\": false, \"cached\": true");
+						continue;
+					}
+					// The edges file is kept for the comms of the split, as when NECTAR is run.
+					createFileForNectarWeighted(th, newComms, edgeIndex);
+					Files.write(Paths.get(newComms.commsFileName), cachedSplit, StandardCharsets.UTF_8);
+					Metrics.record("thresholdIteration", iterationStart, 1, "iterations", iterationDetails + ", \"split\": true, \"cached\": true");
+					logThresholdSearch(pathToLog, parentComm, entry, th, numOfThresholds, skippedNectarRuns, reusedSplits, true, jumpThresholds, true);
+					return newComms;
+				}
+			}
+			String pathToEdgesForNectar = createFileForNectarWeighted(th, newComms, edgeIndex);
+			long[] nectarStart = Metrics.start();
+			runNectar(pathToEdgesForNectar, pathToWorkingDir, betas, shouldUseModularity, nectarVerboseLevel, useWeighted, nectarProcess); //TODO params
+			Metrics.record("nectarRun", nectarStart, 1, "runs", iterationDetails);
 			String[] betasArray = betas.split(",");
 			File[] nectarOutputs = new File[betasArray.length];
 			int counter = 0;
@@ -49,6 +108,9 @@ public class NectarIntegration {
 				//TODO - if output has NO communities -we can stop looking!
 				if (fileHasMoreThanNLines(nectarOutput, 1)){ 
 					deleteFilesWithException(nectarOutputs,nectarOutput);
+					if (splitCache != null){
+						splitCache.put(splitKey, Files.readAllLines(nectarOutput.toPath(), StandardCharsets.UTF_8));
+					}
 					String pathToOutputComms = newComms.commsFileName;
 					if(!nectarOutput.renameTo(new File(pathToOutputComms))){
 						System.out.println("Failed to rename NECTAR output to: " + pathToOutputComms 
@@ -59,18 +121,38 @@ public class NectarIntegration {
 							throw new IOException("Failed to rename NECTAR output to: " + pathToOutputComms);
 						}
 					}
+					Metrics.record("thresholdIteration", iterationStart, 1, "iterations", iterationDetails + ", \"split\": true");
+					logThresholdSearch(pathToLog, parentComm, entry, th, numOfThresholds, skippedNectarRuns, reusedSplits, false, jumpThresholds, splitCache != null);
 					return newComms;
 				}
 				deleteFilesWithException(nectarOutputs,null);
 				(new File(pathToEdgesForNectar)).delete();
 			}	
+			if (splitCache != null){
+				splitCache.put(splitKey, new ArrayList<String>());
+			}
+			Metrics.record("thresholdIteration", iterationStart, 1, "iterations", iterationDetails + ", \"split\": false");
 		}
+		logThresholdSearch(pathToLog, parentComm, entry, -1, numOfThresholds, skippedNectarRuns, reusedSplits, false, jumpThresholds, splitCache != null);
 		// When there is no option to brake the community - return null
 		return null; 
 		
 	}
 
-	private static void runNectar(String pathToFileForNecter, String pathToWorkingDir, String betas, Boolean shouldUseModularity, int nectarVerboseLevel, boolean useWeighted) throws Exception {
+	// Logs the thresholds tried for a comm, the NECTAR runs skipped and the ones reused from the split cache
+	// (@th is -1 when the comm was not split).
+	private static void logThresholdSearch(String pathToLog, CommId parentComm, int entry, double th, int numOfThresholds, int skippedNectarRuns, int reusedSplits, boolean splitFromCache, boolean jumpThresholds, boolean usesSplitCache) throws Exception {
+		if (!jumpThresholds && !usesSplitCache) return;
+		String msg = "Level " + (parentComm.level+1) + " entry " + entry + ": " + (th == -1 ? "no split" : "split at " + th) + (splitFromCache ? " (reused from the split cache)" : "") + ", "
+				+ numOfThresholds + " thresholds, " + (numOfThresholds - skippedNectarRuns - reusedSplits) + " NECTAR runs, " + skippedNectarRuns + " skipped";
+		if (usesSplitCache){
+			msg = msg + ", " + reusedSplits + " reused from the split cache";
+		}
+		Common.writeToLog(pathToLog, msg + ".", false);
+	}
+
+	// With a @nectarProcess NECTAR runs in it, so NECTAR runs of comms broken concurrently do not share any static state.
+	private static void runNectar(String pathToFileForNecter, String pathToWorkingDir, String betas, Boolean shouldUseModularity, int nectarVerboseLevel, boolean useWeighted, NectarProcess nectarProcess) throws Exception {
 		String shouldUseModularityS = shouldUseModularity ? "true" : "false";
 		
 		// TODO - add "minAmountOfIterationsToRun"
@@ -91,7 +173,8 @@ public class NectarIntegration {
 				, "false" //useConductance
 				, "" + nectarVerboseLevel // verbose
 				};
-			NECTAR_Weighted.RunNectar_Weighted.main(args);
+			if (nectarProcess != null) nectarProcess.runNectar(true, args);
+			else NECTAR_Weighted.RunNectar_Weighted.main(args);
 		}
 		else{
 			// NOTE: in NECTAR.RunNectar.main the order of useWOCC and useModularity is opposite to the above!
@@ -110,27 +193,19 @@ public class NectarIntegration {
 				, "false" //useConductance
 				, "" + nectarVerboseLevel // verbose
 				};
-			NECTAR.RunNectar.main(args);
+			if (nectarProcess != null) nectarProcess.runNectar(false, args);
+			else NECTAR.RunNectar.main(args);
 		}
 	}
 
-	private static String createFileForNectarWeighted(double th, CommId newComms, String pathToWorkingDir, int minSizeOfCommToBrake) throws IOException {
+	// Writes the edges of the parent comm (in @edgeIndex) with weight >= th, for NECTAR.
+	private static String createFileForNectarWeighted(double th, CommId newComms, EdgeIndex edgeIndex) throws IOException {
 		// Pointer to the communities we create now (the breakdown of previousComm)		// 
 		String pathToFileForNecter = newComms.edgesFileName;
 		try{
-		    			
-			Set<Integer> nodes = TextConvertor.getListOfNodes(newComms.parentComm.commsFileName,newComms.parentComm.line);
-			if (nodes.size() < minSizeOfCommToBrake){
-				return null;
-			}
-			PrintWriter writerNectar = new PrintWriter(pathToFileForNecter, "UTF-8");
-			Set<Edge> edges = TextConvertor.getListOfEdges(newComms.parentComm.edgesFileName);
-			for (Edge edge : edges){
-				if (edge.weight >= th & nodes.contains(edge.from) & nodes.contains(edge.to)){
-					writerNectar.println(edge); 
-				}
-			}
-			writerNectar.close();
+			long[] start = Metrics.start();
+			int numOfEdges = edgeIndex.writeEdgesAtLeast(th, pathToFileForNecter);
+			Metrics.record("nectarInput", start, numOfEdges, "edges", "\"th\": " + th);
 		} catch (IOException e) {
 		   throw new IOException("Problems writing file for nectar. Exception :" + e.getMessage());
 		}		
@@ -159,13 +234,15 @@ public class NectarIntegration {
 		return false;
 	}
 
-	public static boolean ShouldUseModularity(CommId comm, boolean useModularityAsDefaultMetric) throws Exception {
+	// With a @nectarProcess the choice is made by NECTAR in it, as its runs are.
+	public static boolean ShouldUseModularity(CommId comm, boolean useModularityAsDefaultMetric, NectarProcess nectarProcess) throws Exception {
 		
 		String pathToFileForNecter = comm.edgesFileName;
 		// if k>50 use WOCC. So, if E > N*50/2 => WOCC
-		int N = comm.GetNodes().size();
-		int E = comm.GetEdges().size();		
+		int N = comm.Size();
+		int E = comm.NumOfEdges();		
 		if (E>N*25) return useModularityAsDefaultMetric;
+		if (nectarProcess != null) return nectarProcess.shouldUseModularity(pathToFileForNecter);
 		return  NECTAR.RunNectar.ShouldUseModularity(pathToFileForNecter);	
 		
 	}
@@ -0,0 +1,146 @@
+package netStruct_Hierarchy;
+import java.io.BufferedReader;
+import java.io.BufferedWriter;
+import java.io.File;
+import java.io.IOException;
+import java.io.InputStreamReader;
+import java.io.OutputStreamWriter;
+import java.io.PrintStream;
+import java.lang.management.ManagementFactory;
+import java.nio.charset.StandardCharsets;
+import java.util.ArrayList;
+import java.util.List;
+
+// A JVM of its own for the NECTAR calls of a comm broken concurrently, as NECTAR keeps static state.
+// It is started on the first call and serves all the calls of the comm (every threshold, and ShouldUseModularity),
+// one at a time, so the JVM is started once per comm. Each call is a line of tab separated fields sent to the
+// process, which replies with a line - "ok", "ok <value>" or "error <msg>". The output of NECTAR goes to stderr.
+public class NectarProcess {
+	static final String RUN_NECTAR = "RunNectar";
+	static final String RUN_NECTAR_WEIGHTED = "RunNectar_Weighted";
+	static final String SHOULD_USE_MODULARITY = "ShouldUseModularity";
+	// Arguments of this JVM which are not passed to the NECTAR processes - the heap is sized by heapMb, and agents
+	// (e.g. a debugger listening on a port) can not be bound again by every process.
+	private static final String[] ARGUMENTS_NOT_PASSED = {"-Xmx", "-Xms", "-XX:MaxHeapSize", "-XX:InitialHeapSize", "-XX:MaxRAMPercentage", "-XX:InitialRAMPercentage",
+			"-agentlib", "-agentpath", "-javaagent", "-Xdebug", "-Xrunjdwp"};
+
+	private final int heapMb;
+	private Process process;
+	private BufferedWriter requests;
+	private BufferedReader replies;
+
+	// @heapMb is the max heap of the process, in MB.
+	public NectarProcess(int heapMb){
+		this.heapMb = heapMb;
+	}
+
+	// The max heap of each NECTAR process when @numOfThreads comms are broken concurrently: @nectarHeapMb when
+	// given (> 0), otherwise the max heap of this JVM split between the threads.
+	public static int heapMb(int nectarHeapMb, int numOfThreads){
+		if (nectarHeapMb > 0) return nectarHeapMb;
+		long maxHeapMb = Runtime.getRuntime().maxMemory() / (1024 * 1024);
+		return (int)Math.max(256, maxHeapMb / Math.max(1, numOfThreads));
+	}
+
+	public void runNectar(boolean useWeighted, String[] args) throws Exception {
+		call(useWeighted ? RUN_NECTAR_WEIGHTED : RUN_NECTAR, args);
+	}
+
+	public boolean shouldUseModularity(String pathToEdgesFile) throws Exception {
+		return Boolean.parseBoolean(call(SHOULD_USE_MODULARITY, new String[]{pathToEdgesFile}));
+	}
+
+	// Ends the process (if it was started).
+	public void close() throws Exception {
+		if (process == null) return;
+		try{
+			requests.close();
+			process.waitFor();
+		}
+		finally{
+			process.destroy();
+			process = null;
+		}
+	}
+
+	private String call(String command, String[] args) throws Exception {
+		if (process == null){
+			start();
+		}
+		StringBuilder request = new StringBuilder(command);
+		for (String arg : args){
+			request.append('\t').append(arg);
+		}
+		requests.write(request.toString());
+		requests.newLine();
+		requests.flush();
+		String reply = replies.readLine();
+		if (reply == null){
+			throw new Exception("NECTAR process exited with code " + process.waitFor() + " on " + command + " " + args[0]);
+		}
+		if (reply.startsWith("error")){
+			throw new Exception("NECTAR process failed on " + command + " " + args[0] + ": " + reply.substring("error".length()).trim());
+		}
+		return reply.substring("ok".length()).trim();
+	}
+
+	private void start() throws IOException {
+		List<String> command = new ArrayList<String>();
+		command.add(System.getProperty("java.home") + File.separator + "bin" + File.separator + "java");
+		command.add("-Xmx" + heapMb + "m");
+		for (String argument : ManagementFactory.getRuntimeMXBean().getInputArguments()){
+			if (!isArgumentNotPassed(argument)){
+				command.add(argument);
+			}
+		}
+		command.add("-cp");
+		command.add(System.getProperty("java.class.path"));
+		command.add(NectarProcess.class.getName());
+		process = new ProcessBuilder(command).redirectError(ProcessBuilder.Redirect.INHERIT).start();
+		requests = new BufferedWriter(new OutputStreamWriter(process.getOutputStream(), StandardCharsets.UTF_8));
+		replies = new BufferedReader(new InputStreamReader(process.getInputStream(), StandardCharsets.UTF_8));
+	}
+
+	private static boolean isArgumentNotPassed(String argument) {
+		for (String prefix : ARGUMENTS_NOT_PASSED){
+			if (argument.startsWith(prefix)) return true;
+		}
+		return false;
+	}
+
+	// The NECTAR process - serves the calls sent on stdin until it is closed.
+	public static void main(String[] args) throws Exception {
+		PrintStream out = System.out;
+		// stdout carries the replies, so anything else written to it (by NECTAR) goes to stderr.
+		System.setOut(System.err);
+		BufferedReader in = new BufferedReader(new InputStreamReader(System.in, StandardCharsets.UTF_8));
+		String line;
+		while ((line = in.readLine()) != null){
+			String[] fields = line.split("\t", -1);
+			String[] callArgs = new String[fields.length - 1];
+			System.arraycopy(fields, 1, callArgs, 0, callArgs.length);
+			String reply;
+			try{
+				if (fields[0].equals(RUN_NECTAR)){
+					NECTAR.RunNectar.main(callArgs);
+					reply = "ok";
+				}
+				else if (fields[0].equals(RUN_NECTAR_WEIGHTED)){
+					NECTAR_Weighted.RunNectar_Weighted.main(callArgs);
+					reply = "ok";
+				}
+				else if (fields[0].equals(SHOULD_USE_MODULARITY)){
+					reply = "ok " + NECTAR.RunNectar.ShouldUseModularity(callArgs[0]);
+				}
+				else{
+					reply = "error unknown call " + fields[0];
+				}
+			} catch (Exception e) {
+				reply = "error " + String.valueOf(e.getMessage()).replace('\n', ' ');
+			}
+			System.err.flush();
+			out.println(reply);
+			out.flush();
+		}
+	}
+}
@@ -1,13 +1,20 @@
 package netStruct_Hierarchy;
+import java.io.BufferedReader;
 import java.io.File;
+import java.io.FileReader;
 import java.io.IOException;
 import java.nio.file.FileVisitResult;
 import java.nio.file.Files;
 import java.nio.file.Path;
 import java.nio.file.Paths;
 import java.nio.file.SimpleFileVisitor;
+import java.nio.file.StandardCopyOption;
 import java.nio.file.attribute.BasicFileAttributes;
+import java.util.ArrayList;
+import java.util.Arrays;
+import java.util.HashSet;
 import java.util.InputMismatchException;
+import java.util.LinkedHashMap;
 import java.util.LinkedList;
 import java.util.List;
 import java.util.Map;
@@ -18,9 +25,9 @@ import java.util.Set;
 
 public class NetStruct_Hierarchy {
 	static boolean debug = false;
-	static boolean dummy = false;
-	static String[] varFlags = {"-ss","-dy","-mod","-minb","-mino","-b","-pro","-skip","-pca","-pm","-pe","-pmn","-pss","-nvl","-w","-ls","-pts","-indtoex"};
-	static String[] varValues = 
+	static String[] varFlags = {"-ss","-dy","-mod","-minb","-mino","-b","-pro","-skip","-pca","-pm","-pe","-pmn","-pss","-nvl","-w","-ls","-pts","-indtoex","-lp","-jt","-th","-res","-nhp"};
+	// The value of each flag when it is not given. Each run parses its flags to its own copy, see parseVarValues.
+	static final String[] defaultVarValues = 
 		{"0.001",
 		"false",
 		"true",
@@ -38,10 +45,26 @@ public class NetStruct_Hierarchy {
 		"true",
 		"false",
 		"false",
-		null
+		null,
+		"false",
+		"false",
+		"1",
+		"false",
+		"0"
 		};
+	// The flags a sweep may run a grid of values of - the ones which do not change the input graph.
+	static String[] sweepFlags = {"-ss","-dy","-mod","-minb","-mino","-b","-nvl","-w","-ls","-pts","-jt","-th"};
+	// The flags which are a part of the name of the output directory of a run, see outputDirName.
+	static String[] outputDirFlags = {"-ss","-dy","-minb","-b","-w"};
+	static final String SWEEP_INPUT_DIR = "Sweep_Input/";
+
 	public static void main(String[] args) throws Exception {		
-		singleRun(args);
+		if (args.length > 0 && args[0].toLowerCase().equals("-sweep")){
+			sweep(args);
+		}
+		else{
+			singleRun(args);
+		}
 	}
 	
 	public static void singleRun(String[] args) throws Exception {		
@@ -54,10 +77,84 @@ public class NetStruct_Hierarchy {
 			System.out.println(UserHelpUtil.paramMsg);
 			return;
 		}
-		if(!debug && args[0].equals("-demo")){			
-			dummy=true;			
+		boolean dummy = !debug && args[0].equals("-demo");
+		String[] varValues = (debug || dummy) ? defaultVarValues.clone() : parseVarValues(args);
+		run(varValues, dummy, outputDirName(varValues), null, null, null);
+	}
+
+	// Runs NetStruct_Hierarchy on each configuration of a grid of params, on the same input:
+	//		-sweep <pathToGrid> <flags, as in a single run>
+	// Each line of the grid file is one of sweepFlags followed by its values (e.g. "-ss 0.001 0.01"), and the
+	// configurations are all the combinations of the values, with the other flags as given after the grid file.
+	// The input is converted once, to Sweep_Input/ in the root output directory, for all the configurations, and the
+	// results of NECTAR are shared between them (see SplitCache). Each configuration writes to its own directory, as a
+	// single run - with the swept flags which are not a part of the name of the directory added to it.
+	public static void sweep(String[] args) throws Exception {
+		if (args.length < 2){
+			throw new InputMismatchException("Bad input for NetStruct_Tree. -sweep must be followed by the path to a grid file.");
+		}
+		List<String[]> grid = readGrid(args[1]);
+		String[] commonVarValues = parseVarValues(Arrays.copyOfRange(args, 2, args.length));
+		if (Boolean.parseBoolean(commonVarValues[7])){
+			throw new InputMismatchException("Bad input for NetStruct_Tree. -skip can not be used with -sweep.");
+		}
+		List<String[]> configurations = new ArrayList<String[]>();
+		configurations.add(commonVarValues);
+		for (String[] flagAndValues : grid){
+			int index = indexOfFlag(flagAndValues[0]);
+			List<String[]> nextConfigurations = new ArrayList<String[]>();
+			for (String[] configuration : configurations){
+				for (int i = 1; i < flagAndValues.length; i++){
+					String[] varValues = configuration.clone();
+					varValues[index] = flagAndValues[i];
+					nextConfigurations.add(varValues);
+				}
+			}
+			configurations = nextConfigurations;
+		}
+		// Configurations with the same directory are the same run (e.g. -dy is ignored with -w true), so it is done once.
+		Map<String, String[]> configurationsByDir = new LinkedHashMap<String, String[]>();
+		for (String[] varValues : configurations){
+			String nameOfOutputDir = outputDirName(varValues);
+			for (String[] flagAndValues : grid){
+				if (flagAndValues.length > 2 && !Arrays.asList(outputDirFlags).contains(flagAndValues[0])){
+					nameOfOutputDir = nameOfOutputDir + "_" + flagAndValues[0].substring(1) + "_" + varValues[indexOfFlag(flagAndValues[0])];
+				}
+			}
+			if (!configurationsByDir.containsKey(nameOfOutputDir)){
+				configurationsByDir.put(nameOfOutputDir, varValues);
+			}
+		}
+
+		String pathToRootOutputDir = commonVarValues[6];
+		String pathToMatrixFile = commonVarValues[9];
+		String pathToEdgesFile = commonVarValues[10];
+		if(!(new File(pathToMatrixFile).exists()) & !(new File(pathToEdgesFile).exists())){
+			throw new InputMismatchException("You must supply @pathToMatrixfile or @pathToEdgesfile - paths to files who exist on the system.");
+		}
+		boolean inputAsMatrix = new File(pathToMatrixFile).exists();
+		String pathToInputDir = pathToRootOutputDir + SWEEP_INPUT_DIR;
+		deleteDirectory(pathToInputDir);
+		new File(pathToInputDir).mkdirs();
+		System.out.println("Sweep of " + configurationsByDir.size() + " configurations, converting the input to " + pathToInputDir);
+		CommId inputComm = new CommId(pathToInputDir, 0, 0, 0);
+		Set<Integer> individulasToExclude = TextConvertor.getIndividulasToExclude(commonVarValues[17]);
+		double[] minAndMaxEdgesWeights = TextConvertor.createInputs(inputAsMatrix, pathToMatrixFile, pathToEdgesFile, inputComm.edgesFileName, inputComm.commsFileName, individulasToExclude);
+		SplitCache splitCache = new SplitCache();
+		for (Map.Entry<String, String[]> configuration : configurationsByDir.entrySet()){
+			System.out.println("");
+			System.out.println("Sweep configuration: " + configuration.getKey());
+			run(configuration.getValue(), false, configuration.getKey(), inputComm, minAndMaxEdgesWeights, splitCache);
 		}
-		if (!debug & !dummy)	populateVarValues(args);
+		// The runs have their own links (or copies) of the input files.
+		deleteDirectory(pathToInputDir);
+	}
+
+	// Runs NetStruct_Hierarchy with the params in @varValues (indexed as varFlags), writing to @nameOfOutputDir in the
+	// root output directory.
+	// In a sweep, the input was already converted to the files of @sharedInputComm (with @sharedMinAndMaxEdgesWeights),
+	// and @splitCache is shared by the runs. Otherwise these are null.
+	private static void run(String[] varValues, boolean dummy, String nameOfOutputDir, CommId sharedInputComm, double[] sharedMinAndMaxEdgesWeights, SplitCache splitCache) throws Exception {
 		double stepSize =  Double.parseDouble(varValues[0]); 
 		boolean dynamicChoose =  Boolean.parseBoolean(varValues[1]);
 		boolean useModularityAsDefaultMetric =  Boolean.parseBoolean(varValues[2]);
@@ -84,6 +181,14 @@ public class NetStruct_Hierarchy {
 		{
 			limitPathToRootOutputDir = Boolean.parseBoolean(varValues[18]);
 		}
+		// Skip the thresholds which do not change the edges of the comm, see NectarIntegration.findNextThreshold.
+		boolean jumpThresholds = Boolean.parseBoolean(varValues[19]);
+		// The comms of each level are broken concurrently, on this amount of threads.
+		int numOfThreads = Integer.parseInt(varValues[20]);
+		// Continue an interrupted run from the checkpoint in its output directory, see Checkpoint.
+		boolean resume = Boolean.parseBoolean(varValues[21]);
+		// The max heap of each NECTAR process when breaking concurrently, in MB (0 splits the heap of this JVM between the threads).
+		int nectarHeapMb = Integer.parseInt(varValues[22]);
 
 
 		if(useWeighted){
@@ -91,7 +196,7 @@ public class NetStruct_Hierarchy {
 			useModularityAsDefaultMetric = true;
 		}
 		if(!skipBrakeComms){
-			pathToRootOutputDir = pathToRootOutputDir+"W_" + (useWeighted ? 1 : 0) + "_D_" + (dynamicChoose ? 1 : 0) + "_Min_" + minSizeOfCommToBrake + "_SS_" + stepSize + "_B_" + beta +  "/";
+			pathToRootOutputDir = pathToRootOutputDir + nameOfOutputDir + "/";
 			if (limitPathToRootOutputDir && pathToRootOutputDir.length()>100)
 			{
 				throw new Exception("Output path is too long, max is 100, got " + pathToRootOutputDir.length() + ". The reason for this limitation is the fact that in some OS (like Windows) there is a limitation on the path of a file. NetStruct_Hierarchy write files with relativly long names, and so we limit the output folder path to 100. Sorry for that...");
@@ -118,8 +223,13 @@ public class NetStruct_Hierarchy {
 			inputAsMatrix = false;
 		}
 		
-		if (Files.exists(Paths.get(pathToRootOutputDir))) {
-			throw new RuntimeException("The output directory supplied already exist, please change it to a non existing folder. Directory is: " + pathToRootOutputDir);
+		// The splits depend on these (and not on jumpThresholds or numOfThreads), and the comms written to the comm analysis
+		// file on minSizeOfCommToOutput, so a run is resumed only with the same ones.
+		String params = "W_" + (useWeighted ? 1 : 0) + "_D_" + (dynamicChoose ? 1 : 0) + "_Min_" + minSizeOfCommToBrake + "_SS_" + stepSize + "_B_" + beta
+				+ " minOutput " + minSizeOfCommToOutput + " modularity " + useModularityAsDefaultMetric + " input " + (inputAsMatrix? pathToMatrixFile : pathToEdgesFile) + " exclude " + pathToIndividulasToExclude;
+		boolean resumeFromCheckpoint = resume && !skipBrakeComms && Checkpoint.exists(pathToRootOutputDir);
+		if (Files.exists(Paths.get(pathToRootOutputDir)) && !resumeFromCheckpoint) {
+			throw new RuntimeException("The output directory supplied already exist, please change it to a non existing folder (or use -res true to continue a run which has a checkpoint in it). Directory is: " + pathToRootOutputDir);
 		}
 		
 		new File(pathToRootOutputDir).mkdirs();
@@ -145,6 +255,10 @@ public class NetStruct_Hierarchy {
 		System.out.println("nectarVerboseLevel:            "+nectarVerboseLevel);
 		System.out.println("useWeighted:                   "+useWeighted);
 		System.out.println("pathToIndividulasToExclude:    "+pathToIndividulasToExclude);
+		System.out.println("jumpThresholds:                "+jumpThresholds);
+		System.out.println("numOfThreads:                  "+numOfThreads);
+		System.out.println("resume:                        "+resume);
+		System.out.println("nectarHeapMb:                  "+nectarHeapMb);
 		
 						
 		System.out.println("");
@@ -155,55 +269,97 @@ public class NetStruct_Hierarchy {
 		String inputFileName = pathToInputFile.split("/")[pathToInputFile.split("/").length-1];
 			
 		String pathToLog = pathToRootOutputDir + "log_" + inputFileName +"_" + Common.getDate() + ".log";
+		// The log and the metrics of the run are closed even when it fails, so a sweep does not keep them open.
+		try{
 		
-		Common.writeToLog(pathToLog, "------------------\n",debug);
-		Common.writeToLog(pathToLog, "------------------\n",debug);
-		Common.writeToLog(pathToLog, "Input file: " + inputFileName + "\n",debug);			
-		String pathToOutputDir = pathToRootOutputDir;
+			Common.writeToLog(pathToLog, "------------------\n",debug);
+			Common.writeToLog(pathToLog, "------------------\n",debug);
+			Common.writeToLog(pathToLog, "Input file: " + inputFileName + "\n",debug);			
+			String pathToOutputDir = pathToRootOutputDir;
 	
-		new File(pathToOutputDir).mkdirs();
+			new File(pathToOutputDir).mkdirs();
+			Metrics.init(pathToOutputDir + "metrics_" + inputFileName + "_" + Common.getDate() + ".jsonl");
 		
-		// The first comm is a single one containing all nodes.
-		CommId rootComm = new CommId(pathToOutputDir,firstLevel,firstEntry, firstLine);
-		double minThresholdToUse;
-		double maxThresholdToUse;
-		List<CommId> comms;
-		if(!skipBrakeComms){
-			// This will convert the input to the expected format
-			double[] minAndMaxEdgesWeights = TextConvertor.createInputs(inputAsMatrix, pathToMatrixFile, pathToEdgesFile, rootComm.edgesFileName, rootComm.commsFileName, individulasToExclude);
-			minThresholdToUse = minAndMaxEdgesWeights[0] + stepSize;
-			maxThresholdToUse = minAndMaxEdgesWeights[1];				
-			Common.writeToLog(pathToLog, "\t\tFirst level inputs created.\n",debug);						
-			pathToCommAnalysisFile = pathToOutputDir + "1_CommAnalysis_dynamic-" + dynamicChoose + "_modularity-" + useModularityAsDefaultMetric + "_minCommBrake-" +minSizeOfCommToBrake +"_"+ stepSize + ".txt";
-			List<CommId> firstLevelComms = new LinkedList<CommId> ();
-			firstLevelComms.add(rootComm);
+			// The first comm is a single one containing all nodes.
+			CommId rootComm = new CommId(pathToOutputDir,firstLevel,firstEntry, firstLine);
+			double minThresholdToUse;
+			double maxThresholdToUse;
+			List<CommId> comms;
+			if(!skipBrakeComms){
+				pathToCommAnalysisFile = pathToOutputDir + "1_CommAnalysis_dynamic-" + dynamicChoose + "_modularity-" + useModularityAsDefaultMetric + "_minCommBrake-" +minSizeOfCommToBrake +"_"+ stepSize + ".txt";
+			}
+			if(!skipBrakeComms && resumeFromCheckpoint){
+				// The inputs of the root were created by the interrupted run, and the tree is read from its checkpoint.
+				Checkpoint checkpoint = Checkpoint.read(pathToOutputDir, rootComm, params, pathToCommAnalysisFile);
+				minThresholdToUse = checkpoint.minThresholdToUse;
+				maxThresholdToUse = checkpoint.maxThresholdToUse;
+				Common.writeToLog(pathToLog, "\t\tResuming from checkpoint: " + checkpoint.comms.size() + " comms, " + checkpoint.commsToBrake.size() + " to brake.\n",debug);
 			
-			// Find communities
-			comms = CommBraker.brakeRec(pathToOutputDir,firstLevelComms,minThresholdToUse,stepSize,maxThresholdToUse, minSizeOfCommToBrake, beta, pathToLog, commAnalyzer, pathToCommAnalysisFile, dynamicChoose, useModularityAsDefaultMetric, -1, nectarVerboseLevel, useWeighted);			
-			comms.add(rootComm);
-			Common.writeToLog(pathToLog, "\t\tDone with brakeRec\n",debug);
-		}
-		else{
-			if(pathToCommAnalysisFile == null){
-				throw new RuntimeException("You must supply pathToCommAnalysisFile");				
+				// Find communities
+				comms = CommBraker.brakeRec(pathToOutputDir,checkpoint.commsToBrake,minThresholdToUse,stepSize,maxThresholdToUse, minSizeOfCommToBrake, beta, pathToLog, commAnalyzer, pathToCommAnalysisFile, dynamicChoose, useModularityAsDefaultMetric, -1, nectarVerboseLevel, useWeighted, jumpThresholds, numOfThreads, nectarHeapMb, checkpoint, splitCache);
+				comms.addAll(checkpoint.comms);
+				Common.writeToLog(pathToLog, "\t\tDone with brakeRec\n",debug);
+			}
+			else if(!skipBrakeComms){
+				double[] minAndMaxEdgesWeights;
+				if (sharedInputComm != null){
+					// The input was converted by the sweep - its files are linked to the root comm.
+					long[] linkStart = Metrics.start();
+					linkOrCopy(sharedInputComm.edgesFileName, rootComm.edgesFileName);
+					linkOrCopy(sharedInputComm.commsFileName, rootComm.commsFileName);
+					rootComm.SetNodes(sharedInputComm.GetNodesArray());
+					minAndMaxEdgesWeights = sharedMinAndMaxEdgesWeights;
+					Metrics.record("sweepInput", linkStart, new File(rootComm.edgesFileName).length(), "bytes", "");
+				}
+				else{
+					// This will convert the input to the expected format
+					long[] ingestionStart = Metrics.start();
+					minAndMaxEdgesWeights = TextConvertor.createInputs(inputAsMatrix, pathToMatrixFile, pathToEdgesFile, rootComm.edgesFileName, rootComm.commsFileName, individulasToExclude);
+					Metrics.record("matrixIngestion", ingestionStart, new File(pathToInputFile).length(), "bytes", "");
+				}
+				minThresholdToUse = minAndMaxEdgesWeights[0] + stepSize;
+				maxThresholdToUse = minAndMaxEdgesWeights[1];				
+				Common.writeToLog(pathToLog, "\t\tFirst level inputs created.\n",debug);						
+				List<CommId> firstLevelComms = new LinkedList<CommId> ();
+				firstLevelComms.add(rootComm);
+				Checkpoint checkpoint = new Checkpoint(pathToOutputDir, rootComm, params, pathToCommAnalysisFile, minThresholdToUse, maxThresholdToUse);
+			
+				// Find communities
+				comms = CommBraker.brakeRec(pathToOutputDir,firstLevelComms,minThresholdToUse,stepSize,maxThresholdToUse, minSizeOfCommToBrake, beta, pathToLog, commAnalyzer, pathToCommAnalysisFile, dynamicChoose, useModularityAsDefaultMetric, -1, nectarVerboseLevel, useWeighted, jumpThresholds, numOfThreads, nectarHeapMb, checkpoint, splitCache);			
+				comms.add(rootComm);
+				Common.writeToLog(pathToLog, "\t\tDone with brakeRec\n",debug);
+			}
+			else{
+				if(pathToCommAnalysisFile == null){
+					throw new RuntimeException("You must supply pathToCommAnalysisFile");				
+				}
+				comms = commAnalyzer.getCommsFromFiles(pathToOutputDir, pathToCommAnalysisFile, rootComm);
 			}
-			comms = commAnalyzer.getCommsFromFiles(pathToOutputDir, pathToCommAnalysisFile, rootComm);
-		}
 		
-		/*
-		 * 					2
-		 * Output leafs for NMI - commAnalyzer holds all the data needed - it was calculated in WriteStructureOutputToFile
-		 * First build structure output for the unmerged tree as a preperation to the 
-		 */		
-		Map<CommId,Map<String,Integer>> mapCommToMapCodeToCount = commAnalyzer.commsToMapSampleSiteToCount(comms);
-		commAnalyzer.WriteStructureOutputToFile(rootComm, mapCommToMapCodeToCount.keySet(), "", minSizeOfCommToOutput, useLeafSizesForStructure, useProportionalTreeSplitsForStructure);		
-		Common.writeToLog(pathToLog, "\t\tDone with Write Structure Output To File without output\n",debug);
-		String pathToLeafsBeforeMergeNoOverlapFile = pathToOutputDir + "2_Leafs_NoOverlap.txt";
-		String pathToLeafsBeforeMergeWithOverlapFile = pathToOutputDir + "2_Leafs_WithOverlap.txt";
-		commAnalyzer.LeafsAsCommunities();	
-		commAnalyzer.WriteLeafsNoOverlapAsCommunitiesToFile(pathToLeafsBeforeMergeNoOverlapFile);
-		commAnalyzer.WriteLeafsWithOverlapAsCommunitiesToFile(pathToLeafsBeforeMergeWithOverlapFile);
-		Common.writeToLog(pathToLog, "\t\tDone with Write Leafs As Communities To File\n",debug);
+			/*
+			 * 					2
+			 * Output leafs for NMI - commAnalyzer holds all the data needed - it was calculated in WriteStructureOutputToFile
+			 * First build structure output for the unmerged tree as a preperation to the 
+			 */		
+			long[] structureStart = Metrics.start();
+			commAnalyzer.WriteStructureOutputToFile(rootComm, new HashSet<CommId>(comms), "", minSizeOfCommToOutput, useLeafSizesForStructure, useProportionalTreeSplitsForStructure);		
+			Common.writeToLog(pathToLog, "\t\tDone with Write Structure Output To File without output\n",debug);
+			String pathToLeafsBeforeMergeNoOverlapFile = pathToOutputDir + "2_Leafs_NoOverlap.txt";
+			String pathToLeafsBeforeMergeWithOverlapFile = pathToOutputDir + "2_Leafs_WithOverlap.txt";
+			commAnalyzer.LeafsAsCommunities();	
+			commAnalyzer.WriteLeafsNoOverlapAsCommunitiesToFile(pathToLeafsBeforeMergeNoOverlapFile);
+			commAnalyzer.WriteLeafsWithOverlapAsCommunitiesToFile(pathToLeafsBeforeMergeWithOverlapFile);
+			Metrics.record("structureOutput", structureStart, comms.size(), "comms", "");
+			Common.writeToLog(pathToLog, "\t\tDone with Write Leafs As Communities To File\n",debug);
+			if (splitCache != null){
+				Common.writeToLog(pathToLog, "\t\tSplit cache: " + splitCache.hits() + " NECTAR results reused in the sweep so far, " + splitCache.size() + " kept.\n",debug);
+			}
+			Metrics.writeSummary(pathToLog, debug);
+		}
+		finally{
+			Metrics.close();
+			Common.closeLog(pathToLog);
+		}
 	}
 
 	private static void deleteDirectory(String dir) throws IOException {
@@ -225,20 +381,63 @@ public class NetStruct_Hierarchy {
 		}		
 	}
 
-	private static void populateVarValues(String[] args) {
+	// Hard links @pathToLink to the file @pathToExisting, or copies it where hard links are not supported.
+	private static void linkOrCopy(String pathToExisting, String pathToLink) throws IOException {
+		try{
+			Files.createLink(Paths.get(pathToLink), Paths.get(pathToExisting));
+		} catch (UnsupportedOperationException e) {
+			Files.copy(Paths.get(pathToExisting), Paths.get(pathToLink), StandardCopyOption.REPLACE_EXISTING);
+		} catch (IOException e) {
+			Files.copy(Paths.get(pathToExisting), Paths.get(pathToLink), StandardCopyOption.REPLACE_EXISTING);
+		}
+	}
+
+	// The name of the output directory of a run, with the params which change the tree.
+	static String outputDirName(String[] varValues) {
+		boolean useWeighted = Boolean.parseBoolean(varValues[14]);
+		// With useWeighted, dynamicChoose is always false (see run).
+		boolean dynamicChoose = !useWeighted && Boolean.parseBoolean(varValues[1]);
+		return "W_" + (useWeighted ? 1 : 0) + "_D_" + (dynamicChoose ? 1 : 0) + "_Min_" + Integer.parseInt(varValues[3]) + "_SS_" + Double.parseDouble(varValues[0]) + "_B_" + varValues[5];
+	}
+
+	// Reads the grid of a sweep - a line per flag, with its values, separated by white spaces.
+	private static List<String[]> readGrid(String pathToGrid) throws IOException {
+		List<String[]> grid = new ArrayList<String[]>();
+		BufferedReader reader = new BufferedReader(new FileReader(pathToGrid));
+		String line;
+		while ((line = reader.readLine()) != null){
+			line = line.trim();
+			if (line.isEmpty()) continue;
+			String[] flagAndValues = line.split("\\s+");
+			flagAndValues[0] = flagAndValues[0].toLowerCase();
+			if (flagAndValues.length < 2 || !Arrays.asList(sweepFlags).contains(flagAndValues[0])){
+				reader.close();
+				throw new InputMismatchException("Bad grid for a sweep. Each line must be one of the flags " + Arrays.toString(sweepFlags) + " followed by its values, got: " + line);
+			}
+			grid.add(flagAndValues);
+		}
+		reader.close();
+		return grid;
+	}
+
+	// A copy of defaultVarValues, with the values of the flags in @args.
+	private static String[] parseVarValues(String[] args) {
+		String[] varValues = defaultVarValues.clone();
 		int length = args.length;
 		for (int i = 0; i < length; i=i+2) {
 			String flag = args[i].toLowerCase();
-			if(i+1 > length) throw new InputMismatchException("Bad input for NetStruct_Tree. The flag:"+flag + " is missing a value,");
-			boolean foundFlag=false;
-			for (int j = 0; j < varFlags.length; j++) {
-				if (varFlags[j].equals(flag)) {
-					varValues[j] = args[i+1];
-					foundFlag=true;
-					break;
-				}				
+			if(i+1 >= length) throw new InputMismatchException("Bad input for NetStruct_Tree. The flag:"+flag + " is missing a value,");
+			varValues[indexOfFlag(flag)] = args[i+1];
+		}
+		return varValues;
+	}
+
+	private static int indexOfFlag(String flag) {
+		for (int j = 0; j < varFlags.length; j++) {
+			if (varFlags[j].equals(flag)) {
+				return j;
 			}
-			if(!foundFlag) throw new InputMismatchException("Bad input for NetStruct_Tree. The flag:"+flag + " is not found. Use -h to see available flags.");
-		}		
+		}
+		throw new InputMismatchException("Bad input for NetStruct_Tree. The flag:"+flag + " is not found. Use -h to see available flags.");
 	}
 }
@@ -0,0 +1,78 @@
+package netStruct_Hierarchy;
+import java.util.Arrays;
+import java.util.HashMap;
+import java.util.List;
+import java.util.Map;
+
+// The results of NECTAR, kept across the runs of a sweep (see NetStruct_Hierarchy.sweep), so a comm which an earlier
+// configuration already gave to NECTAR at the same threshold is not given to it again.
+// A result is keyed by the nodes of the comm, the threshold, the metric and the betas. The threshold is kept as the
+// amount of edges of the comm with weight >= it (the edges NECTAR is given), so thresholds of grids with other step
+// sizes which keep the same edges share a result. The value is the lines NECTAR wrote - empty when it did not split.
+public class SplitCache {
+	private final Map<Key, List<String>> splits = new HashMap<Key, List<String>>();
+	private int hits = 0;
+
+	// The lines NECTAR wrote for @key, or null if it was not run on it yet.
+	public synchronized List<String> get(Key key){
+		List<String> ans = splits.get(key);
+		if (ans != null){
+			hits++;
+		}
+		return ans;
+	}
+
+	public synchronized void put(Key key, List<String> commsLines){
+		splits.put(key, commsLines);
+	}
+
+	public synchronized int hits(){
+		return hits;
+	}
+
+	public synchronized int size(){
+		return splits.size();
+	}
+
+	// @sortedNodes as CommId.GetNodesArray() - it is kept, not copied.
+	public static Key key(int[] sortedNodes, int numOfEdges, boolean useModularity, String betas, boolean useWeighted){
+		return new Key(sortedNodes, numOfEdges, useModularity, betas, useWeighted);
+	}
+
+	public static class Key {
+		private final int[] nodes;
+		private final int numOfEdges;
+		private final boolean useModularity;
+		private final String betas;
+		private final boolean useWeighted;
+		private final int hash;
+
+		private Key(int[] nodes, int numOfEdges, boolean useModularity, String betas, boolean useWeighted){
+			this.nodes = nodes;
+			this.numOfEdges = numOfEdges;
+			this.useModularity = useModularity;
+			this.betas = betas;
+			this.useWeighted = useWeighted;
+			int hash = Arrays.hashCode(nodes);
+			hash = 31 * hash + numOfEdges;
+			hash = 31 * hash + (useModularity ? 1 : 0);
+			hash = 31 * hash + betas.hashCode();
+			hash = 31 * hash + (useWeighted ? 1 : 0);
+			this.hash = hash;
+		}
+
+		@Override
+		public int hashCode(){
+			return hash;
+		}
+
+		@Override
+		public boolean equals(Object o){
+			if (this == o) return true;
+			if (!(o instanceof Key)) return false;
+			Key other = (Key)o;
+			return hash == other.hash && numOfEdges == other.numOfEdges && useModularity == other.useModularity
+					&& useWeighted == other.useWeighted && betas.equals(other.betas) && Arrays.equals(nodes, other.nodes);
+		}
+	}
+}
@@ -3,12 +3,15 @@ package netStruct_Hierarchy;
 import java.io.BufferedReader;
 import java.io.FileInputStream;
 import java.io.FileNotFoundException;
+import java.io.FileReader;
 import java.io.IOException;
 import java.io.InputStreamReader;
 import java.io.PrintWriter;
 import java.io.Reader;
 import java.nio.file.Files;
 import java.nio.file.Paths;
+import java.util.ArrayList;
+import java.util.Arrays;
 import java.util.HashMap;
 import java.util.HashSet;
 import java.util.LinkedList;
@@ -30,6 +33,48 @@ public class TextConvertor {
 		return nodes;
 	}
 
+	// The nodes of a line of a comms file, sorted and without duplicates.
+	public static int[] getSortedNodes(String pathToListOfComms, int line) throws IOException {
+		BufferedReader reader = new BufferedReader(new FileReader(pathToListOfComms));
+		String lineS = null;
+		for (int i = 0; i <= line; i++) {
+			lineS = reader.readLine();
+		}
+		reader.close();
+		if (lineS == null) {
+			throw new IndexOutOfBoundsException("Line " + line + " is missing in " + pathToListOfComms);
+		}
+		return parseSortedNodes(lineS);
+	}
+
+	// The nodes of each line of a comms file, sorted and without duplicates.
+	public static List<int[]> getAllSortedNodes(String pathToListOfComms) throws IOException {
+		List<int[]> comms = new ArrayList<int[]>();
+		BufferedReader reader = new BufferedReader(new FileReader(pathToListOfComms));
+		String line;
+		while ((line = reader.readLine()) != null) {
+			comms.add(parseSortedNodes(line));
+		}
+		reader.close();
+		return comms;
+	}
+
+	private static int[] parseSortedNodes(String lineS) {
+		String[] parts = lineS.split(" ");
+		int[] nodes = new int[parts.length];
+		for (int i = 0; i < parts.length; i++) {
+			nodes[i] = Integer.parseInt(parts[i]);
+		}
+		Arrays.sort(nodes);
+		int numOfNodes = 0;
+		for (int i = 0; i < nodes.length; i++) {
+			if (numOfNodes == 0 || nodes[numOfNodes - 1] != nodes[i]) {
+				nodes[numOfNodes++] = nodes[i];
+			}
+		}
+		return numOfNodes == nodes.length ? nodes : Arrays.copyOf(nodes, numOfNodes);
+	}
+
 	public static Set<Edge> getListOfEdges(String pathToListOfEdges) throws IOException {
 		Set<Edge> edges = new HashSet<Edge>();
 		List<String> lines = Files.readAllLines(Paths.get(pathToListOfEdges));
@@ -112,6 +157,10 @@ public class TextConvertor {
 	}
 
 	private static double[] createInputsFromMatrix(String pathToMatrix, String pathToListOfEdges, String pathToListOfComms, Set<Integer> individulasToExclude) throws IOException{
+		// Adding support to the binary format of BuildMatrix
+		if (BinaryMatrixReader.isBinaryMatrix(pathToMatrix)){
+			return createInputsFromBinaryMatrix(pathToMatrix, pathToListOfEdges, pathToListOfComms, individulasToExclude);
+		}
 		double minEdgeWeight = Double.MAX_VALUE;
 		double maxEdgeWeight = Double.MIN_VALUE;
 		List<String> lines = null;
@@ -153,6 +202,39 @@ public class TextConvertor {
 		return new double[]{minEdgeWeight,maxEdgeWeight};
 	}
 	
+	// Same as createInputsFromMatrix, for a binary matrix. The weights are read from a memory mapped buffer.
+	private static double[] createInputsFromBinaryMatrix(String pathToMatrix, String pathToListOfEdges, String pathToListOfComms, Set<Integer> individulasToExclude) throws IOException{
+		double minEdgeWeight = Double.MAX_VALUE;
+		double maxEdgeWeight = Double.MIN_VALUE;
+		Set<Integer> nodes = new HashSet<>();
+		BinaryMatrixReader matrix = new BinaryMatrixReader(pathToMatrix);
+		PrintWriter writerEdges = new PrintWriter(pathToListOfEdges, "UTF-8");
+		int numOfNodes = matrix.numOfNodes;
+		long index = 0;
+		for (int nodeFrom = 0; nodeFrom < numOfNodes; nodeFrom++){
+			if (!individulasToExclude.contains(nodeFrom))
+				nodes.add(nodeFrom);
+			for (int nodeTo = nodeFrom+1; nodeTo < numOfNodes; nodeTo++){
+				double weight = matrix.get(index);
+				index++;
+				if (weight<minEdgeWeight)minEdgeWeight=weight;
+				if (weight>maxEdgeWeight)maxEdgeWeight=weight;
+				if (!individulasToExclude.contains(nodeFrom) && !individulasToExclude.contains(nodeTo)){
+					writerEdges.println(new Edge(nodeFrom, nodeTo, weight));
+				}
+			}
+		}
+		writerEdges.close();
+		matrix.close();
+		PrintWriter writerComms = new PrintWriter(pathToListOfComms, "UTF-8");
+		for (int node : nodes){
+			writerComms.print(node + " "); 
+		}
+		writerComms.close();
+		
+		return new double[]{minEdgeWeight,maxEdgeWeight};
+	}
+	
 	private static double[] createInputsFromEdgeList(String pathToEdgesFile, String pathToListOfEdges,
 			String pathToListOfComms, Set<Integer> individulasToExclude) throws IOException {
 		double minEdgeWeight = Double.MAX_VALUE;
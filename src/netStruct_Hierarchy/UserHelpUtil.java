@@ -11,6 +11,7 @@ public class UserHelpUtil {
 			+"---   If you use this code in your work, please cite TODO. \n"
 			+"\n\n"
 			+" Running the jar with a single param '-demo' will run a dummy sample, generating sample inputs and outputs in ./sample/ \n"
+			+" Running the jar with '-sweep <pathToGrid>' followed by the params below will run all the combinations of the values in the grid file, on the same input. Each line of the grid file is a flag (one of -ss, -dy, -mod, -minb, -mino, -b, -nvl, -w, -ls, -pts, -jt, -th) followed by its values, e.g. '-ss 0.001 0.01'. The input is converted once, the splits NECTAR found are reused by the other runs (logged as reused from the split cache), and each run writes to its own sub directory (swept flags which are not a part of its name are added to it). \n"
 			+"-----------------------------------------------------\n"
 			+"\n\n"
 			+"Input params:\n"
@@ -24,7 +25,7 @@ public class UserHelpUtil {
 			+ "pathToRootOutputDir (-pro) -\n\t\t full path to the directory where the output will be written. Will overwrite existing files! A sub directory in this location will be created, including all the params used in its name.\n"
 			+ "skipBrakeComms (-skip) -\n\t\t internal use. a boolean, when true, will read the file in @pathToCommAnalysisFile and perfom merge by Chi-squere and F1 and structure calculation. Default - false \n"
 			+ "pathToCommAnalysisFile (-pca) -\n\t\t Internal use. full path to CommAnalysisFile - an existing output of this program. used when @skipBrakeComms is true. \n"			
-			+ "pathToMatrixFile (-pm) -\n\t\t full path to the the file containing a matrix of weights between nodes, with respect to the list of nodes in @pathToMapNode2SampleSite. \n"			
+			+ "pathToMatrixFile (-pm) -\n\t\t full path to the the file containing a matrix of weights between nodes, with respect to the list of nodes in @pathToMapNode2SampleSite. Text (or .gz), or the binary format written by BuildMatrix (outputFormat binary). \n"			
 			+ "pathToEdgesFile (-pe) -\n\t\t full path to the the file containing a list of weighted edges (format is <node> <node> <weight>), with respect to the list of nodes in @pathToMapNode2SampleSite. \n\t\t -------- PLEASE NOTE THAT ALL NUMBERS BETWEEN 0 AND n-1(number of nodes) SHOULD APPEAR! \n\t\t -------- If the paramter given in @pathToMatrixFile is not a valid file, the list of edges will be used. \n"
 			+ "pathToMapNode2SampleSite (-pmn) -\n\t\t full path to file containing in each line i a sampleSite code indicating the sampleSite of node i.\n"
 			+ "pathToSampleSites (-pss) -\n\t\t full path to file containing in each line a list of comma separated sample sites (which match the values in @pathToMapNode2SampleSite.) In each line you can put several sample sites, they will be considered to be in the same area. This is non mandatory - you may put all sample sites in a single line. \n"
@@ -35,6 +36,11 @@ public class UserHelpUtil {
 			+ "useProportionalTreeSplitsForStructure (-pts) -\n\t\t boolean. Effective only when @useLeafSizesForStructure is false. When true - the STRUCTURE output splits in the tree are used with respect to each branch on its own. So if the node has two childrens, one with one child and the other with two - the . Default - false. \n"
 			*/
 			+ "pathToIndividulasToExclude (-indtoex) -\n\t\t string. When supplied must be a path to a file containing a comma separated list of nodes. Note that if a matrix of edges is given, the first node index is 0! Default - null. \n"			
+			+ "limitPathToRootOutputDir (-lp) -\n\t\t boolean. When true - fail if the output directory path is longer than 100 characters (for OS with a limit on the length of a path, like Windows). Default - false. \n"
+			+ "jumpThresholds (-jt) -\n\t\t boolean. When true - thresholds which keep the same edges in the community as the last threshold NECTAR did not split are skipped. Finds the same splits as the default stepping, with less NECTAR runs. Skipped runs are logged. Default - false. \n"
+			+ "numOfThreads (-th) -\n\t\t an int. The communities of each level of the tree are broken concurrently on this amount of threads. Each community runs NECTAR in a process of its own (started once for the community) and a scratch directory. The output does not depend on it. Default - 1. \n"
+			+ "nectarHeapMb (-nhp) -\n\t\t an int. The max heap, in MB, of each NECTAR process when @numOfThreads is more than 1. When 0 the max heap of NetStruct_Hierarchy is split between the threads (at least 256 MB each). Default - 0. \n"
+			+ "resume (-res) -\n\t\t boolean. When true and the output directory of the run already exists with a Checkpoint.txt in it (written after each level of the tree), the run continues from the last level finished, instead of failing. The other params must be the same as in the interrupted run. Default - false. \n"
 			+ "\n"
 			+"-----------------------------------------------------\n"
 			+"Output: \n"
@@ -52,6 +58,8 @@ public class UserHelpUtil {
 			+ "log_<@matrixFileName>_<HH-mm_d--MM-YYYY>.log -\n\t\t log of the process.\n"
 			+ "Le_#_En_#_PaLe_#_PaEn_#_PaLi_#_TH__C.txt -\n\t\t a list of comms in the given level and entry.\n"
 			+ "Le_#_En_#_PaLe_#_PaEn_#_PaLi_#_TH__E.txt -\n\t\t a list of edges in the given level and entry.\n"
+			+ "Checkpoint.txt -\n\t\t the tree found so far and the params of the run, used by -res.\n"
+			+ "Sweep_Input/ -\n\t\t the input converted by -sweep, shared by its runs (removed when the sweep is done).\n"
 			;
 	public final static String paramMsg = 
 			"******************************************\n"
@@ -81,10 +89,15 @@ public class UserHelpUtil {
 			+ "useProportionalTreeSplitsForStructure = false \n"
 			*/
 			+ "pathToIndividulasToExclude = null \n"
+			+ "limitPathToRootOutputDir = false \n"
+			+ "jumpThresholds = false \n"
+			+ "numOfThreads = 1 \n"
+			+ "resume = false \n"
+			+ "nectarHeapMb = 0 \n"
 			+ "\n For your use - a sample full command line: \n"
 			+ "java -jar NetStruct_Hierarchy_v1.jar -ss 0.0001 -dy true -mod true -minb 3 -mino 3 -b 1.0"
 			+ " -pro C:/Data/ -skip false -pca placeholder -pm C:/Data/Matrix.txt"
-			+ " -pe placeholder -pmn C:/Data/indlist.txt -pss C:/Data/SampleSites.txt -nvl 0 -w true -indtoex placeholder\n";
+			+ " -pe placeholder -pmn C:/Data/indlist.txt -pss C:/Data/SampleSites.txt -nvl 0 -w true -indtoex placeholder -jt true\n";
 			
 	public final static String DUMMY_All_chrome_M = 
 			"0.5	0.5	0.0001	0.0001 0.0001\n" +